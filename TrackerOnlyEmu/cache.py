@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 10:10 PM +0000
+
+import hashlib
+import re
+import shutil
+
+from os import environ, listdir, makedirs, path, remove, walk
+
+
+LOCAL_INCLUDE = re.compile(r'^\s*#\s*include\s+"([^"]+)"', re.MULTILINE)
+
+
+def cache_dir(subdir=''):
+    # $TRACKERONLYEMU_CACHE > $XDG_CACHE_HOME/TrackerOnlyEmu > ~/.cache/TrackerOnlyEmu
+    base = environ.get('TRACKERONLYEMU_CACHE')
+    if not base:
+        base = path.join(
+            environ.get('XDG_CACHE_HOME', path.expanduser('~/.cache')),
+            'TrackerOnlyEmu')
+
+    dirpath = path.join(base, subdir)
+    makedirs(dirpath, exist_ok=True)
+    return dirpath
+
+
+def source_files(filepath, visited=None):
+    # The file itself, followed by everything it includes with '#include "..."',
+    # recursively
+    if visited is None:
+        visited = []
+
+    filepath = path.abspath(filepath)
+    if filepath in visited:
+        return visited
+    visited.append(filepath)
+
+    with open(filepath, 'r') as f:
+        content = f.read()
+
+    for inc in LOCAL_INCLUDE.findall(content):
+        inc_path = path.join(path.dirname(filepath), inc)
+        if path.isfile(inc_path):
+            source_files(inc_path, visited)
+
+    return visited
+
+
+def file_hash(filepath, length=16):
+    # Of the contents only, so that it doesn't depend on where the file is
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        h.update(f.read())
+
+    return h.hexdigest()[:length]
+
+
+def content_hash(filepaths, *extra, length=16):
+    h = hashlib.sha256()
+    for p in filepaths:
+        h.update(p.encode('utf-8'))
+        with open(p, 'rb') as f:
+            h.update(f.read())
+    for e in extra:
+        h.update(str(e).encode('utf-8'))
+
+    return h.hexdigest()[:length]
+
+
+def entry_size(entrypath):
+    if not path.isdir(entrypath):
+        return path.getsize(entrypath)
+    return sum(path.getsize(path.join(root, f))
+               for root, _, files in walk(entrypath) for f in files)
+
+
+def evict_lru(subdir, max_bytes, keep=()):
+    # Remove the least recently used entries (files or directories) of
+    # cache_dir(subdir) until they take at most 'max_bytes'. An entry is used
+    # when its modification time is touched. Entries being written (named
+    # '<key>.<random>') and those in 'keep' are never removed.
+    dirpath = cache_dir(subdir)
+    entries = []
+    for name in listdir(dirpath):
+        if '.' in name:
+            continue
+        entrypath = path.join(dirpath, name)
+        try:
+            entries.append((path.getmtime(entrypath), entry_size(entrypath),
+                            name, entrypath))
+        except OSError:  # Removed by another job
+            pass
+
+    total = sum(e[1] for e in entries)
+    evicted = []
+    for _, size, name, entrypath in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name in keep:
+            continue
+        if path.isdir(entrypath):
+            shutil.rmtree(entrypath, ignore_errors=True)
+        elif path.isfile(entrypath):
+            remove(entrypath)
+        total -= size
+        evicted.append(name)
+
+    return evicted
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 10:10 PM +0000
+
+import json
+import os
+import shutil
+import numpy as np
+import ROOT
+
+from hashlib import sha1
+from os import path
+from tempfile import mkdtemp
+from ROOT import TFile, TTree
+from ROOT.std import vector
+
+from TrackerOnlyEmu.cache import cache_dir
+from TrackerOnlyEmu.loader import load_cpp, declare
+
+
+# NumPy dtype -> ROOT leaf type
+LEAF_TYPES = {
+    np.dtype('bool'): 'O',
+    np.dtype('int8'): 'B',
+    np.dtype('uint8'): 'b',
+    np.dtype('int16'): 'S',
+    np.dtype('uint16'): 's',
+    np.dtype('int32'): 'I',
+    np.dtype('uint32'): 'i',
+    np.dtype('int64'): 'L',
+    np.dtype('uint64'): 'l',
+    np.dtype('float32'): 'F',
+    np.dtype('float64'): 'D',
+}
+
+# NumPy dtype -> C++ type
+CPP_TYPES = {
+    np.dtype('bool'): 'bool',
+    np.dtype('int8'): 'Char_t',
+    np.dtype('uint8'): 'UChar_t',
+    np.dtype('int16'): 'Short_t',
+    np.dtype('uint16'): 'UShort_t',
+    np.dtype('int32'): 'Int_t',
+    np.dtype('uint32'): 'UInt_t',
+    np.dtype('int64'): 'Long64_t',
+    np.dtype('uint64'): 'ULong64_t',
+    np.dtype('float32'): 'Float_t',
+    np.dtype('float64'): 'Double_t',
+}
+
+# RDataFrame column type -> NumPy dtype
+COLUMN_DTYPES = {cpp: dtype for dtype, cpp in CPP_TYPES.items()}
+COLUMN_DTYPES.update({
+    'Bool_t': np.dtype('bool'),
+    'char': np.dtype('int8'),
+    'unsigned char': np.dtype('uint8'),
+    'short': np.dtype('int16'),
+    'unsigned short': np.dtype('uint16'),
+    'int': np.dtype('int32'),
+    'unsigned int': np.dtype('uint32'),
+    'long long': np.dtype('int64'),
+    'unsigned long long': np.dtype('uint64'),
+    'float': np.dtype('float32'),
+    'double': np.dtype('float64'),
+})
+
+# A Filter that always passes, so that the filler is a lazy action (its Count)
+# that can be triggered with RunGraphs, unlike Foreach
+FILLER_TEMPLATE = '''
+ROOT::RDF::RResultPtr<ULong64_t> {name}(
+    ROOT::RDF::RNode df, const std::vector<ULong64_t>& addrs,
+    ULong64_t nRows) {{
+  auto filled = reinterpret_cast<unsigned char*>(addrs[0]);
+{pointers}
+  return df.Filter([=](ULong64_t entry{params}) {{
+    checkColumnarEntry(entry, nRows);
+{stores}
+    filled[entry] = 1;
+    return true;
+  }}, {{"rdfentry_"{columns}}}).Count();
+}}
+'''
+
+
+def write_columns(output, tree_path, columns, mode='RECREATE',
+                  compression=None, basket_size=None, auto_flush=None):
+    # Write a dict of equal-length NumPy arrays to a tree, keeping their dtypes.
+    # 'compression' is the 'algorithm * 100 + level' of TFile, 'auto_flush'
+    # the argument of TTree::SetAutoFlush; by default, ROOT's are used.
+    load_cpp('<triggers/columnar.h>')
+
+    arrays = [np.ascontiguousarray(arr) for arr in columns.values()]
+    nentries = len(arrays[0]) if arrays else 0
+    if any(len(arr) != nentries for arr in arrays):
+        raise ValueError('All columns must have the same length')
+
+    names = vector('string')()
+    leaf_types = vector('string')()
+    addrs = vector('ULong64_t')()
+    sizes = vector('int')()
+
+    for name, arr in zip(columns, arrays):
+        names.push_back(name)
+        leaf_types.push_back(LEAF_TYPES[arr.dtype])
+        addrs.push_back(arr.ctypes.data)
+        sizes.push_back(arr.itemsize)
+
+    ntp = TFile(output, mode)
+    if ntp.Get(tree_path):  # Same as Snapshot, never replace a tree
+        ntp.Close()
+        raise RuntimeError('{} already has a {} tree'.format(output, tree_path))
+    if compression is not None:
+        ntp.SetCompressionSettings(compression)
+    dirname, treename = path.split(tree_path)
+    if dirname:
+        directory = ntp.GetDirectory(dirname)
+        if not directory:
+            directory = ntp.mkdir(dirname)
+        directory.cd()
+
+    tree = TTree(treename, treename)
+    ROOT.SetOwnership(tree, False)  # The file owns the tree
+    if auto_flush is not None:
+        tree.SetAutoFlush(auto_flush)
+    ROOT.writeColumns(tree, names, leaf_types, addrs, sizes, nentries,
+                      basket_size or 32000)
+    tree.Write()
+    ntp.Close()
+
+
+def tree_entries(filename, tree_path):
+    ntp = TFile(filename)
+    nentries = ntp.Get(tree_path).GetEntries()
+    ntp.Close()
+    return nentries
+
+
+def fill_arrays(frame, nentries, matrix_columns=(), columns=(),
+                matrix_dtype=np.float64, dtypes=None):
+    # In a single event loop, fill a C-contiguous (entries, matrix_columns)
+    # matrix, e.g. the features of a regressor, and one array per 'columns'.
+    # Unlike AsNumpy, nothing is copied nor stacked afterwards: the arrays are
+    # allocated up front for the 'nentries' entries of the input (e.g.
+    # tree_entries), and each entry is written at its 'rdfentry_', so the rows
+    # are in input order, also with multithreading. The 'columns' keep their
+    # own types unless overridden with 'dtypes'.
+    handle, result = book_arrays(frame, nentries, matrix_columns, columns,
+                                 matrix_dtype, dtypes)
+    handle.GetValue()
+    return result()
+
+
+def book_arrays(frame, nentries, matrix_columns=(), columns=(),
+                matrix_dtype=np.float64, dtypes=None):
+    # Same as fill_arrays, but lazy: the handle of the event loop, to trigger
+    # with others (e.g. executor.run_graphs), and a function returning the
+    # (matrix, arrays) once it ran
+    load_cpp('<triggers/columnar.h>')
+    matrix_columns, columns = list(matrix_columns), list(columns)
+    dtypes = dict() if dtypes is None else dtypes
+    matrix_dtype = np.dtype(matrix_dtype)
+
+    col_types = [str(frame.GetColumnType(c)) for c in matrix_columns + columns]
+    col_dtypes = []
+    for col, col_type in zip(columns, col_types[len(matrix_columns):]):
+        if col not in dtypes and col_type not in COLUMN_DTYPES:
+            raise ValueError('Column {} has unsupported type {}'.format(
+                col, col_type))
+        col_dtypes.append(np.dtype(dtypes.get(col, COLUMN_DTYPES.get(
+            col_type))))
+
+    matrix = np.empty((nentries, len(matrix_columns)), dtype=matrix_dtype)
+    arrays = {c: np.empty(nentries, dtype=t)
+              for c, t in zip(columns, col_dtypes)}
+    filled = np.zeros(nentries, dtype=np.uint8)
+
+    # The filler is generated for these column types, then reused
+    pointers = ['  auto matrix = reinterpret_cast<{}*>(addrs[1]);'.format(
+        CPP_TYPES[matrix_dtype])]
+    stores = ['    auto row = matrix + entry * {};'.format(len(matrix_columns))
+              ] if matrix_columns else []
+    for idx in range(len(matrix_columns)):
+        stores.append('    row[{0}] = static_cast<{1}>(c{0});'.format(
+            idx, CPP_TYPES[matrix_dtype]))
+    for idx, dtype in enumerate(col_dtypes):
+        pointers.append(
+            '  auto col{0} = reinterpret_cast<{1}*>(addrs[{2}]);'.format(
+                idx, CPP_TYPES[dtype], idx + 2))
+        stores.append('    col{0}[entry] = static_cast<{1}>(c{2});'.format(
+            idx, CPP_TYPES[dtype], idx + len(matrix_columns)))
+
+    fmt = dict(
+        pointers='\n'.join(pointers), stores='\n'.join(stores),
+        params=''.join(', const {}& c{}'.format(t, i)
+                       for i, t in enumerate(col_types)),
+        columns=''.join(', "{}"'.format(c) for c in matrix_columns + columns))
+    name = 'fillColumnar_{}'.format(sha1(FILLER_TEMPLATE.format(
+        name='', **fmt).encode('utf-8')).hexdigest()[:12])
+    declare(FILLER_TEMPLATE.format(name=name, **fmt))
+
+    addrs = vector('ULong64_t')()
+    for arr in [filled, matrix] + list(arrays.values()):
+        addrs.push_back(arr.ctypes.data)
+    handle = getattr(ROOT, name)(ROOT.RDF.AsRNode(frame), addrs, nentries)
+
+    def result():
+        # Drop the entries skipped by filters, in place
+        if not filled.all():
+            for arr in [matrix] + list(arrays.values()):
+                nrows = ROOT.compactRows(arr.ctypes.data, arr[:1].nbytes,
+                                         filled.ctypes.data, nentries)
+                arr.resize((nrows,) + arr.shape[1:], refcheck=False)
+            filled.fill(1)  # Only once
+
+        return matrix, arrays
+
+    return handle, result
+
+
+def load_columns(dirpath):
+    # The columns saved by save_columns, as read-only memory maps. The
+    # directory is touched, for cache.evict_lru.
+    with open(path.join(dirpath, 'columns.json'), 'r') as f:
+        names = json.load(f)
+    os.utime(dirpath)
+    return {name: np.load(path.join(dirpath, f'{idx}.npy'), mmap_mode='r')
+            for idx, name in enumerate(names)}
+
+
+def save_columns(dirpath, columns):
+    # Same as compile_cpp: write privately, then move in place
+    parent, key = path.split(dirpath)
+    builddir = mkdtemp(prefix=f'{key}.', dir=parent)
+    try:
+        for idx, arr in enumerate(columns.values()):
+            np.save(path.join(builddir, f'{idx}.npy'), np.asarray(arr))
+        with open(path.join(builddir, 'columns.json'), 'w') as f:
+            json.dump(list(columns), f)
+        os.rename(builddir, dirpath)
+    except OSError:  # Another job finished first, or out of space
+        shutil.rmtree(builddir, ignore_errors=True)
+
+
+def cached_columns(key, fetch, subdir='columns'):
+    # The dict of arrays returned by fetch(), cached as .npy files in the user
+    # cache under 'key'. Later calls with the same key read them back as
+    # read-only memory maps, without calling fetch.
+    dirpath = path.join(cache_dir(subdir), key)
+    if path.isdir(dirpath):
+        return load_columns(dirpath)
+
+    columns = fetch()
+    save_columns(dirpath, columns)
+    return columns
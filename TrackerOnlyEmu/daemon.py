@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 11:40 AM +0000
+#
+# A long-lived local worker that keeps ROOT, the compiled/declared trigger code
+# and the models in memory. Each job runs in a forked child, so jobs start from
+# the warm state but never see each other's changes.
+#
+# NOTE: This module must not import ROOT: the client side runs before the
+#       scripts import anything slow.
+
+import array
+import ctypes
+import json
+import os
+import runpy
+import signal
+import socket
+import struct
+import sys
+import traceback
+
+from os import path
+
+
+HEADER = struct.Struct('!I')
+STD_FDS = (0, 1, 2)
+
+
+############
+# Protocol #
+############
+
+def send_msg(sock, obj, fds=()):
+    payload = json.dumps(obj).encode('utf-8')
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                  array.array('i', fds))] if fds else []
+    sock.sendmsg([HEADER.pack(len(payload)) + payload], ancillary)
+
+
+def recv_exact(sock, size, buf=b''):
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError('Connection closed by peer')
+        buf += chunk
+    return buf
+
+
+def recv_msg(sock, maxfds=len(STD_FDS)):
+    # The file descriptors are attached to the first byte of the message
+    fds = array.array('i')
+    data, ancdata, _, _ = sock.recvmsg(
+        HEADER.size, socket.CMSG_SPACE(maxfds * fds.itemsize))
+    for level, kind, cdata in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cdata[:len(cdata) - len(cdata) % fds.itemsize])
+
+    size, = HEADER.unpack(recv_exact(sock, HEADER.size, data))
+    return json.loads(recv_exact(sock, size).decode('utf-8')), list(fds)
+
+
+##########
+# Client #
+##########
+
+def pop_daemon_arg(argv):
+    sock_path = None
+    remaining = []
+    args = iter(argv)
+
+    for arg in args:
+        if arg == '--daemon':
+            sock_path = next(args, None)
+        elif arg.startswith('--daemon='):
+            sock_path = arg.split('=', 1)[1]
+        else:
+            remaining.append(arg)
+
+    return sock_path, remaining
+
+
+def forward_to_daemon(script):
+    # If '--daemon <socket>' is given, run this script in the daemon instead and
+    # exit with its return code. Otherwise, just strip the option and return.
+    sock_path, argv = pop_daemon_arg(sys.argv[1:])
+    sys.argv = sys.argv[:1] + argv
+    if not sock_path:
+        return
+
+    job = {
+        'script': path.abspath(script),
+        'argv': argv,
+        'cwd': os.getcwd(),
+        'env': dict(os.environ),
+    }
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(sock_path)
+            # The job writes directly to our stdout/stderr
+            send_msg(sock, job, STD_FDS)
+            reply, _ = recv_msg(sock, 0)
+    except (ConnectionError, FileNotFoundError) as err:
+        print(f'Daemon at {sock_path} is not available ({err}), run locally',
+              file=sys.stderr)
+        return
+
+    sys.exit(reply['exit'])
+
+
+##########
+# Server #
+##########
+
+def flush_all():
+    sys.stdout.flush()
+    sys.stderr.flush()
+    ctypes.CDLL(None).fflush(None)  # C stdio, used by ROOT
+
+
+def exit_code(err):
+    if err.code is None:
+        return 0
+    if isinstance(err.code, int):
+        return err.code
+    print(err.code, file=sys.stderr)
+    return 1
+
+
+def run_job(conn):
+    job, fds = recv_msg(conn)
+    for fd, std_fd in zip(fds, STD_FDS):
+        os.dup2(fd, std_fd)
+        os.close(fd)
+
+    os.chdir(job['cwd'])
+    os.environ.clear()
+    os.environ.update(job['env'])
+    sys.argv = [job['script']] + job['argv']
+
+    code = 0
+    try:
+        runpy.run_path(job['script'], run_name='__main__')
+    except SystemExit as err:
+        code = exit_code(err)
+    except Exception:
+        traceback.print_exc()
+        code = 1
+
+    flush_all()
+    send_msg(conn, {'exit': code})
+    return code
+
+
+def serve(sock_path, preload=lambda: None):
+    preload()
+
+    if path.exists(sock_path):
+        os.unlink(sock_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(sock_path)
+    os.chmod(sock_path, 0o600)
+    server.listen()
+
+    # The children report their exit codes through the socket, so there's
+    # nothing to wait for
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    print(f'Listening on {sock_path}')
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            flush_all()
+
+            if os.fork() == 0:
+                server.close()
+                # The job itself may need to wait for its own subprocesses
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                code = 1
+                try:
+                    code = run_job(conn)
+                finally:
+                    conn.close()
+                    os._exit(code)
+
+            conn.close()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        server.close()
+        os.unlink(sock_path)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 09:30 PM +0000
+
+import re
+import ROOT
+
+from glob import escape, glob
+from os import path, remove
+from ROOT import TFileMerger
+
+from TrackerOnlyEmu.loader import DECLARED, replay_declarations
+
+
+##########
+# Frames #
+##########
+
+def dask_client(nworkers):
+    from dask.distributed import Client, LocalCluster
+
+    # One single-threaded process per worker: the emulation code is declared
+    # once per process
+    cluster = LocalCluster(n_workers=nworkers, threads_per_worker=1,
+                           processes=True)
+    return Client(cluster)
+
+
+def dist_rdataframe(tree, inputs, client, npartitions):
+    Distributed = ROOT.RDF.Experimental.Distributed
+
+    # Workers start with an empty interpreter, so replay everything declared
+    # here (trigger headers, calibration globals) before each task. Replaying
+    # is idempotent, so it is cheap after the first task on a worker.
+    Distributed.initialize(replay_declarations, list(DECLARED))
+
+    return Distributed.Dask.RDataFrame(
+        tree, inputs, npartitions=npartitions, daskclient=client)
+
+
+##########
+# Output #
+##########
+
+def partition_outputs(output):
+    # Each partition writes '<stem>_<partition id><ext>'
+    stem, ext = path.splitext(output)
+    regex = re.compile(re.escape(stem) + r'_(\d+)' + re.escape(ext) + '$')
+
+    parts = []
+    for f in glob(escape(stem) + '_*' + escape(ext)):
+        m = regex.match(f)
+        if m:
+            parts.append((int(m.group(1)), f))
+
+    return [f for _, f in sorted(parts)]
+
+
+def check_partition_outputs(output):
+    # Partitions would overwrite these files, and be merged with them
+    parts = partition_outputs(output)
+    if parts:
+        raise RuntimeError(
+            'Files named like the partition outputs of {} already exist, '
+            'remove or rename them first: {}'.format(output, ', '.join(parts)))
+
+
+def merge_partitions(output, compression=None):
+    # Partitions are contiguous entry ranges, numbered in input order.
+    # Concatenating them by partition id restores the input entry order.
+    # 'compression' is the 'algorithm * 100 + level' of the merged output.
+    # Only call this if check_partition_outputs passed before the Snapshot,
+    # as every '<stem>_<number><ext>' is merged, then removed.
+    parts = partition_outputs(output)
+    if not parts:
+        raise RuntimeError('No partition output found for {}'.format(output))
+
+    merger = TFileMerger(False)
+    if compression is None:
+        merger.OutputFile(output, 'RECREATE')
+    else:
+        merger.OutputFile(output, 'RECREATE', compression)
+    for p in parts:
+        merger.AddFile(p)
+
+    if not merger.Merge():
+        raise RuntimeError('Failed to merge partitions into {}'.format(output))
+
+    for p in parts:
+        remove(p)
+
+
+def dist_snapshot(frame, tree, output, branches, options=None,
+                  compression=None):
+    check_partition_outputs(output)
+
+    branches = [str(b) for b in branches]
+    if options is None:
+        frame.Snapshot(tree, output, branches)
+    else:
+        frame.Snapshot(tree, output, branches, options)
+    merge_partitions(output, compression)
@@ -4,14 +4,41 @@
 # License: BSD 2-clause
 # Last Change: Wed Dec 15, 2021 at 06:08 PM +0100
 
+from hashlib import sha1
 from itertools import combinations
-from ROOT import gInterpreter
 
-from TrackerOnlyEmu.loader import load_file, load_cpp
+from TrackerOnlyEmu.loader import load_lut, load_cpp, load_tree_ensemble, declare
 from TrackerOnlyEmu.executor import ExecDirective as EXEC
+from TrackerOnlyEmu.executor import NON_DETERMINISTIC_FUNCS
+from TrackerOnlyEmu.tck import load_tck_table, nominal_tck
+from TrackerOnlyEmu.tree_ensemble import XGB_LOGISTIC, read_trees
 from TrackerOnlyEmu.utils import func_call_gen
 
 
+# These kernels draw random numbers, so identical calls must not be merged
+NON_DETERMINISTIC_FUNCS.update([
+    'onlineTrackRecoEffCorr',
+    'hlt1GlobalPass',
+    'singlePartEt',
+    'isShared',
+])
+
+
+###########
+# Helpers #
+###########
+
+def rng_seed_directives(particles):
+    # Per-candidate seeds for the thread-safe kernels, see triggers/rng.h
+    load_cpp('<triggers/rng.h>')
+
+    return [
+        EXEC('Define', '{}_rng_seed'.format(p),
+             'candSeed(runNumber, eventNumber, {}_PT)'.format(p))
+        for p in particles
+    ]
+
+
 #################
 # L0 Hadron TOS #
 #################
@@ -45,6 +72,50 @@ XGB_TRAIN_BRANCHES = [
 ]
 
 
+# Main #########################################################################
+
+def run2_rdx_l0_hadron_tos_directive_gen(model, output='d0_l0_hadron_tos_emu',
+                                         train_brs=XGB_TRAIN_BRANCHES):
+    # Evaluate the pickled regressor (or its .trees) in the event loop, instead
+    # of calling predict_proba on the fetched feature matrix
+    load_cpp('<triggers/tree_ensemble.h>')
+
+    treespath = load_tree_ensemble(model)
+    ens = read_trees(treespath)
+    if ens.n_features != len(train_brs):
+        raise ValueError('{} takes {} features, got {}'.format(
+            model, ens.n_features, len(train_brs)))
+
+    name = 'L0_HADRON_TREES_{}'.format(
+        sha1(treespath.encode('utf-8')).hexdigest()[:12])
+    declare('const TreeEnsemble {} = readTreeEnsemble("{}");'.format(
+        name, treespath))
+
+    # Same types as predict_proba (float32) and predict (float64)
+    result_type = 'float' if ens.kind == XGB_LOGISTIC else 'double'
+    return [
+        EXEC('Define', output, 'static_cast<{}>({})'.format(
+            result_type, func_call_gen('predictTreeEnsemble',
+                                       [name] + train_brs)), True),
+    ]
+
+
+# Skims ########################################################################
+
+def run2_rdx_l0_hadron_tos_skim(acceptance, prob='d0_l0_hadron_tos_emu',
+                                key='d0_PT'):
+    # Requirement on the L0Hadron TOS probability 'prob' of the regressor:
+    #   - a float: the probability is above this threshold
+    #   - 'weight': keep each candidate with this probability, drawn from its
+    #     run, event number and 'key', so that the skim is an unweighted sample
+    if acceptance == 'weight':
+        load_cpp('<triggers/skim.h>')
+        return 'acceptByWeight({}, runNumber, eventNumber, {})'.format(
+            prob, key)
+
+    return '{} > {!r}'.format(prob, float(acceptance))
+
+
 #################
 # L0 Global TIS #
 #################
@@ -53,13 +124,14 @@ XGB_TRAIN_BRANCHES = [
 def run2_rdx_l0_global_tis_directive_gen(Bmeson, year, adhoc_tis_correction=True):
     load_cpp('<triggers/l0/run2-L0GlobalTIS.h>')
 
-    gInterpreter.Declare('auto histoResp = new TFile("{}");'.format(
-        load_file('<triggers/l0/l0_tis_efficiency.root>')))
+    # The efficiency maps are read from lookup tables, not from the ROOT file
+    declare('auto lutL0TisResp = new LutFile("{}");'.format(
+        load_lut('<triggers/l0/l0_tis_efficiency.root>')))
 
-    epilogue = '''
-    auto hResp = readL0GlobalTisResp(histoResp);
-    '''
-    gInterpreter.Declare(epilogue)
+    # Flat per-year table, so that the weight needs no lookup by year
+    table = 'hL0TisTable{}'.format(year)
+    declare('const auto {} = readL0GlobalTisTable(*lutL0TisResp, {});'.format(
+        table, year))
 
     # NOTE: For RDX, we use TRUE B momentum due to missing neutrinos
     return [
@@ -68,10 +140,10 @@ def run2_rdx_l0_global_tis_directive_gen(Bmeson, year, adhoc_tis_correction=True
         EXEC('Define', '{}_pt'.format(Bmeson),
              '{}_TRUEPT'.format(Bmeson), True),
         EXEC('Define', '{}_l0_global_tis_emu'.format(Bmeson),
-             'l0GlobalTisTriggerEmu({}, {}, {}, hResp, {})'.format(
+             'l0GlobalTisWeight({}, {}, {}, {})'.format(
                  '{}_pz'.format(Bmeson),
                  '{}_pt'.format(Bmeson),
-                 year, str(adhoc_tis_correction).lower()), True),
+                 table, str(adhoc_tis_correction).lower()), True),
     ]
 
 
@@ -115,6 +187,9 @@ TWO_TRACK_SPEC_BRANCHES = {
     'PY': 'PY',
 }
 
+# RelInfoHLT1Emulation stores the combinations of up to 6 tracks
+MAX_HLT1_TRACKS = 6
+
 TWO_TRACK_COMB_SPEC_BRANCHES = {
     'VDCHI2': 'VDCHI2_OWNPV_COMB',
     'SUMPT': 'SUMPT_COMB',
@@ -129,78 +204,194 @@ TWO_TRACK_COMB_SPEC_BRANCHES = {
 
 # Helpers ######################################################################
 
-def global_corr_gen(particle):
+def global_corr_gen(particle, thread_safe=False):
     params = [particle+'_'+b for b in GLOBAL_CORR_BRANCHES['particle']]
     params += GLOBAL_CORR_BRANCHES['global']
+    if thread_safe:
+        params.append(particle+'_rng_seed')
     return 'hlt1GlobalPass({})'.format(', '.join(params))
 
 
 def track_spec_gen(particles, branches):
+    # The fields are filled in the order of 'branches', which must follow the
+    # TwoTrackSpec struct
     specs = []
 
     for p in particles:
-        spec = []
-        for name, val in branches.items():
-            spec.append('{' + '"{}"'.format(name) + ', ' + p + '_' + val  + '}')
+        specs.append('TwoTrackSpec{' + ', '.join(
+            p + '_' + val for val in branches.values()) + '}')
 
-        specs.append('{' + ', '.join(spec) + '}')
-
-    return 'vector<map<string, double> >{' + ', '.join(specs) + '}'
+    return 'array<TwoTrackSpec, {}>{{'.format(len(specs)) + \
+        ', '.join(specs) + '}'
 
 
 def comb_spec_gen(particle, branches, suffixs):
+    # Same as above, with the TwoTrackCombSpec struct
     specs = []
 
     for suf1, suf2 in combinations(suffixs, 2):
-        spec = []
-        for name, val in branches.items():
-            spec.append(
-                '{' + '"{}"'.format(name) + ', ' + particle + '_' + val +
-                '_' + '{}_{}'.format(suf1, suf2) + '}')
+        specs.append('TwoTrackCombSpec{' + ', '.join(
+            particle + '_' + val + '_' + '{}_{}'.format(suf1, suf2)
+            for val in branches.values()) + '}')
+
+    return 'array<TwoTrackCombSpec, {}>{{'.format(len(specs)) + \
+        ', '.join(specs) + '}'
+
+
+def tck_params_name(tck, table):
+    if tck not in table:
+        raise ValueError('No dump for TCK {:#010x} in tck_info'.format(tck))
+    return 'HLT1_TCK_{:08x}'.format(tck)
+
+
+def run2_rdx_hlt1_tck_declare():
+    # Declare the thresholds of every dumped TCK as 'HLT1_TCK_<tck>'
+    load_cpp('<triggers/hlt1/run2-Hlt1Tck.h>')
+    table = load_tck_table()
+
+    for tck, params in sorted(table.items()):
+        declare('const Hlt1TckParams {}{{ {:#x}, {{ {} }}, {{ {} }} }};'.format(
+            tck_params_name(tck, table), tck,
+            ', '.join(repr(v) for v in params['Hlt1TrackMVA'].values()),
+            ', '.join(repr(v) for v in params['Hlt1TwoTrackMVA'].values())))
+
+    return table
+
+
+def tck_lookup_declare(table, fallback):
+    # Per-event TCK -> thresholds; TCKs without dump use those of 'fallback'
+    func = 'hlt1TckParamsOr{:08x}'.format(fallback)
+    cases = ' '.join('case {:#x}: return {};'.format(
+        tck, tck_params_name(tck, table)) for tck in sorted(table))
 
-        specs.append('{' + ', '.join(spec) + '}')
+    declare('const Hlt1TckParams& {}(unsigned tck) {{ switch (tck) {{ {} default: return {}; }} }}'.format(
+        func, cases, tck_params_name(fallback, table)))
+    return func
 
-    return 'vector<map<string, double> >{' + ', '.join(specs) + '}'
+
+def tck_run_map_declare(ranges):
+    # Return the expression of the TCK of each event, from the sorted
+    # (first_run, last_run, tck) of TrackerOnlyEmu.tck.load_run_tck_map
+    load_cpp('<triggers/hlt1/run2-Hlt1Tck.h>')
+    name = 'HLT1_TCK_RUNS_' + sha1(repr(ranges).encode()).hexdigest()[:16]
+
+    declare('const std::vector<Hlt1TckRunRange> {}{{ {} }};'.format(
+        name, ', '.join('{{ {}, {}, {:#x} }}'.format(*r) for r in ranges)))
+    return 'hlt1TckFromRun(runNumber, {})'.format(name)
 
 
 # Main #########################################################################
 
-def run2_rdx_hlt1_directive_gen(Bmeson, year):
+def run2_rdx_hlt1_directive_gen(Bmeson, year, thread_safe=False,
+                                daughters=('k', 'pi'), comb_tracks=3,
+                                parent='d0', tck=None, tck_weights=None):
+    # 'daughters' are the tracks to emulate the triggers for, and 'comb_tracks'
+    # the number of tracks in the <Bmeson>_*_COMB_i_j branches
+    #
+    # The thresholds are those hard-coded for 'year', unless 'tck' is given:
+    #   - an int: use the thresholds of this TCK for all events
+    #   - a str: an expression of the TCK of each event, e.g. the 'HLT1TCK'
+    #     branch or the output of tck_run_map_declare. TCKs without dump fall
+    #     back to the most used TCK of 'year'.
+    # With 'tck_weights' ({tck: weight}, see TrackerOnlyEmu.tck.tck_weights),
+    # the parent TOS are also emulated for each of these TCKs, and averaged
+    # with these weights, in the same pass.
+    if len(daughters) > MAX_HLT1_TRACKS or comb_tracks > MAX_HLT1_TRACKS:
+        raise ValueError('At most {} tracks are supported'.format(
+            MAX_HLT1_TRACKS))
+
     load_cpp('<triggers/hlt1/run2-Hlt1GEC.h>')
     load_cpp('<triggers/hlt1/run2-Hlt1TrackMVA.h>')
     load_cpp('<triggers/hlt1/run2-Hlt1TwoTrackMVA.h>')
     load_cpp('<triggers/kinematics.h>')
 
-    return [
-        # Various corrections
+    tck_directives = []
+    trackmva_thresholds = twotrackmva_thresholds = year
+    if tck is not None or tck_weights:
+        table = run2_rdx_hlt1_tck_declare()
+
+    if isinstance(tck, int):
+        params = tck_params_name(tck, table)
+        trackmva_thresholds = params+'.trackMva'
+        twotrackmva_thresholds = params+'.twoTrackMva'
+    elif tck is not None:
+        lookup = tck_lookup_declare(table, nominal_tck(year, table))
+        tck_directives.append(
+            EXEC('Define', 'hlt1_tck_params', '{}({})'.format(lookup, tck)))
+        trackmva_thresholds = 'hlt1_tck_params.trackMva'
+        twotrackmva_thresholds = 'hlt1_tck_params.twoTrackMva'
+
+    # In thread-safe mode, random numbers are drawn from per-candidate seeds
+    # instead of a global RNG
+    seeds = rng_seed_directives(daughters) if thread_safe else []
+
+    # Various corrections
+    directives = seeds + tck_directives + [
         EXEC('Define', 'pass_gec',
              func_call_gen('hlt1GEC', GEC_SEL_BRANCHES), True),
-        EXEC('Define', 'k_pass_hlt1_corr', global_corr_gen('k'), True),
-        EXEC('Define', 'pi_pass_hlt1_corr', global_corr_gen('pi'), True),
+    ] + [
+        EXEC('Define', p+'_pass_hlt1_corr',
+             global_corr_gen(p, thread_safe), True)
+        for p in daughters
+    ]
 
-        # Hlt1TrackMVA emulation
-        EXEC('Define', 'k_hlt1_trackmva_tos_emu',
+    # Hlt1TrackMVA emulation
+    directives += [
+        EXEC('Define', p+'_hlt1_trackmva_tos_emu',
              func_call_gen(
                  'hlt1TrackMVATriggerEmu',
-                 ['k_'+n for n in TRACK_SEL_BRANCHES] +
-                 ['k_pass_hlt1_corr', year]), True),
-        EXEC('Define', 'pi_hlt1_trackmva_tos_emu',
-             func_call_gen(
-                 'hlt1TrackMVATriggerEmu',
-                 ['pi_'+n for n in TRACK_SEL_BRANCHES] +
-                 ['pi_pass_hlt1_corr', year]), True),
-        EXEC('Define', 'd0_hlt1_trackmva_tos_emu',
-             'k_hlt1_trackmva_tos_emu || pi_hlt1_trackmva_tos_emu', True),
+                 [p+'_'+n for n in TRACK_SEL_BRANCHES] +
+                 [p+'_pass_hlt1_corr', trackmva_thresholds]), True)
+        for p in daughters
+    ]
+    directives.append(
+        EXEC('Define', parent+'_hlt1_trackmva_tos_emu',
+             ' || '.join(p+'_hlt1_trackmva_tos_emu' for p in daughters),
+             True))
 
-        # Hlt1TwoTrackMVA emulation
+    # Hlt1TwoTrackMVA emulation
+    directives += [
         EXEC('Define', 'vec_pass_hlt1_corr',
-             'vector<bool>{ k_pass_hlt1_corr, pi_pass_hlt1_corr }'),
+             'array<bool, {}>{{ {} }}'.format(
+                 len(daughters),
+                 ', '.join(p+'_pass_hlt1_corr' for p in daughters))),
         EXEC('Define', 'track_spec',
-             track_spec_gen(['k', 'pi'], TWO_TRACK_SPEC_BRANCHES)),
+             track_spec_gen(daughters, TWO_TRACK_SPEC_BRANCHES)),
         EXEC('Define', 'comb_spec',
-             comb_spec_gen(Bmeson,
-                           TWO_TRACK_COMB_SPEC_BRANCHES, range(1, 4))),
-        EXEC('Define', 'd0_hlt1_twotrackmva_tos_emu',
-             'hlt1TwoTrackMVATriggerEmu(track_spec, comb_spec, vec_pass_hlt1_corr, {})'.format(year),
+             comb_spec_gen(Bmeson, TWO_TRACK_COMB_SPEC_BRANCHES,
+                           range(1, comb_tracks+1))),
+        EXEC('Define', parent+'_hlt1_twotrackmva_tos_emu',
+             'hlt1TwoTrackMVATriggerEmu(track_spec, comb_spec, vec_pass_hlt1_corr, {})'.format(twotrackmva_thresholds),
              True),
     ]
+
+    # Per-TCK and TCK-averaged emulation
+    if tck_weights:
+        weighted = {'trackmva': [], 'twotrackmva': []}
+
+        for t, weight in sorted(tck_weights.items()):
+            params = tck_params_name(t, table)
+            suffix = '_tck_{:08x}'.format(t)
+
+            directives += [
+                EXEC('Define', parent+'_hlt1_trackmva_tos_emu'+suffix,
+                     ' || '.join(func_call_gen(
+                         'hlt1TrackMVATriggerEmu',
+                         [p+'_'+n for n in TRACK_SEL_BRANCHES] +
+                         [p+'_pass_hlt1_corr', params+'.trackMva'])
+                         for p in daughters), True),
+                EXEC('Define', parent+'_hlt1_twotrackmva_tos_emu'+suffix,
+                     'hlt1TwoTrackMVATriggerEmu(track_spec, comb_spec, vec_pass_hlt1_corr, {}.twoTrackMva)'.format(params),
+                     True),
+            ]
+            for trg in weighted:
+                weighted[trg].append('{!r}*{}_hlt1_{}_tos_emu{}'.format(
+                    weight, parent, trg, suffix))
+
+        directives += [
+            EXEC('Define', '{}_hlt1_{}_tos_emu_wgt'.format(parent, trg),
+                 ' + '.join(terms), True)
+            for trg, terms in weighted.items()
+        ]
+
+    return directives
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 09:20 PM +0000
+#
+# Vectorized NumPy version of the RDX run 2 HLT1 emulation, of the L0Hadron
+# HCAL response smearing and of the L0Global TIS weights, for analysis jobs that already hold the branches as
+# arrays (e.g. from uproot or pandas). It doesn't need ROOT at all.
+#
+# Each function mirrors the C++ kernel of the same name in triggers/hlt1 or
+# triggers/l0, but takes (and returns) one array element per event. The cuts are written in the
+# same form as in C++, so that NaN inputs fail them in the same way.
+#
+# The random numbers are those of the thread-safe C++ kernels (triggers/rng.h),
+# so the results agree event-by-event with 'run2-rdx-hlt1.py --threads N'.
+
+import numpy as np
+
+from itertools import combinations
+
+
+# Same as in run2_rdx, which can't be imported without ROOT
+GEC_SEL_BRANCHES = [
+    'NumVeloClusters',
+    'NumITClusters',
+    'NumOTClusters',
+]
+
+TRACK_SPEC_BRANCHES = {
+    'PT': 'PT',
+    'P': 'P',
+    'TRCHI2DOF': 'TRACK_CHI2NDOF',
+    'BPVIPCHI2': 'IPCHI2_OWNPV',
+    'TRGHOSTPROB': 'TRACK_GhostProb',
+    'PX': 'PX',
+    'PY': 'PY',
+    'nTTHits': 'TRACK_nTTHits',
+}
+
+COMB_SPEC_BRANCHES = {
+    'VDCHI2': 'VDCHI2_OWNPV_COMB',
+    'SUMPT': 'SUMPT_COMB',
+    'DOCA': 'DOCA_COMB',
+    'VCHI2': 'VERTEX_CHI2_COMB',
+    'BPVETA': 'ETA_COMB',
+    'BPVCORRM': 'MCORR_OWNPV_COMB',
+    'BPVDIRA': 'DIRA_OWNPV_COMB',
+    'MVA': 'Matrixnet_Hlt1TwoTrackMVAEmulations',
+}
+
+RUN2_YEARS = (2016, 2017, 2018)
+
+# See run2-Hlt1GEC.h
+EFF_CORRECTION = 0.042
+ONLINE_TRACK_RECO_EFF_STREAM = 7
+
+# Used to match the SUMPT of a combo to a pair of tracks, in MeV
+SUM_PT_THRESH = 1
+
+# See run2-L0Hadron.h
+P_BIN = 10
+PT_BIN = 6
+P_LOW, P_HIGH = 0, 1e5
+PT_LOW, PT_HIGH = 0, 15000
+HCAL_ET_MAX = 6100
+HCAL_RESP_STREAM = 40
+HCAL_RESP_GUIDE_SIZE = 64
+
+# See run2-L0GlobalTIS.h
+L0_GLOBAL_TIS_HISTOS = {
+    2016: 'Jpsi_data_eff0',
+    2017: 'Jpsi_data_eff1',
+    2018: 'Jpsi_data_eff2',
+}
+# year -> {PZ bin: (mean log(pT), eff, slope)}, stored as float in C++
+L0_GLOBAL_TIS_ADHOC = {
+    2016: {1: (9.576293217377373, 0.38961711525917053, -0.04307553315370772),
+           2: (9.645412819275125, 0.40560808777809143, 0.1920121662958972),
+           3: (9.724147903446033, 0.41952842473983765, 0.21584737936752765),
+           4: (9.80807058838877, 0.46126940846443176, 0.25353211968587264)},
+    2017: {1: (9.573918210303054, 0.3488537669181824, 0.19981855562035766),
+           2: (9.648051795507696, 0.3812873661518097, 0.1692287430651749),
+           3: (9.724531930069968, 0.42026373744010925, 0.20335972471697286),
+           4: (9.80744115981552, 0.4522625207901001, 0.2293965047341547)},
+    2018: {1: (9.575316536210408, 0.36407339572906494, -0.15023259431100983),
+           2: (9.64728926210228, 0.3955422341823578, 0.15679897820527733),
+           3: (9.72602227412706, 0.4256914556026459, 0.24396464174205812),
+           4: (9.807297853596634, 0.45863404870033264, 0.2866896902756077)},
+}
+
+
+##########
+# Helper #
+##########
+
+def check_year(year):
+    year = int(year)
+    if year != 2015 and year not in RUN2_YEARS:
+        raise ValueError('Year: {} not recognized.'.format(year))
+    return year
+
+
+#######
+# RNG #
+#######
+# Same as triggers/rng.h. uint64 arithmetic wraps around like in C++.
+
+def mix_bits(x):
+    with np.errstate(over='ignore'):
+        x = np.asarray(x, dtype=np.uint64) + np.uint64(0x9e3779b97f4a7c15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        return x ^ (x >> np.uint64(31))
+
+
+def cand_seed(run_number, event_number, key):
+    key_bits = np.ascontiguousarray(key, dtype=np.float64).view(np.uint64)
+    seed = mix_bits(run_number)
+    seed = mix_bits(seed ^ np.asarray(event_number, dtype=np.uint64))
+    return mix_bits(seed ^ key_bits)
+
+
+def uniform_from_seed(seed, stream):
+    bits = mix_bits(seed ^ mix_bits(np.uint64(stream))) >> np.uint64(11)
+    return bits * (1.0 / 9007199254740992.0)  # 2^-53
+
+
+############
+# Hlt1 GEC #
+############
+
+def online_track_reco_eff_corr(nTTHits, seed):
+    rand_num = uniform_from_seed(seed, ONLINE_TRACK_RECO_EFF_STREAM)
+    return ~((rand_num < EFF_CORRECTION) | (nTTHits < 3))
+
+
+def hlt1_gec(nVeloClusters, nITClusters, nOTClusters):
+    return ((nVeloClusters > 50) & (nVeloClusters < 6000) &
+            (nITClusters > 50) & (nITClusters < 3000) &
+            (nOTClusters > 50) & (nOTClusters < 15000))
+
+
+def hlt1_global_pass(nTTHits, nVeloClusters, nITClusters, nOTClusters, seed):
+    return online_track_reco_eff_corr(nTTHits, seed) & \
+        hlt1_gec(nVeloClusters, nITClusters, nOTClusters)
+
+
+################
+# Hlt1TrackMVA #
+################
+
+def track_mva_val(BPVIPCHI2, PT, param1, param2, param3, MAXPT=25000):
+    # PT == 1000 divides by 0, which gives inf as in C++
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log(BPVIPCHI2) > \
+            param1 / np.square(PT / 1000 - param2) + \
+            (param3 / MAXPT) * (MAXPT - PT) + np.log(7.4)
+
+
+def hlt1_track_input_dec(PT, P, TRCHI2DOF, TRGHOSTPROB, year):
+    if check_year(year) == 2015:
+        return (PT > 500) & (P > 3000) & (TRCHI2DOF < 4)
+    return (PT > 600) & (P > 5000) & (TRCHI2DOF < 4) & (TRGHOSTPROB < 999.0)
+
+
+def hlt1_track_mva_dec(PT, P, TRCHI2DOF, BPVIPCHI2, TRGHOSTPROB, year):
+    result = ~((TRCHI2DOF <= 0) | (BPVIPCHI2 <= 0)) & ~(TRCHI2DOF >= 2.5)
+    if check_year(year) in RUN2_YEARS:
+        result &= ~(TRGHOSTPROB >= 0.2)
+
+    return result & (
+        ((PT > 25000) & (BPVIPCHI2 > 7.4)) |
+        ((PT > 1000) & (PT < 25000) &
+         track_mva_val(BPVIPCHI2, PT, 1.0, 1.0, 1.1)))
+
+
+def hlt1_track_mva_trigger_emu(PT, P, TRCHI2DOF, BPVIPCHI2, TRGHOSTPROB,
+                               pass_sel, year):
+    return pass_sel & \
+        hlt1_track_input_dec(PT, P, TRCHI2DOF, TRGHOSTPROB, year) & \
+        hlt1_track_mva_dec(PT, P, TRCHI2DOF, BPVIPCHI2, TRGHOSTPROB, year)
+
+
+###################
+# Hlt1TwoTrackMVA #
+###################
+
+def hlt1_two_track_input_dec(PT, P, TRCHI2DOF, BPVIPCHI2, TRGHOSTPROB, year):
+    result = ~(TRCHI2DOF <= 0)
+    if check_year(year) == 2015:
+        return result & (PT > 500) & (P > 5000) & (TRCHI2DOF < 2.5) & \
+            (BPVIPCHI2 > 4.0)
+    return result & (PT > 600) & (P > 5000) & (TRCHI2DOF < 2.5) & \
+        (TRGHOSTPROB < 0.2) & (BPVIPCHI2 > 4.0)
+
+
+def hlt1_two_track_comb_dec(VDCHI2, DOCA, VCHI2, BPVETA, BPVCORRM, BPVDIRA,
+                            MVA, year):
+    # The part of hlt1TwoTrackMVADec that only depends on the combo
+    check_year(year)
+    valid = ~((VDCHI2 <= 0) | (VCHI2 <= 0) | (BPVCORRM <= 0))
+    sel_pre_vertexing = (DOCA > 0) & (DOCA < 10)
+    sel_combo = (VCHI2 < 10) & (BPVETA > 2) & (BPVETA < 5) & \
+        (BPVCORRM > 1000) & (BPVCORRM < 1000000000) & \
+        (BPVDIRA > 0) & (MVA > 0.95)
+    return valid & sel_pre_vertexing & sel_combo
+
+
+def hlt1_two_track_mva_dec(VDCHI2, APT, DOCA, VCHI2, BPVETA, BPVCORRM,
+                           BPVDIRA, MVA, year):
+    return ~(APT <= 0) & (APT > 2000) & hlt1_two_track_comb_dec(
+        VDCHI2, DOCA, VCHI2, BPVETA, BPVCORRM, BPVDIRA, MVA, year)
+
+
+def hlt1_two_track_mva_trigger_emu(track_spec, comb_spec, track_pass_sel,
+                                   year):
+    # 'track_spec' and 'comb_spec' map the fields of TwoTrackSpec and
+    # TwoTrackCombSpec to arrays of shape (tracks, events) and (combos, events);
+    # 'track_pass_sel' has the shape of the tracks. Each row is then contiguous,
+    # which is much faster than the other way around.
+    pass_input = track_pass_sel & hlt1_two_track_input_dec(
+        track_spec['PT'], track_spec['P'], track_spec['TRCHI2DOF'],
+        track_spec['BPVIPCHI2'], track_spec['TRGHOSTPROB'], year)
+
+    # Everything but the APT cut only depends on the combo, so it is done once
+    pass_comb = hlt1_two_track_comb_dec(
+        comb_spec['VDCHI2'], comb_spec['DOCA'], comb_spec['VCHI2'],
+        comb_spec['BPVETA'], comb_spec['BPVCORRM'], comb_spec['BPVDIRA'],
+        comb_spec['MVA'], year)
+    # NaN never matches, so that failing combos are dropped by the matching
+    sum_pt = np.where(pass_comb, comb_spec['SUMPT'], np.nan)
+
+    PT, PX, PY = track_spec['PT'], track_spec['PX'], track_spec['PY']
+    result = np.zeros(pass_input.shape[1], dtype=bool)
+
+    # Only (combos, events) arrays are alive at any time, which keeps the memory
+    # in check for large chunks. There are at most 15 pairs.
+    for i, j in combinations(range(pass_input.shape[0]), 2):
+        track_sum_pt = PT[i] + PT[j]
+        track_sum_px = PX[i] + PX[j]
+        track_sum_py = PY[i] + PY[j]
+        track_apt = np.sqrt(track_sum_px*track_sum_px +
+                            track_sum_py*track_sum_py)
+
+        # Only match the combos of the events that can still change
+        todo = np.flatnonzero(pass_input[i] & pass_input[j] &
+                              ~(track_apt <= 0) & (track_apt > 2000) & ~result)
+        track_sum_pt = track_sum_pt[todo]
+        comb_sum_pt = sum_pt[:, todo]
+
+        # Same window as the binary search in the C++ kernel
+        matched = (comb_sum_pt >= track_sum_pt - SUM_PT_THRESH) & \
+            (comb_sum_pt <= track_sum_pt + SUM_PT_THRESH)
+        result[todo] = np.any(matched, axis=0)
+
+    return result
+
+
+#################################
+# L0Hadron single HCAL response #
+#################################
+# Same layout as HcalRespCdf in run2-L0Hadron.h, as a dict of flat arrays
+
+def hcal_resp_bin_search(integral, q):
+    # TMath::BinarySearch of each q in 'integral'
+    pos = np.searchsorted(integral, q, side='left')
+    eq = (pos < len(integral)) & \
+        (integral[np.minimum(pos, len(integral)-1)] == q)
+    return np.where(eq, pos, pos-1)
+
+
+def hcal_resp_cdf(contents, low_edges, widths=None):
+    # P_BIN x PT_BIN nested lists of: the bin contents (without under/overflow),
+    # the nBins + 1 bin edges, and optionally the bin widths. Pass the widths
+    # as given by TH1::GetBinWidth to reproduce it to the last bit.
+    offset, integral, low_edge, width, guide = [0], [], [], [], []
+    quantiles = np.arange(HCAL_RESP_GUIDE_SIZE+1) / HCAL_RESP_GUIDE_SIZE
+
+    for i in range(P_BIN):
+        for j in range(PT_BIN):
+            cont = np.asarray(contents[i][j], dtype=np.float64)
+            edges = np.asarray(low_edges[i][j], dtype=np.float64)
+            wid = np.diff(edges) if widths is None else \
+                np.asarray(widths[i][j], dtype=np.float64)
+
+            # Same as TH1::ComputeIntegral: a sequential sum, then normalized
+            integ = np.concatenate([[0.], np.cumsum(cont)])
+            if integ[-1] != 0:
+                integ = integ / integ[-1]
+
+            integral.append(integ)
+            low_edge.append(edges)
+            width.append(np.append(wid, 0.))
+            offset.append(offset[-1] + len(integ))
+            guide.append(np.maximum(
+                hcal_resp_bin_search(integ[:-1], quantiles), 0))
+
+    return {
+        'offset': np.array(offset),
+        'integral': np.concatenate(integral),
+        'low_edge': np.concatenate(low_edge),
+        'width': np.concatenate(width),
+        'guide': np.concatenate(guide),
+    }
+
+
+def hcal_resp_cdf_from_histos(histos):
+    # From P_BIN x PT_BIN TH1Ds, e.g. readSinglePartResp, or anything with the
+    # same methods
+    def bins(hist):
+        return range(1, hist.GetNbinsX()+1)
+
+    return hcal_resp_cdf(
+        [[[h.GetBinContent(b) for b in bins(h)] for h in row]
+         for row in histos],
+        [[[h.GetBinLowEdge(b) for b in bins(h)] +
+          [h.GetBinLowEdge(h.GetNbinsX()+1)] for h in row] for row in histos],
+        [[[h.GetBinWidth(b) for b in bins(h)] for h in row]
+         for row in histos])
+
+
+def hcal_resp_cdf_from_file(ntp):
+    # From the hdiff_i_j histograms of an opened hcal_et_response.root
+    return hcal_resp_cdf_from_histos(
+        [[ntp.Get('hdiff_{}_{}'.format(i, j)) for j in range(PT_BIN)]
+         for i in range(P_BIN)])
+
+
+def hcal_resp_cdf_from_lut(maps):
+    # From the read_lut of the compiled hcal_et_response.root
+    resp = [[maps['hdiff_{}_{}'.format(i, j)] for j in range(PT_BIN)]
+            for i in range(P_BIN)]
+    bins = [[np.arange(1, m.axes[0].nbins+2) for m in row] for row in resp]
+
+    return hcal_resp_cdf(
+        [[m.content[1:-1] for m in row] for row in resp],
+        [[m.axes[0].bin_low_edge(b) for m, b in zip(row, brow)]
+         for row, brow in zip(resp, bins)],
+        [[m.axes[0].bin_width(b[:-1]) for m, b in zip(row, brow)]
+         for row, brow in zip(resp, bins)])
+
+
+def compute_resp_bin(x, x_low, x_high, num_bins):
+    bins = np.floor(np.asarray(x, dtype=np.float64) / (x_high-x_low) *
+                    num_bins)
+    bins = np.where(bins >= 0, bins, 0)  # Also NaN
+    return np.minimum(bins, num_bins-1).astype(np.int64)
+
+
+def sample_hcal_resp(cdf, bin_p, bin_pt, rnd):
+    integral = cdf['integral']
+    h = np.asarray(bin_p)*PT_BIN + np.asarray(bin_pt)
+    first = cdf['offset'][h]
+    empty = integral[cdf['offset'][h+1]-1] == 0
+
+    k = np.minimum((rnd*HCAL_RESP_GUIDE_SIZE).astype(np.int64),
+                   HCAL_RESP_GUIDE_SIZE-1)
+    guide = h*(HCAL_RESP_GUIDE_SIZE+1) + k
+    lo = first + cdf['guide'][guide]
+    hi = first + cdf['guide'][guide+1] + 1
+
+    # Branchless lower_bound in [lo, hi), as hcalRespBinSearch. The guide table
+    # keeps the ranges short, so this takes a few iterations only.
+    pos, count = lo, hi - lo
+    while np.any(count > 0):
+        step = count // 2
+        mid = pos + step
+        less = (count > 0) & (integral[mid] < rnd)
+        pos = np.where(less, mid+1, pos)
+        count = np.where(less, count-step-1, step)
+
+    eq = (pos < hi) & (integral[np.minimum(pos, len(integral)-1)] == rnd)
+    bin_idx = np.where(eq, pos, pos-1)
+
+    lower = integral[bin_idx]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        interp = cdf['width'][bin_idx] * (rnd - lower) / \
+            (integral[bin_idx+1] - lower)
+    x = np.where(rnd > lower, cdf['low_edge'][bin_idx] + interp,
+                 cdf['low_edge'][bin_idx])
+    return np.where(empty, 0., x)
+
+
+def smear_single_part_et(realET, smear_factor):
+    smeared_et = realET * (1 - smear_factor)
+    smeared_et = np.where(smeared_et < 0, 0., smeared_et)
+    return np.where(smeared_et > HCAL_ET_MAX, HCAL_ET_MAX, smeared_et)
+
+
+def single_part_et(P, PT, realET, cdf, seed):
+    bin_p = compute_resp_bin(P, P_LOW, P_HIGH, P_BIN)
+    bin_pt = compute_resp_bin(PT, PT_LOW, PT_HIGH, PT_BIN)
+    return smear_single_part_et(
+        np.asarray(realET, dtype=np.float64),
+        sample_hcal_resp(cdf, bin_p, bin_pt,
+                         uniform_from_seed(seed, HCAL_RESP_STREAM)))
+
+
+################
+# L0Global TIS #
+################
+# Same layout as L0GlobalTisTable in run2-L0GlobalTIS.h
+
+def l0_global_tis_table(maps, year):
+    # From the read_lut of the compiled l0_tis_efficiency.root. The ad-hoc
+    # correction of each PZ bin is NaN where there is none.
+    year = int(year)
+    if year not in L0_GLOBAL_TIS_HISTOS:
+        raise ValueError('Year: {} not recognized.'.format(year))
+    resp = maps[L0_GLOBAL_TIS_HISTOS[year]]
+
+    adhoc = np.full((resp.axes[0].nbins+2, 3), np.nan, dtype=np.float32)
+    for bin_pz, params in L0_GLOBAL_TIS_ADHOC[year].items():
+        if bin_pz < len(adhoc):
+            adhoc[bin_pz] = params
+
+    return {'resp': resp, 'adhoc': adhoc}
+
+
+def l0_global_tis_weight(PZ, PT, table, adhoc_correction=True):
+    PZ = np.asarray(PZ, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_pz = np.log(PZ)
+        log_pt = np.log(np.asarray(PT, dtype=np.float64))
+
+    resp = table['resp']
+    bin_pz = resp.axes[0].find_bin(log_pz)
+    bin_pt = resp.axes[1].find_bin(log_pt)
+    weight = resp.bin_content(bin_pz, bin_pt)
+
+    if adhoc_correction:
+        # Only in the high log(pT) bin
+        mean, eff, slope = table['adhoc'][bin_pz].astype(np.float64).T
+        corrected = (bin_pt == resp.axes[1].nbins) & ~np.isnan(mean)
+        weight = np.where(corrected, slope * (log_pt - mean) + eff, weight)
+
+    return np.where(PZ > 0, weight, 0.).astype(np.float32)
+
+
+########
+# Main #
+########
+
+def run2_rdx_hlt1_input_branches(Bmeson, daughters=('k', 'pi'), comb_tracks=3):
+    branches = ['runNumber', 'eventNumber'] + GEC_SEL_BRANCHES
+    branches += [p+'_'+b for p in daughters
+                 for b in TRACK_SPEC_BRANCHES.values()]
+    branches += ['{}_{}_{}_{}'.format(Bmeson, b, i, j)
+                 for b in COMB_SPEC_BRANCHES.values()
+                 for i, j in combinations(range(1, comb_tracks+1), 2)]
+    return branches
+
+
+def run2_rdx_hlt1_numpy(columns, Bmeson, year, daughters=('k', 'pi'),
+                        comb_tracks=3, parent='d0'):
+    # 'columns' is anything indexable by branch name, e.g. the output of
+    # AsNumpy, a pandas DataFrame or a structured array. The output has the same
+    # branches as run2_rdx_hlt1_directive_gen.
+    def col(name):
+        return np.asarray(columns[name])
+
+    result = dict()
+    result['pass_gec'] = hlt1_gec(*[col(b) for b in GEC_SEL_BRANCHES])
+
+    track_spec = {
+        field: np.stack([col(p+'_'+b) for p in daughters])
+        for field, b in TRACK_SPEC_BRANCHES.items()}
+    comb_spec = {
+        field: np.stack(
+            [col('{}_{}_{}_{}'.format(Bmeson, b, i, j))
+             for i, j in combinations(range(1, comb_tracks+1), 2)])
+        for field, b in COMB_SPEC_BRANCHES.items()}
+
+    # The seeds use the PT as stored, as candSeed gets it
+    seeds = cand_seed(col('runNumber'), col('eventNumber'), track_spec['PT'])
+    pass_corr = hlt1_global_pass(
+        track_spec['nTTHits'], *[col(b) for b in GEC_SEL_BRANCHES], seeds)
+
+    trackmva = hlt1_track_mva_trigger_emu(
+        track_spec['PT'], track_spec['P'], track_spec['TRCHI2DOF'],
+        track_spec['BPVIPCHI2'], track_spec['TRGHOSTPROB'], pass_corr, year)
+
+    for idx, p in enumerate(daughters):
+        result[p+'_pass_hlt1_corr'] = pass_corr[idx]
+        result[p+'_hlt1_trackmva_tos_emu'] = trackmva[idx]
+
+    result[parent+'_hlt1_trackmva_tos_emu'] = np.any(trackmva, axis=0)
+    result[parent+'_hlt1_twotrackmva_tos_emu'] = \
+        hlt1_two_track_mva_trigger_emu(track_spec, comb_spec, pass_corr, year)
+
+    return result
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 12:50 PM +0000
+#
+# Synthetic ntuples with the branches read by the RDX run 2 emulation. The
+# distributions only roughly resemble the real ones: they are meant for
+# benchmarking and regression testing, not for physics.
+
+from itertools import combinations, count
+
+from TrackerOnlyEmu.loader import load_cpp
+from TrackerOnlyEmu.executor import ExecDirective as EXEC
+from TrackerOnlyEmu.emulation.run2_rdx import (
+    XGB_TRAIN_BRANCHES,
+    GEC_SEL_BRANCHES,
+    GLOBAL_CORR_BRANCHES,
+    TRACK_SEL_BRANCHES,
+    TWO_TRACK_SPEC_BRANCHES,
+    TWO_TRACK_COMB_SPEC_BRANCHES,
+)
+
+
+#################
+# Configurables #
+#################
+
+TRACKS = ['k', 'pi']
+COMB_INDICES = range(1, 4)
+
+# name -> (distribution, parameters)
+GLOBAL_DISTS = {
+    'nTracks': ('Uniform', 20, 600),
+    'NumSPDHits': ('Uniform', 50, 600),
+    'NumVeloClusters': ('Uniform', 100, 6500),
+    'NumITClusters': ('Uniform', 100, 3200),
+    'NumOTClusters': ('Uniform', 1000, 16000),
+}
+
+TRACK_DISTS = {
+    'eta': ('Uniform', 2, 5),
+    'phi': ('Uniform', -3.141592653589793, 3.141592653589793),
+    'pt_exp': ('Exp', 1500),
+    'TRACK_CHI2NDOF': ('Exp', 1),
+    'IPCHI2_OWNPV': ('Exp', 40),
+    'TRACK_GhostProb': ('Uniform', 0, 0.4),
+    'TRACK_nTTHits': ('Uniform', 0, 9),
+    'hcal_resp': ('Gaus', 1, 0.25),
+    'hcal_trg_resp': ('Gaus', 1, 0.1),
+    'L0Calo_HCAL_xProjection': ('Uniform', -4000, 4000),
+    'L0Calo_HCAL_yProjection': ('Uniform', -3000, 3000),
+}
+
+COMB_DISTS = {
+    'VDCHI2_OWNPV_COMB': ('Exp', 500),
+    'SUMPT_COMB': ('Uniform', 1000, 12000),
+    'DOCA_COMB': ('Exp', 0.05),
+    'VERTEX_CHI2_COMB': ('Exp', 3),
+    'ETA_COMB': ('Uniform', 2, 5),
+    'MCORR_OWNPV_COMB': ('Uniform', 1000, 10000),
+    'dira_exp': ('Exp', 1e-3),
+    'Matrixnet_Hlt1TwoTrackMVAEmulations': ('Uniform', 0, 1),
+}
+
+# Branches that are integers in the real ntuples
+INT_BRANCHES = list(GLOBAL_DISTS) + [
+    p+'_'+b for p in TRACKS for b in ['TRACK_nTTHits', 'L0Calo_HCAL_region']]
+
+
+###########
+# Helpers #
+###########
+
+def dist_gen(streams, seed, dist, *params):
+    return 'synth{}(rdfentry_, {}, {}, {})'.format(
+        dist, seed, next(streams), ', '.join(str(p) for p in params))
+
+
+def output_branches(Bmeson='b0'):
+    # Everything the emulation and the L0Hadron regressor training read
+    brs = ['runNumber', 'eventNumber'] + XGB_TRAIN_BRANCHES
+    brs += GEC_SEL_BRANCHES
+    brs += [p+'_'+b for p in TRACKS
+            for b in TRACK_SEL_BRANCHES + list(TWO_TRACK_SPEC_BRANCHES.values()) +
+            GLOBAL_CORR_BRANCHES['particle'] + ['L0Calo_HCAL_TriggerET']]
+    brs += ['{}_{}_{}_{}'.format(Bmeson, b, i, j)
+            for i, j in combinations(COMB_INDICES, 2)
+            for b in TWO_TRACK_COMB_SPEC_BRANCHES.values()]
+    brs += ['{}_TRUEPT'.format(Bmeson), '{}_TRUEP_Z'.format(Bmeson)]
+    brs += ['d0_L0HadronDecision_TOS', '{}_L0Global_TIS'.format(Bmeson),
+            'FitVar_q2', 'FitVar_Mmiss2', 'FitVar_El', 'NumSPDHits']
+
+    return list(dict.fromkeys(brs))
+
+
+########
+# Main #
+########
+
+def run2_rdx_synthetic_directive_gen(Bmeson='b0', seed=0):
+    load_cpp('<triggers/synthetic.h>')
+
+    # Each distribution draws from its own stream. Append new ones at the end,
+    # so that the existing branches don't change.
+    streams = count()
+    directives = [
+        EXEC('Define', 'runNumber',
+             'static_cast<UInt_t>(170000 + rdfentry_ / 100000)'),
+        EXEC('Define', 'eventNumber', 'static_cast<ULong64_t>(rdfentry_)'),
+    ]
+
+    for br, (dist, *params) in GLOBAL_DISTS.items():
+        expr = dist_gen(streams, seed, dist, *params)
+        if br in INT_BRANCHES:
+            expr = 'static_cast<Int_t>({})'.format(expr)
+        directives.append(EXEC('Define', br, expr))
+
+    for p in TRACKS:
+        for name, (dist, *params) in TRACK_DISTS.items():
+            br = p+'_'+name
+            expr = dist_gen(streams, seed, dist, *params)
+            if br in INT_BRANCHES:
+                expr = 'static_cast<Int_t>({})'.format(expr)
+            directives.append(EXEC('Define', br, expr))
+
+        directives += [
+            EXEC('Define', p+'_PT', '300 + {}_pt_exp'.format(p)),
+            EXEC('Define', p+'_P', '{0}_PT * TMath::CosH({0}_eta)'.format(p)),
+            EXEC('Define', p+'_PX', '{0}_PT * TMath::Cos({0}_phi)'.format(p)),
+            EXEC('Define', p+'_PY', '{0}_PT * TMath::Sin({0}_phi)'.format(p)),
+            EXEC('Define', p+'_PZ', '{0}_PT * TMath::SinH({0}_eta)'.format(p)),
+            EXEC('Define', p+'_L0Calo_HCAL_realET',
+                 'TMath::Max(0., {0}_PT * {0}_hcal_resp)'.format(p)),
+            EXEC('Define', p+'_L0Calo_HCAL_TriggerET',
+                 'TMath::Min(6120., TMath::Max(0., {0}_L0Calo_HCAL_realET * {0}_hcal_trg_resp))'.format(p)),
+            # 1: inner, 2: outer
+            EXEC('Define', p+'_L0Calo_HCAL_region',
+                 'static_cast<Int_t>(TMath::Abs({0}_L0Calo_HCAL_xProjection) < 2000 && TMath::Abs({0}_L0Calo_HCAL_yProjection) < 1500 ? 1 : 2)'.format(p)),
+        ]
+
+    directives += [
+        EXEC('Define', 'd0_PX', 'k_PX + pi_PX'),
+        EXEC('Define', 'd0_PY', 'k_PY + pi_PY'),
+        EXEC('Define', 'd0_PZ', 'k_PZ + pi_PZ'),
+        EXEC('Define', 'd0_PT', 'TMath::Sqrt(d0_PX*d0_PX + d0_PY*d0_PY)'),
+        EXEC('Define', 'd0_P', 'TMath::Sqrt(d0_PT*d0_PT + d0_PZ*d0_PZ)'),
+    ]
+
+    for i, j in combinations(COMB_INDICES, 2):
+        for name, (dist, *params) in COMB_DISTS.items():
+            directives.append(EXEC(
+                'Define', '{}_{}_{}_{}'.format(Bmeson, name, i, j),
+                dist_gen(streams, seed, dist, *params)))
+        directives.append(EXEC(
+            'Define', '{}_DIRA_OWNPV_COMB_{}_{}'.format(Bmeson, i, j),
+            '1 - {}_dira_exp_{}_{}'.format(Bmeson, i, j)))
+
+    directives += [
+        EXEC('Define', Bmeson+'_TRUEPT',
+             '1000 + {}'.format(dist_gen(streams, seed, 'Exp', 7000))),
+        EXEC('Define', Bmeson+'_TRUEP_Z',
+             '{}_TRUEPT * TMath::SinH({})'.format(
+                 Bmeson, dist_gen(streams, seed, 'Uniform', 2, 5))),
+
+        # References, loosely correlated with the inputs
+        EXEC('Define', 'd0_L0HadronDecision_TOS',
+             'synthUniform(rdfentry_, {}, {}, 0, 1) < 1 / (1 + TMath::Exp(-(TMath::Max(k_L0Calo_HCAL_TriggerET, pi_L0Calo_HCAL_TriggerET) - 3500) / 500))'.format(
+                 seed, next(streams))),
+        EXEC('Define', Bmeson+'_L0Global_TIS',
+             dist_gen(streams, seed, 'Bool', 0.3)),
+
+        # Fit variables
+        EXEC('Define', 'FitVar_q2',
+             dist_gen(streams, seed, 'Uniform', -2e6, 12e6)),
+        EXEC('Define', 'FitVar_Mmiss2',
+             dist_gen(streams, seed, 'Uniform', -2e6, 10e6)),
+        EXEC('Define', 'FitVar_El',
+             dist_gen(streams, seed, 'Uniform', 0, 2.5e3)),
+    ]
+
+    kept = set(output_branches(Bmeson))
+    for d in directives:
+        d.keep = d.branch in kept
+
+    return directives
@@ -2,10 +2,12 @@
 #
 # Author: Yipeng Sun
 # License: BSD 2-clause
-# Last Change: Fri Oct 29, 2021 at 04:01 PM +0200
+# Last Change: Sun Oct 18, 2026 at 10:40 PM +0000
+
+import re
 
 from dataclasses import dataclass
-from ROOT import RDataFrame
+from ROOT import RDataFrame, RDF
 from ROOT.std import vector
 
 
@@ -17,19 +19,121 @@ class ExecDirective:
     keep: bool = False
 
 
+# Functions that draw random numbers. Two identical calls to these are NOT the
+# same column, so the planner must never merge them. They are registered by
+# the modules defining them (e.g. emulation.run2_rdx), so only directives built
+# by such modules may be planned.
+NON_DETERMINISTIC_FUNCS = set()
+
+IDENTIFIER = re.compile(r'(?<![\w.])[A-Za-z_]\w*')
+STRING_LITERAL = re.compile(r'"(?:\\.|[^"\\])*"')
+
+
+###########
+# Planner #
+###########
+
+def normalize_instruct(instruct):
+    return re.sub(r'\s+', ' ', instruct.strip())
+
+
+def instruct_identifiers(instruct):
+    if instruct is None:
+        return set()
+    return set(IDENTIFIER.findall(STRING_LITERAL.sub('""', instruct)))
+
+
+def directive_deps(d, columns):
+    if d.op == 'Alias':
+        return {d.instruct}
+    return instruct_identifiers(d.instruct) & columns
+
+
+def is_deterministic(instruct):
+    return not instruct_identifiers(instruct) & NON_DETERMINISTIC_FUNCS
+
+
+def plan_directives(directives, columns=(), keep=(), alias=True):
+    # Build the column DAG, turn pure copies and repeated expressions into
+    # aliases, then drop every Define that no kept branch or Filter needs.
+    columns = set(columns)
+    aliases = dict()
+    exprs = dict()
+    rewritten = []
+
+    for d in directives:
+        if d.op != 'Define':
+            rewritten.append(d)
+            continue
+
+        expr = normalize_instruct(d.instruct)
+        target = None
+
+        if IDENTIFIER.fullmatch(expr) and expr in columns and \
+                expr != d.branch:
+            target = aliases.get(expr, expr)
+        elif expr in exprs and is_deterministic(expr):
+            target = exprs[expr]
+        else:
+            exprs[expr] = d.branch
+
+        if alias and target is not None:
+            aliases[d.branch] = target
+            d = ExecDirective('Alias', d.branch, target, d.keep)
+
+        columns.add(d.branch)
+        rewritten.append(d)
+
+    needed = set(keep) | {d.branch for d in rewritten if d.keep}
+    planned = []
+
+    for d in reversed(rewritten):
+        if d.op in ['Define', 'Alias'] and d.branch not in needed:
+            continue
+        needed |= directive_deps(d, columns)
+        planned.append(d)
+
+    return planned[::-1]
+
+
+def skim_directives(directives, instruct):
+    # Add a Filter right after the last directive defining a column it reads.
+    # Defines are evaluated lazily, so the columns not needed by the Filter
+    # are then only evaluated for the entries that pass.
+    needed = instruct_identifiers(instruct)
+    pos = 0
+    for idx, d in enumerate(directives):
+        if d.branch in needed:
+            pos = idx + 1
+
+    return directives[:pos] + [ExecDirective('Filter', instruct=instruct)] + \
+        directives[pos:]
+
+
+############
+# Executor #
+############
+
 def process_single_directive(attr, branch, instruct):
     if branch is not None:
         return attr(branch, instruct)
     return attr(instruct)
 
 
-def process_directives(directives, init_frame):
+def process_directives(directives, init_frame, optimize=False, keep=(),
+                       alias=True):
+    # With 'optimize', the directives are planned first (see plan_directives)
     frames = []
     branches = vector('string')()
 
     if not directives:
         return [init_frame], branches
 
+    if optimize:
+        directives = plan_directives(
+            directives, [str(c) for c in init_frame.GetColumnNames()], keep,
+            alias)
+
     for d in directives:
         if not frames:
             prev_frame = init_frame
@@ -43,9 +147,21 @@ def process_directives(directives, init_frame):
         if d.keep:
             branches.push_back(d.branch)
 
+    if not frames:
+        frames.append(init_frame)
+
     return frames, branches
 
 
+def run_graphs(handles):
+    # Trigger all lazy results at once. The graphs are jitted together, and run
+    # concurrently if implicit multithreading is enabled.
+    if len(handles) == 1:
+        handles[0].GetValue()
+    elif handles:
+        RDF.RunGraphs(handles)
+
+
 def merge_vectors(*vecs, template='string'):
     base = vector(template)()
 
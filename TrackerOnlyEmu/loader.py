@@ -2,10 +2,55 @@
 #
 # Author: Yipeng Sun
 # License: BSD 2-clause
-# Last Change: Sun Apr 11, 2021 at 11:36 PM +0200
+# Last Change: Sun Oct 18, 2026 at 10:10 PM +0000
 
+import os
+import pickle
+import shutil
+import warnings
+
+from contextlib import contextmanager
 from os import path
-from ROOT import gInterpreter
+from tempfile import mkdtemp, mkstemp
+from ROOT import gInterpreter, gSystem, gROOT, TFile
+
+from TrackerOnlyEmu.cache import cache_dir, source_files, content_hash
+from TrackerOnlyEmu.cache import file_hash
+from TrackerOnlyEmu.lut import LUT_VERSION, compile_lut, lut_source
+from TrackerOnlyEmu.tree_ensemble import TREES_VERSION, flatten_model, write_trees
+from TrackerOnlyEmu.tree_ensemble import trees_source
+
+
+# Everything given to the interpreter, in order, so that it can be replayed in
+# another process (e.g. on a distributed worker)
+DECLARED = []
+
+# What the loaders are asked for inside record_sources blocks, innermost last.
+# Unlike DECLARED, this includes what was already loaded before.
+RECORDERS = []
+
+# Unpickled objects, keyed by path and modification time, so that a long-lived
+# process (e.g. the daemon) doesn't unpickle the same model twice
+PICKLES = {}
+
+
+@contextmanager
+def record_sources():
+    # Collect the ('file', path) and ('declare', code) that the code in the
+    # block depends on: headers with their includes, lookup tables, flattened
+    # models and declarations
+    sources = []
+    RECORDERS.append(sources)
+    try:
+        yield sources
+    finally:
+        RECORDERS.pop()
+
+
+def record_source(kind, payload):
+    for sources in RECORDERS:
+        if (kind, payload) not in sources:
+            sources.append((kind, payload))
 
 
 def load_file(filepath, current_file_path=__file__):
@@ -16,11 +61,171 @@ def load_file(filepath, current_file_path=__file__):
     return filepath
 
 
-def load_cpp(filepath, current_file_path=__file__):
+def load_pickle(filepath):
+    filepath = path.abspath(filepath)
+    key = (filepath, path.getmtime(filepath))
+    if key not in PICKLES:
+        with open(filepath, 'rb') as f:
+            PICKLES[key] = pickle.load(f)
+
+    return PICKLES[key]
+
+
+def load_lut(filepath, current_file_path=__file__):
+    # Path to the lookup tables (see TrackerOnlyEmu.lut) of the histograms of
+    # a ROOT file. A '.lut' next to it that was compiled from it is used as
+    # is, otherwise the tables are compiled once into the user cache.
+    filepath = path.abspath(load_file(filepath, current_file_path))
+    shipped = path.splitext(filepath)[0] + '.lut'
+    if path.isfile(shipped):
+        if lut_source(shipped) == file_hash(filepath):
+            record_source('file', shipped)
+            return shipped
+        warnings.warn('{} was not compiled from {}, ignoring it'.format(
+            shipped, filepath))
+
+    stem = path.splitext(path.basename(filepath))[0]
+    key = content_hash([filepath], LUT_VERSION)
+    lutpath = path.join(cache_dir('lut'), f'{stem}_{key}.lut')
+    record_source('file', lutpath)
+    if path.isfile(lutpath):
+        return lutpath
+
+    # Same as compile_cpp: write privately, then move in place
+    fd, tmppath = mkstemp(prefix=f'{stem}_{key}.', dir=cache_dir('lut'))
+    os.close(fd)
+    ntp = TFile(filepath)
+    try:
+        compile_lut(ntp, tmppath, source=file_hash(filepath))
+    except Exception:
+        os.remove(tmppath)
+        raise
+    finally:
+        ntp.Close()
+    os.replace(tmppath, lutpath)
+
+    return lutpath
+
+
+def load_tree_ensemble(filepath, current_file_path=__file__):
+    # Path to the flattened tree ensemble (see TrackerOnlyEmu.tree_ensemble) of
+    # a pickled regressor. A '.trees' file, or one next to the pickle that was
+    # flattened from it, is used as is, without scikit-learn nor XGBoost.
+    # Otherwise, the model is flattened once into the user cache.
+    filepath = path.abspath(load_file(filepath, current_file_path))
+    if filepath.endswith('.trees'):
+        record_source('file', filepath)
+        return filepath
+    shipped = path.splitext(filepath)[0] + '.trees'
+    if path.isfile(shipped):
+        if trees_source(shipped) == file_hash(filepath):
+            record_source('file', shipped)
+            return shipped
+        warnings.warn('{} was not flattened from {}, ignoring it'.format(
+            shipped, filepath))
+
+    stem = path.splitext(path.basename(filepath))[0]
+    key = content_hash([filepath], TREES_VERSION)
+    treespath = path.join(cache_dir('trees'), f'{stem}_{key}.trees')
+    record_source('file', treespath)
+    if path.isfile(treespath):
+        return treespath
+
+    ens = flatten_model(load_pickle(filepath))
+    fd, tmppath = mkstemp(prefix=f'{stem}_{key}.', dir=cache_dir('trees'))
+    os.close(fd)
+    try:
+        write_trees(tmppath, ens, file_hash(filepath))
+    except Exception:
+        os.remove(tmppath)
+        raise
+    os.replace(tmppath, treespath)
+
+    return treespath
+
+
+def add_include_path(dirpath):
+    entry = ('include_path', dirpath)
+    if entry not in DECLARED:
+        gInterpreter.AddIncludePath(dirpath)
+        DECLARED.append(entry)
+
+
+def declare(code):
+    # Declaring the same code twice would redefine globals, so skip it
+    record_source('declare', code)
+    entry = ('declare', code)
+    if entry not in DECLARED:
+        gInterpreter.Declare(code)
+        DECLARED.append(entry)
+
+
+def load_library(libpath):
+    entry = ('load', libpath)
+    if entry not in DECLARED:
+        if gSystem.Load(libpath) < 0:
+            raise RuntimeError(f'Failed to load {libpath}')
+        DECLARED.append(entry)
+
+
+def replay_declarations(entries):
+    for kind, payload in entries:
+        if kind == 'include_path':
+            add_include_path(payload)
+        elif kind == 'load':
+            load_library(payload)
+        else:
+            declare(payload)
+
+
+def compile_cpp(filepath):
+    # Compile a header with ACLiC into the user cache, once per combination of
+    # header contents (including its local '#include "..."'s) and ROOT version.
+    # Return the path to the library, or None if the compilation failed.
+    filepath = path.abspath(filepath)
+    stem = path.splitext(path.basename(filepath))[0]
+    key = content_hash(source_files(filepath), gROOT.GetVersion())
+
+    libdir = path.join(cache_dir('lib'), f'{stem}_{key}')
+    libname = f'{stem}.{gSystem.GetSoExt()}'
+    libpath = path.join(libdir, libname)
+    if path.isfile(libpath):
+        return libpath
+
+    # Build in a private directory, then move it in place, so that concurrent
+    # jobs sharing the cache never see a partially written library
+    builddir = mkdtemp(prefix=f'{stem}_{key}.', dir=cache_dir('lib'))
+    # k: keep the library; O: optimize; c: compile only, don't load
+    if not gSystem.CompileMacro(filepath, 'kOc', path.join(builddir, libname),
+                                builddir):
+        shutil.rmtree(builddir, ignore_errors=True)
+        return None
+
+    try:
+        os.rename(builddir, libdir)
+    except OSError:  # Another job finished first
+        shutil.rmtree(builddir, ignore_errors=True)
+
+    return libpath
+
+
+def load_cpp(filepath, current_file_path=__file__, compile=True):
     filepath = load_file(filepath, current_file_path)
 
-    # Now load the CPP file in ROOT
+    # So that headers can include their siblings with relative paths
+    add_include_path(path.dirname(path.abspath(filepath)))
+    if RECORDERS:
+        for src in source_files(filepath):
+            record_source('file', src)
+
+    if compile:
+        libpath = compile_cpp(filepath)
+        if libpath:
+            load_library(libpath)
+            return
+
+    # Fall back to JIT-compile the CPP file in ROOT
     with open(filepath, 'r') as f:
         content = f.read()
 
-    gInterpreter.Declare(content)
+    declare(content)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Mon Oct 19, 2026 at 10:40 AM +0000
+#
+# Compact lookup tables (.lut) compiled from the 1D/2D calibration histograms,
+# e.g. the L0 TIS efficiency maps. They are read with a memory map, by
+# triggers/lut.h in C++ and by read_lut here, so that the emulation doesn't
+# need the ROOT files (nor ROOT, on the Python side) once they are compiled.
+#
+# Layout, little-endian, every section 8-byte aligned:
+#   FILE_HEADER: with the cache.file_hash of the ROOT file it was compiled from
+#   nmaps x MAP_HEADER
+#   per map: the nbins + 1 edges of each axis, then the (nx + 2) * (ny + 2)
+#   bin contents in ROOT global bin order (bin = binx + (nx + 2) * biny),
+#   including under/overflow. All float64.
+
+import numpy as np
+
+from os import path
+
+
+LUT_MAGIC = b'TOEMULUT'
+LUT_VERSION = 2
+LUT_NAME_SIZE = 48
+
+# Must match LutFile in lut.h
+FILE_HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u8'),
+    ('nmaps', '<u8'),
+    ('source', 'S16'),
+])
+
+# Must match LutMapHeader in lut.h. Offsets are in bytes from the file start.
+MAP_HEADER = np.dtype([
+    ('name', 'S{}'.format(LUT_NAME_SIZE)),
+    ('ndim', '<u8'),
+    ('nbins', '<u8', 2),
+    ('low', '<f8', 2),
+    ('high', '<f8', 2),
+    ('uniform', '<u8', 2),
+    ('edges_offset', '<u8', 2),
+    ('content_offset', '<u8'),
+])
+
+
+##########
+# Lookup #
+##########
+
+class LutAxis:
+    def __init__(self, edges, uniform, low=None, high=None):
+        # 'low' and 'high' are TAxis::GetXmin/GetXmax, by default the first
+        # and last edges. For uniform axes, the last edge computed from the bin
+        # width can be an ulp off GetXmax, which FindFixBin compares to.
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.uniform = bool(uniform)
+        self.nbins = len(self.edges) - 1
+        self.low = float(self.edges[0] if low is None else low)
+        self.high = float(self.edges[-1] if high is None else high)
+
+    @classmethod
+    def fixed(cls, nbins, low, high):
+        # Edges as TAxis::GetBinLowEdge gives them
+        width = (high - low) / nbins
+        return cls(low + np.arange(nbins+1) * width, True, low, high)
+
+    def find_bin(self, x):
+        # Same as TAxis::FindFixBin: 0 for underflow, nbins + 1 for overflow
+        # and NaN
+        x = np.asarray(x, dtype=np.float64)
+        bins = np.where(x < self.low, 0, self.nbins+1)
+        inside = ~(x < self.low) & (x < self.high)
+
+        if self.uniform:
+            bins[inside] = 1 + (self.nbins * (x[inside] - self.low) /
+                                (self.high - self.low)).astype(np.int64)
+        else:
+            bins[inside] = np.searchsorted(self.edges, x[inside], side='right')
+        return bins
+
+    def bin_low_edge(self, bins):
+        # Same as TAxis::GetBinLowEdge
+        bins = np.asarray(bins)
+        width = (self.high - self.low) / self.nbins
+        formula = self.low + (bins - 1) * width
+        if self.uniform:
+            return formula
+        inside = (bins > 0) & (bins <= self.nbins)
+        return np.where(inside, self.edges[np.clip(bins-1, 0, self.nbins)],
+                        formula)
+
+    def bin_width(self, bins):
+        # Same as TAxis::GetBinWidth, for bins 1 to nbins
+        bins = np.asarray(bins)
+        if self.uniform:
+            return np.full(bins.shape, (self.high - self.low) / self.nbins)
+        return self.edges[bins] - self.edges[bins-1]
+
+
+class LutMap:
+    def __init__(self, axes, content):
+        # 'content' is flat, in ROOT global bin order
+        self.axes = list(axes)
+        self.content = np.asarray(content, dtype=np.float64).reshape(-1)
+
+        expected = np.prod([a.nbins + 2 for a in self.axes])
+        if len(self.content) != expected:
+            raise ValueError('Expected {} bin contents, got {}'.format(
+                expected, len(self.content)))
+
+    @property
+    def ndim(self):
+        return len(self.axes)
+
+    def find_bin(self, *xs):
+        # Global bin, as TH1::FindFixBin
+        bins = self.axes[0].find_bin(xs[0])
+        if self.ndim == 2:
+            bins = bins + (self.axes[0].nbins + 2) * self.axes[1].find_bin(
+                xs[1])
+        return bins
+
+    def bin_content(self, *bins):
+        # Same as TH1::GetBinContent, with per-axis bins (or one global bin)
+        glob = np.asarray(bins[0])
+        if len(bins) == 2:
+            glob = glob + (self.axes[0].nbins + 2) * np.asarray(bins[1])
+        return self.content[glob]
+
+    def __call__(self, *xs):
+        # Content of the bin of each point, e.g. GetBinContent(FindBin(x, y))
+        return self.content[self.find_bin(*xs)]
+
+
+##################
+# (De)serializer #
+##################
+
+def lut_map_from_histo(hist):
+    # From a TH1/TH2, or anything with the same methods
+    ndim = hist.GetDimension()
+    if ndim not in (1, 2):
+        raise ValueError('Only 1D and 2D histograms are supported')
+
+    axes = []
+    for axis in [hist.GetXaxis(), hist.GetYaxis()][:ndim]:
+        nbins = axis.GetNbins()
+        if axis.GetXbins().GetSize() == 0:
+            axes.append(LutAxis.fixed(nbins, axis.GetXmin(), axis.GetXmax()))
+        else:
+            axes.append(LutAxis(
+                [axis.GetBinLowEdge(b) for b in range(1, nbins+1)] +
+                [axis.GetBinUpEdge(nbins)], False))
+
+    size = np.prod([a.nbins + 2 for a in axes])
+    return LutMap(axes, [hist.GetBinContent(b) for b in range(size)])
+
+
+def write_lut(filename, maps, source=''):
+    # 'maps' is {name: LutMap}. 'source' identifies the ROOT file they were
+    # compiled from, see lut_source.
+    headers = np.zeros(len(maps), dtype=MAP_HEADER)
+    offset = FILE_HEADER.itemsize + headers.nbytes
+    payload = []
+
+    for header, (name, lut_map) in zip(headers, maps.items()):
+        encoded = name.encode('utf-8')
+        if len(encoded) >= LUT_NAME_SIZE:
+            raise ValueError('Map name too long: {}'.format(name))
+
+        header['name'] = encoded
+        header['ndim'] = lut_map.ndim
+        for idx, axis in enumerate(lut_map.axes):
+            header['nbins'][idx] = axis.nbins
+            header['low'][idx] = axis.low
+            header['high'][idx] = axis.high
+            header['uniform'][idx] = axis.uniform
+            header['edges_offset'][idx] = offset
+            payload.append(axis.edges.astype('<f8'))
+            offset += payload[-1].nbytes
+
+        header['content_offset'] = offset
+        payload.append(lut_map.content.astype('<f8'))
+        offset += payload[-1].nbytes
+
+    file_header = np.array(
+        (LUT_MAGIC, LUT_VERSION, len(maps), source.encode('ascii')),
+        dtype=FILE_HEADER)
+    with open(filename, 'wb') as f:
+        f.write(file_header.tobytes())
+        f.write(headers.tobytes())
+        for arr in payload:
+            f.write(arr.tobytes())
+
+
+def lut_source(filename):
+    # The 'source' given to write_lut, or None if 'filename' is not a lookup
+    # table file of this version
+    with open(filename, 'rb') as f:
+        buf = f.read(FILE_HEADER.itemsize)
+    if len(buf) < FILE_HEADER.itemsize:
+        return None
+
+    file_header = np.frombuffer(buf, dtype=FILE_HEADER)[0]
+    if file_header['magic'] != LUT_MAGIC or \
+            file_header['version'] != LUT_VERSION:
+        return None
+    return file_header['source'].decode('ascii')
+
+
+def read_lut(filename):
+    # {name: LutMap}, whose arrays are views of a read-only memory map
+    buf = np.memmap(filename, dtype=np.uint8, mode='r')
+    file_header = buf[:FILE_HEADER.itemsize].view(FILE_HEADER)[0]
+    if file_header['magic'] != LUT_MAGIC or \
+            file_header['version'] != LUT_VERSION:
+        raise ValueError('{} is not a version {} lookup table file'.format(
+            filename, LUT_VERSION))
+
+    nmaps = int(file_header['nmaps'])
+    headers = buf[FILE_HEADER.itemsize:
+                  FILE_HEADER.itemsize + nmaps*MAP_HEADER.itemsize].view(
+                      MAP_HEADER)
+
+    def doubles(offset, num):
+        return buf[offset:offset + 8*num].view('<f8')
+
+    maps = dict()
+    for header in headers:
+        ndim = int(header['ndim'])
+        axes = [LutAxis(doubles(int(header['edges_offset'][i]),
+                                int(header['nbins'][i]) + 1),
+                        header['uniform'][i], header['low'][i],
+                        header['high'][i])
+                for i in range(ndim)]
+        size = np.prod([a.nbins + 2 for a in axes])
+        maps[header['name'].decode('utf-8')] = LutMap(
+            axes, doubles(int(header['content_offset']), size))
+
+    return maps
+
+
+def compile_lut(ntp, filename, names=None, source=''):
+    # Compile the histograms 'names' (by default, all 1D and 2D ones) of an
+    # opened ROOT file. 'source' is given to write_lut.
+    if names is None:
+        names = []
+        for key in ntp.GetListOfKeys():
+            # Keys are sorted by cycle, keep the latest one
+            if key.GetName() not in names and \
+                    key.GetClassName().startswith(('TH1', 'TH2')):
+                names.append(key.GetName())
+
+    maps = dict()
+    for name in names:
+        hist = ntp.Get(name)
+        if not hist:
+            raise ValueError('{} not found in {}'.format(
+                name, path.basename(ntp.GetName())))
+        maps[name] = lut_map_from_histo(hist)
+
+    write_lut(filename, maps, source)
+    return maps
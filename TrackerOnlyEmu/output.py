@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 10:10 PM +0000
+#
+# Output of the emulation scripts: compression and basket sizing of the output
+# trees, and friend trees of the input, i.e. only the emulated branches, one
+# entry per input entry, in input order.
+
+import numpy as np
+
+from ROOT import RDataFrame
+from ROOT.RDF import RSnapshotOptions
+
+from TrackerOnlyEmu.columnar import book_arrays, fill_arrays, tree_entries
+from TrackerOnlyEmu.columnar import write_columns
+
+
+# Compression algorithm -> (ROOT::RCompressionSetting::EAlgorithm, default
+# level). The default levels are those of ROOT::RCompressionSetting::EDefaults.
+COMPRESSION = {
+    'zlib': (1, 1),
+    'lzma': (2, 7),
+    'lz4': (4, 4),
+    'zstd': (5, 5),
+}
+
+# Identify the entries, to check the alignment of friend trees
+ID_BRANCHES = ['runNumber', 'eventNumber']
+
+
+###########
+# Options #
+###########
+
+def compression_settings(algorithm=None, level=None):
+    # The 'algorithm * 100 + level' of TFile, or None to keep ROOT's default
+    if algorithm is None:
+        if level is not None:
+            raise ValueError('A compression level needs an algorithm')
+        return None
+
+    algo, default_level = COMPRESSION[algorithm]
+    level = default_level if level is None else level
+    if not 0 <= level <= 9:
+        raise ValueError('Compression level {} not in 0-9'.format(level))
+
+    return algo*100 + level
+
+
+def snapshot_options(compression=None, basket_size=None, auto_flush=None,
+                     lazy=False):
+    opts = RSnapshotOptions()
+    opts.fLazy = lazy
+
+    if compression is not None:
+        opts.fCompressionAlgorithm = compression // 100
+        opts.fCompressionLevel = compression % 100
+    if auto_flush is not None:
+        opts.fAutoFlush = auto_flush
+    if basket_size is not None:
+        if not hasattr(opts, 'fBasketSize'):
+            raise RuntimeError(
+                'This ROOT version cannot set the basket size of Snapshot')
+        opts.fBasketSize = basket_size
+
+    return opts
+
+
+################
+# Friend trees #
+################
+
+def tree_ids(filename, tree_path):
+    # The ID_BRANCHES of all entries of 'tree_path', in order
+    _, ids = fill_arrays(RDataFrame(tree_path, filename),
+                         tree_entries(filename, tree_path), columns=ID_BRANCHES)
+    return ids
+
+
+def check_ids(ids, input_ntp, tree_path, name):
+    # A friend tree is matched to its input by entry number, so its entries
+    # must have the same run and event numbers as the input, in the same order
+    expected = tree_ids(input_ntp, tree_path)
+    if all(np.array_equal(ids[b], expected[b]) for b in ID_BRANCHES):
+        return
+
+    if len(ids[ID_BRANCHES[0]]) != len(expected[ID_BRANCHES[0]]):
+        raise RuntimeError('{} has {} entries, but its input {} has {}'.format(
+            name, len(ids[ID_BRANCHES[0]]), input_ntp,
+            len(expected[ID_BRANCHES[0]])))
+    entry = np.flatnonzero(np.logical_or.reduce(
+        [ids[b] != expected[b] for b in ID_BRANCHES]))[0]
+    raise RuntimeError(
+        'Entry {} of {} is (run, event) {}, but that of its input {} is '
+        '{}'.format(entry, name, tuple(int(ids[b][entry]) for b in ID_BRANCHES),
+                    input_ntp,
+                    tuple(int(expected[b][entry]) for b in ID_BRANCHES)))
+
+
+def check_friend(input_ntp, friend_ntp, tree_path):
+    # For friend trees written with their ID_BRANCHES, e.g. merged from
+    # partitions
+    check_ids(tree_ids(friend_ntp, tree_path), input_ntp, tree_path,
+              friend_ntp)
+
+
+def write_friend_columns(columns, input_ntp, output, tree_path,
+                         mode='RECREATE', compression=None, basket_size=None,
+                         auto_flush=None):
+    # Write 'columns', in input order, as a friend tree of 'tree_path' in
+    # 'input_ntp'. The ID_BRANCHES in 'columns' are checked against the input
+    # first, but not written.
+    nentries = tree_entries(input_ntp, tree_path)
+    nrows = len(next(iter(columns.values())))
+    if nrows != nentries:
+        raise ValueError(
+            'A friend tree needs all input entries, but only {} of {} passed '
+            'the filters'.format(nrows, nentries))
+    check_ids(columns, input_ntp, tree_path, output)
+
+    write_columns(output, tree_path,
+                  {b: arr for b, arr in columns.items() if b not in ID_BRANCHES},
+                  mode, compression=compression, basket_size=basket_size,
+                  auto_flush=auto_flush)
+
+
+def write_friend(frame, input_ntp, output, tree_path, branches, **kwargs):
+    # Write 'branches' of 'frame' as a friend tree of 'tree_path' in
+    # 'input_ntp'. Unlike Snapshot, book_arrays places each entry at its
+    # 'rdfentry_', so the entries are in input order with any number of
+    # threads. Filters would break the alignment, so they are refused, and the
+    # run and event numbers of the entries are checked against the input.
+    handle, write = book_friend(
+        frame, input_ntp, output, tree_path, branches, **kwargs)
+    handle.GetValue()
+    write()
+
+
+def book_friend(frame, input_ntp, output, tree_path, branches, **kwargs):
+    # Same as write_friend, but lazy: the handle of the event loop, to trigger
+    # with others (e.g. executor.run_graphs), and a function writing the
+    # friend tree once it ran
+    handle, result = book_arrays(
+        frame, tree_entries(input_ntp, tree_path),
+        columns=list(branches) + ID_BRANCHES)
+
+    def write():
+        write_friend_columns(result()[1], input_ntp, output, tree_path,
+                             **kwargs)
+
+    return handle, write
+
+
+def book_tree(frame, input_ntp, output, tree_path, branches, **kwargs):
+    # Same as book_friend, for a full output: the entries passing the filters,
+    # in input order. 'kwargs' are those of write_columns.
+    handle, result = book_arrays(
+        frame, tree_entries(input_ntp, tree_path), columns=branches)
+
+    def write():
+        write_columns(output, tree_path, result()[1], **kwargs)
+
+    return handle, write
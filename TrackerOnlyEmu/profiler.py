@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 12:15 PM +0000
+#
+# Profile a list of ExecDirectives. The timings are measured from the outside
+# with extra event loops:
+#   - book: the Python call that adds the directive to the graph
+#   - jit:  the first event loop of a graph minus the second one over the same
+#           nodes; the second loop needs no compilation
+#   - eval: the second event loop
+# The exclusive cost of a Define is the cost of a graph that reads the column,
+# minus that of a graph that reads only the columns it depends on.
+
+import json
+import ROOT
+
+from dataclasses import replace
+from datetime import datetime, timezone
+
+from TrackerOnlyEmu.executor import plan_directives, directive_deps
+from TrackerOnlyEmu.executor import process_single_directive
+from TrackerOnlyEmu.utils import Timer
+
+
+###########
+# Helpers #
+###########
+
+def book(directives, init_frame):
+    frames = [init_frame]
+    times = []
+
+    for d in directives:
+        with Timer() as t:
+            frames.append(process_single_directive(
+                getattr(frames[-1], d.op), d.branch, d.instruct))
+        times.append(t())
+
+    return frames, times
+
+
+def time_loops(frame, columns):
+    # A Filter that reads the columns but never rejects an event
+    forced = frame.Filter(
+        '(' + ''.join('(void){}, '.format(c) for c in columns) + 'true)')
+
+    # The timers keep running, so read each one right after its loop
+    with Timer() as t:
+        forced.Count().GetValue()
+    t_first = t()
+    with Timer() as t:
+        forced.Count().GetValue()
+    t_second = t()
+
+    return max(t_first - t_second, 0.), t_second
+
+
+def time_subgraph(directives, init_frame, columns, keep):
+    # Only what is needed to compute 'keep', without the other kept branches
+    directives = plan_directives(
+        [replace(d, keep=False) for d in directives], columns, keep)
+    frames, _ = book(directives, init_frame)
+    return time_loops(frames[-1], keep)
+
+
+########
+# Main #
+########
+
+def profile_directives(directives, init_frame, keep=(), optimize=False,
+                       max_entries=None):
+    columns = [str(c) for c in init_frame.GetColumnNames()]
+    if optimize:
+        directives = plan_directives(directives, columns, keep)
+
+    # Range is not supported with implicit multithreading
+    if max_entries and not ROOT.IsImplicitMTEnabled():
+        init_frame = init_frame.Range(max_entries)
+    nentries = init_frame.Count().GetValue()
+
+    # The full graph
+    frames, book_times = book(directives, init_frame)
+    kept = list(keep) + [d.branch for d in directives if d.keep]
+    jit_total, loop_total = time_loops(frames[-1], kept)
+
+    # Each Define on its own
+    records = []
+    known = set(columns)
+
+    for idx, d in enumerate(directives):
+        record = {
+            'op': d.op, 'branch': d.branch, 'instruct': d.instruct,
+            'book_sec': book_times[idx],
+        }
+        deps = sorted(directive_deps(d, known))
+        if d.branch is not None:
+            known.add(d.branch)
+
+        if d.op == 'Define':
+            prefix = directives[:idx+1]
+            jit_incl, eval_incl = time_subgraph(
+                prefix, init_frame, columns, [d.branch])
+            jit_deps, eval_deps = time_subgraph(
+                prefix, init_frame, columns, deps)
+
+            record.update({
+                'jit_sec': max(jit_incl - jit_deps, 0.),
+                'eval_sec': max(eval_incl - eval_deps, 0.),
+                'jit_inclusive_sec': jit_incl,
+                'eval_inclusive_sec': eval_incl,
+                'eval_ns_per_event':
+                    max(eval_incl - eval_deps, 0.) / max(nentries, 1) * 1e9,
+            })
+
+        records.append(record)
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'root_version': ROOT.gROOT.GetVersion(),
+        'threads': ROOT.GetThreadPoolSize(),
+        'entries': nentries,
+        'total': {
+            'book_sec': sum(book_times),
+            'jit_sec': jit_total,
+            'loop_sec': loop_total,
+            'events_per_sec': nentries / loop_total if loop_total else None,
+        },
+        'directives': records,
+    }
+
+
+def dump_profile(profile, filename, extra=None):
+    if extra:
+        profile = dict(profile, **extra)
+
+    with open(filename, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+
+def print_profile(profile, top=10):
+    total = profile['total']
+    print('{:,} entries: jit {:.2f} sec, loop {:.2f} sec, {:,.0f} events/sec'.format(
+        profile['entries'], total['jit_sec'], total['loop_sec'],
+        total['events_per_sec'] or 0))
+
+    defines = [r for r in profile['directives'] if 'eval_sec' in r]
+    for r in sorted(defines, key=lambda r: -r['eval_sec'])[:top]:
+        print('  {:<40} {:>10.1f} ns/event  jit {:.3f} sec'.format(
+            r['branch'], r['eval_ns_per_event'], r['jit_sec']))
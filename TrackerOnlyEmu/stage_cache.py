@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 10:10 PM +0000
+#
+# Cache the output columns of each emulation stage (e.g. the L0Global TIS, HLT1
+# and L0Hadron TOS directives) per input file, so that after a change to one
+# stage, only this stage is recomputed. A stage is keyed by the input file
+# (path, size, modification time), the tree, its directives and outputs, and
+# everything its directive generator loaded or declared: headers with their
+# includes, lookup tables and models, by content.
+
+import os
+
+from dataclasses import dataclass, field
+from os import path
+from ROOT import gROOT
+
+from TrackerOnlyEmu.cache import cache_dir, content_hash, evict_lru
+from TrackerOnlyEmu.columnar import load_columns, save_columns
+from TrackerOnlyEmu.executor import run_graphs
+from TrackerOnlyEmu.loader import record_sources
+
+
+# Bump this when the layout of the cached columns changes
+STAGE_CACHE_VERSION = 1
+
+
+@dataclass
+class Stage:
+    name: str
+    outputs: list
+    directives: list = field(default_factory=list)
+    sources: list = field(default_factory=list)
+
+
+def emulation_stage(name, outputs, directive_gen, *args, **kwargs):
+    # The 'outputs' of directive_gen(*args, **kwargs), with what it depends on
+    with record_sources() as sources:
+        directives = directive_gen(*args, **kwargs)
+    return Stage(name, list(outputs), directives, sources)
+
+
+def stage_key(stage, input_ntp, tree_path):
+    stat = os.stat(input_ntp)
+    files = [p for kind, p in stage.sources if kind == 'file']
+    code = [p for kind, p in stage.sources if kind == 'declare']
+
+    return '{}_{}'.format(stage.name, content_hash(
+        files, path.abspath(input_ntp), stat.st_size, stat.st_mtime_ns,
+        tree_path, stage.directives, stage.outputs, code, gROOT.GetVersion(),
+        STAGE_CACHE_VERSION))
+
+
+def cached_stages(stages, input_ntps, tree_path, book, max_bytes=None):
+    # The output columns of all 'stages' on each of 'input_ntps'. Those of the
+    # stages not in the cache are booked by book(input_ntp, missing_stages),
+    # which must return the handle of a single event loop and a function
+    # returning their columns in input order once it ran (e.g. with
+    # columnar.book_arrays). The event loops of all inputs run together, then
+    # the new columns are cached. Afterwards, the least recently used stages
+    # are evicted down to 'max_bytes'.
+    pending = []
+    for input_ntp in input_ntps:
+        keys = [stage_key(s, input_ntp, tree_path) for s in stages]
+        dirpaths = [path.join(cache_dir('stages'), k) for k in keys]
+
+        columns = dict()
+        missing = []
+        for stage, dirpath in zip(stages, dirpaths):
+            if path.isdir(dirpath):
+                columns.update(load_columns(dirpath))
+            else:
+                missing.append((stage, dirpath))
+
+        computed = [s.name for s, _ in missing]
+        print('{}: cached: {}; to compute: {}'.format(
+            input_ntp,
+            ', '.join(s.name for s in stages if s.name not in computed)
+            or 'none',
+            ', '.join(computed) or 'none'))
+
+        handle, result = None, None
+        if missing:
+            handle, result = book(input_ntp, [s for s, _ in missing])
+        pending.append((input_ntp, keys, columns, missing, handle, result))
+
+    run_graphs([p[4] for p in pending if p[4] is not None])
+
+    outputs = []
+    keep = [k for p in pending for k in p[1]]
+    for input_ntp, keys, columns, missing, _, result in pending:
+        if missing:
+            fresh = result()
+            for stage, dirpath in missing:
+                save_columns(dirpath, {b: fresh[b] for b in stage.outputs})
+            columns.update(fresh)
+
+        columns = {b: columns[b] for s in stages for b in s.outputs}
+        nentries = {len(arr) for arr in columns.values()}
+        if len(nentries) > 1:
+            raise RuntimeError(
+                'Stages of {} have different numbers of entries: {}'.format(
+                    input_ntp, sorted(nentries)))
+        outputs.append(columns)
+
+    if max_bytes is not None and any(p[3] for p in pending):
+        evict_lru('stages', max_bytes, keep=keep)
+
+    return outputs
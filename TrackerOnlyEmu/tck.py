@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 03:10 PM +0000
+#
+# Extract the Hlt1TrackMVA and Hlt1TwoTrackMVA thresholds from the TCK dumps in
+# triggers/hlt1/tck_info, and read the TCK occupancies and run -> TCK maps.
+# Doesn't need ROOT.
+
+import re
+
+from ast import literal_eval
+from glob import glob
+from os import path
+
+
+TCK_INFO_DIR = path.join(path.dirname(path.abspath(__file__)),
+                         'triggers', 'hlt1', 'tck_info')
+TCK_OCCUPANCY_FILE = path.join(TCK_INFO_DIR, 'hlt1_tcks_161718_data.txt')
+
+# e.g. tckinfo2016num2_Hlt1TrackMVA_11361609.txt
+TCK_INFO_FILENAME = re.compile(
+    r'tckinfo(?P<year>\d{4})\w*?_(?P<line>Hlt1\w+)_(?P<tck>[0-9a-fA-F]{8})\.txt$')
+
+NUM = r'([-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)'
+
+# The fields follow the Hlt1TrackMVAParams and Hlt1TwoTrackMVAParams structs in
+# run2-Hlt1Tck.h: field -> (unit, pattern, group)
+TRACK_MVA_PARAMS = {
+    'inputPT': ('Hlt1ProtoParticleUnit',
+                r'FitTrack\s*>>\s*\(\s*\(\s*TrPT\s*>\s*'+NUM, 1),
+    'inputP': ('Hlt1ProtoParticleUnit',
+               r'FitTrack\s*>>.*?TrP\s*>\s*'+NUM, 1),
+    'inputTRCHI2DOF': ('Hlt1ProtoParticleUnit', r'TrCHI2PDOF\s*<\s*'+NUM, 1),
+    'inputTRGHOSTPROB': ('Hlt1ProtoParticleUnit',
+                         r'TrGHOSTPROB\s*<\s*'+NUM, 1),
+    'TRCHI2DOF': ('Hlt1TrackMVAUnit', r'TRCHI2DOF\s*<\s*'+NUM, 1),
+    'TRGHOSTPROB': ('Hlt1TrackMVAUnit', r'TRGHOSTPROB\s*<\s*'+NUM, 1),
+    'MINPT': ('Hlt1TrackMVAUnit',
+              r'in_range\(\s*'+NUM+r'\s*,\s*PT\s*,\s*'+NUM, 1),
+    'MAXPT': ('Hlt1TrackMVAUnit',
+              r'in_range\(\s*'+NUM+r'\s*,\s*PT\s*,\s*'+NUM, 2),
+    'BPVIPCHI2': ('Hlt1TrackMVAUnit', r'BPVIPCHI2\(\)\s*>\s*'+NUM, 1),
+    'param1': ('Hlt1TrackMVAUnit',
+               r'\(\s*'+NUM+r'\s*/\s*\(\s*\(\s*PT\s*/\s*GeV\s*-\s*'+NUM, 1),
+    'param2': ('Hlt1TrackMVAUnit',
+               r'\(\s*'+NUM+r'\s*/\s*\(\s*\(\s*PT\s*/\s*GeV\s*-\s*'+NUM, 2),
+    'param3': ('Hlt1TrackMVAUnit',
+               r'\(\s*'+NUM+r'\s*/\s*'+NUM+r'\s*\)\s*\*\s*\(\s*'+NUM+r'\s*-\s*PT',
+               1),
+}
+
+TWO_TRACK_MVA_PARAMS = {
+    'PT': ('Hlt1TwoTrackMVAUnit', r'\(\s*PT\s*>\s*'+NUM, 1),
+    'P': ('Hlt1TwoTrackMVAUnit', r'\(\s*P\s*>\s*'+NUM, 1),
+    'TRCHI2DOF': ('Hlt1TwoTrackMVAUnit', r'TRCHI2DOF\s*<\s*'+NUM, 1),
+    'TRGHOSTPROB': ('Hlt1TwoTrackMVAUnit', r'TRGHOSTPROB\s*<\s*'+NUM, 1),
+    'BPVIPCHI2': ('Hlt1TwoTrackMVAUnit', r'BPVIPCHI2\(\)\s*>\s*'+NUM, 1),
+    'APT': ('Hlt1TwoTrackMVAUnit', r'APT\s*>\s*'+NUM, 1),
+    'DOCA': ('Hlt1TwoTrackMVAUnit', r'ACUTDOCACHI2\(\s*'+NUM, 1),
+    'VCHI2': ('Hlt1TwoTrackMVAUnit', r'VFASPF\(VCHI2\)\s*<\s*'+NUM, 1),
+    'BPVETAMIN': ('Hlt1TwoTrackMVAUnit',
+                  r'in_range\(\s*'+NUM+r'\s*,\s*BPVETA\s*,\s*'+NUM, 1),
+    'BPVETAMAX': ('Hlt1TwoTrackMVAUnit',
+                  r'in_range\(\s*'+NUM+r'\s*,\s*BPVETA\s*,\s*'+NUM, 2),
+    'BPVCORRMMIN': ('Hlt1TwoTrackMVAUnit',
+                    r'in_range\(\s*'+NUM+r'\s*,\s*BPVCORRM\s*,\s*'+NUM, 1),
+    'BPVCORRMMAX': ('Hlt1TwoTrackMVAUnit',
+                    r'in_range\(\s*'+NUM+r'\s*,\s*BPVCORRM\s*,\s*'+NUM, 2),
+    'BPVDIRA': ('Hlt1TwoTrackMVAUnit', r'BPVDIRA\s*>\s*'+NUM, 1),
+    'MVA': ('Hlt1TwoTrackMVAUnit',
+            r"MatrixNetTool'\)(?:\s*,\s*True\s*\))?\s*>\s*"+NUM, 1),
+}
+
+LINE_PARAMS = {
+    'Hlt1TrackMVA': TRACK_MVA_PARAMS,
+    'Hlt1TwoTrackMVA': TWO_TRACK_MVA_PARAMS,
+}
+
+
+###########
+# Parsers #
+###########
+
+def unit_code(dump, unit):
+    # The first full printout of a LoKi::HltUnit, up to its SINK. Later
+    # occurrences are only printed as '...(repeats)'.
+    match = re.search(
+        re.escape(unit)+r'\s+LoKi::HltUnit\s+Preambulo(.*?)SINK\s*\(',
+        dump, re.DOTALL)
+    if not match:
+        raise ValueError('{} not found in the TCK dump'.format(unit))
+    return ' '.join(match.group(1).split())
+
+
+def parse_tckinfo(filename, line=None):
+    # Return the thresholds of 'line' (by default, the one in the filename) in
+    # the order of the fields of the corresponding C++ struct
+    if line is None:
+        line = TCK_INFO_FILENAME.search(filename).group('line')
+
+    with open(filename, 'r') as f:
+        dump = f.read()
+
+    params = dict()
+    codes = dict()
+    for field, (unit, pattern, group) in LINE_PARAMS[line].items():
+        if unit not in codes:
+            codes[unit] = unit_code(dump, unit)
+        match = re.search(pattern, codes[unit])
+        if not match:
+            raise ValueError('{} of {} not found in {}'.format(
+                field, line, filename))
+        params[field] = float(match.group(group))
+
+    return params
+
+
+def load_tck_table(dirpath=TCK_INFO_DIR):
+    # {tck: {'year': year, 'Hlt1TrackMVA': {...}, 'Hlt1TwoTrackMVA': {...}}}
+    # Only the TCKs with dumps for both lines are kept.
+    table = dict()
+    for filename in sorted(glob(path.join(dirpath, 'tckinfo*.txt'))):
+        match = TCK_INFO_FILENAME.search(path.basename(filename))
+        if not match or match.group('line') not in LINE_PARAMS:
+            continue
+
+        entry = table.setdefault(int(match.group('tck'), 16), dict())
+        entry['year'] = int(match.group('year'))
+        entry[match.group('line')] = parse_tckinfo(
+            filename, match.group('line'))
+
+    return {tck: entry for tck, entry in table.items()
+            if all(line in entry for line in LINE_PARAMS)}
+
+
+def load_tck_occupancy(filename=TCK_OCCUPANCY_FILE):
+    # {year: {tck: number of candidates}}, from lines like:
+    #   2016 HLT1 TCKs:
+    #   [('0x1138160f', 2327337), ...]
+    occupancy = dict()
+    year = None
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+            header = re.match(r'(\d{4}) HLT1 TCKs:', line)
+            if header:
+                year = int(header.group(1))
+            elif line.startswith('[') and year is not None:
+                occupancy[year] = {int(tck, 16): num
+                                   for tck, num in literal_eval(line)}
+    return occupancy
+
+
+def load_run_tck_map(filename):
+    # One 'run tck' or 'first_run last_run tck' per line, '#' for comments.
+    # TCKs can be given in hex. Return sorted (first_run, last_run, tck).
+    ranges = []
+    with open(filename, 'r') as f:
+        for line in f:
+            fields = line.split('#')[0].split()
+            if not fields:
+                continue
+            if len(fields) == 2:
+                fields = [fields[0]] + fields
+            if len(fields) != 3:
+                raise ValueError('Malformed run -> TCK line: {}'.format(line))
+            ranges.append(tuple(int(f, 0) for f in fields))
+
+    return sorted(ranges)
+
+
+###########
+# Weights #
+###########
+
+def tck_weights(year, table=None, occupancy=None):
+    # Occupancy of the TCKs of 'year' that have dumps, normalized to 1 among
+    # them
+    table = load_tck_table() if table is None else table
+    occupancy = load_tck_occupancy() if occupancy is None else occupancy
+
+    counts = {tck: num for tck, num in occupancy.get(int(year), {}).items()
+              if tck in table}
+    if not counts:
+        raise ValueError('No TCK dump for year {}'.format(year))
+
+    total = sum(counts.values())
+    return {tck: num / total for tck, num in counts.items()}
+
+
+def nominal_tck(year, table=None, occupancy=None):
+    # The most used TCK of 'year' among the dumped ones
+    weights = tck_weights(year, table, occupancy)
+    return max(weights, key=weights.get)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Sun Oct 18, 2026 at 08:50 PM +0000
+#
+# Train the L0Hadron TOS regressors, alone or as a hyperparameter sweep on one
+# machine. For a sweep, the samples are split into training and validation
+# once, then inherited by the forked workers without copies. Each worker fits
+# one candidate at a time with its share of the cores.
+
+import json
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from multiprocessing import get_context
+
+from TrackerOnlyEmu.utils import Timer
+
+
+# Set in the parent right before forking the workers
+SAMPLES = dict()
+
+# The validation metric to rank the candidates by, lower is better
+RANK_BY = {
+    'xgb': 'logloss',
+    'bdt': 'rmse',
+    'bdt_old': 'rmse',
+}
+
+
+##############
+# Regressors #
+##############
+
+def make_regressor(mode, max_depth, ntrees, reg_lambda=0.5, learning_rate=None,
+                   n_jobs=None):
+    # Only needed for training, and slow to import
+    extra = dict()
+    if learning_rate is not None:
+        extra['learning_rate'] = learning_rate
+
+    if mode in ['bdt', 'bdt_old']:
+        from sklearn.ensemble import AdaBoostRegressor
+        from sklearn.tree import DecisionTreeRegressor
+        return AdaBoostRegressor(
+            DecisionTreeRegressor(max_depth=max_depth),
+            n_estimators=ntrees, random_state=np.random.RandomState(1),
+            **extra)
+
+    if mode == 'xgb':
+        from xgboost import XGBClassifier
+        if n_jobs is not None:
+            extra['n_jobs'] = n_jobs
+        return XGBClassifier(
+            n_estimators=ntrees, max_depth=max_depth,
+            use_label_encoder=False, eval_metric='mlogloss',
+            reg_lambda=reg_lambda, **extra)
+
+    raise ValueError('Unknown regressor mode: {}'.format(mode))
+
+
+def predict_regressor(mode, regressor, input_vars):
+    if mode == 'xgb':
+        return regressor.predict_proba(input_vars).T[1]
+    return regressor.predict(input_vars)
+
+
+###########
+# Metrics #
+###########
+
+def average_ranks(values):
+    # 1-based ranks, ties get their average rank
+    _, inverse, counts = np.unique(
+        values, return_inverse=True, return_counts=True)
+    upper = np.cumsum(counts)
+    return (upper - (counts - 1) / 2)[inverse]
+
+
+def classifier_metrics(truth, proba):
+    truth = np.asarray(truth).astype(bool)
+    proba = np.asarray(proba, dtype=np.float64)
+    clipped = np.clip(proba, 1e-15, 1 - 1e-15)
+    logloss = -np.mean(np.where(truth, np.log(clipped), np.log1p(-clipped)))
+
+    # AUC as the Mann-Whitney U statistic
+    npos = truth.sum()
+    nneg = len(truth) - npos
+    auc = np.nan
+    if npos and nneg:
+        auc = (average_ranks(proba)[truth].sum() - npos * (npos + 1) / 2) / \
+            (npos * nneg)
+
+    return {
+        'logloss': float(logloss),
+        'auc': float(auc),
+        # The emulated efficiency is the mean of the TOS probabilities
+        'eff_diff': float(proba.mean() - truth.mean()),
+    }
+
+
+def regressor_metrics(truth, pred):
+    diff = np.asarray(pred, dtype=np.float64) - truth
+    return {
+        'rmse': float(np.sqrt(np.mean(diff**2))),
+        'mae': float(np.mean(np.abs(diff))),
+        'bias': float(np.mean(diff)),
+    }
+
+
+#########
+# Sweep #
+#########
+
+def param_grid(**values):
+    # All combinations, e.g. param_grid(max_depth=[3, 4], ntrees=[100, 300])
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in product(*values.values())]
+
+
+def split_samples(input_vars, target, validation_fraction, seed=1):
+    # The input ntuples are not in random order, so shuffle before splitting.
+    # The indices are sorted to read the samples sequentially.
+    perm = np.random.RandomState(seed).permutation(len(target))
+    nval = int(round(len(target) * validation_fraction))
+    val, train = np.sort(perm[:nval]), np.sort(perm[nval:])
+    return input_vars[train], target[train], input_vars[val], target[val]
+
+
+def fit_candidate(mode, params, n_jobs):
+    regressor = make_regressor(mode, n_jobs=n_jobs, **params)
+    with Timer() as t:
+        regressor.fit(SAMPLES['input_vars'], SAMPLES['target'])
+    fit_sec = t()
+
+    pred = predict_regressor(mode, regressor, SAMPLES['val_input_vars'])
+    metrics = classifier_metrics if mode == 'xgb' else regressor_metrics
+    return dict(params, fit_sec=fit_sec,
+                **metrics(SAMPLES['val_target'], pred))
+
+
+def run_sweep(mode, candidates, input_vars, target, val_input_vars,
+              val_target, cores, jobs=None):
+    # Fit all candidates, 'jobs' at a time, sharing 'cores' between them.
+    # Return the results, best first.
+    jobs = min(jobs or cores, len(candidates))
+    n_jobs = max(1, cores // jobs)
+
+    SAMPLES.update(input_vars=input_vars, target=target,
+                   val_input_vars=val_input_vars, val_target=val_target)
+    results = []
+    try:
+        # Forked, so that the workers share the samples of the parent
+        with ProcessPoolExecutor(jobs, mp_context=get_context('fork')) as pool:
+            futures = {pool.submit(fit_candidate, mode, params, n_jobs): idx
+                       for idx, params in enumerate(candidates)}
+            for fut in as_completed(futures):
+                results.append((futures[fut], fut.result()))
+                print('{}/{} fitted: {}'.format(
+                    len(results), len(candidates), results[-1][1]))
+    finally:
+        SAMPLES.clear()
+
+    # Ties stay in grid order
+    rank_by = RANK_BY[mode]
+    results = [r for _, r in sorted(results, key=lambda x: x[0])]
+    results.sort(key=lambda r: (np.isnan(r[rank_by]), r[rank_by]))
+    for rank, r in enumerate(results, 1):
+        r['rank'] = rank
+
+    return results
+
+
+def dump_sweep(results, filename, extra=None):
+    summary = {'candidates': results}
+    if extra:
+        summary.update(extra)
+
+    with open(filename, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+
+def print_sweep(results, mode, top=10):
+    rank_by = RANK_BY[mode]
+    for r in results[:top]:
+        others = {k: v for k, v in r.items()
+                  if k not in ['rank', 'fit_sec', rank_by]}
+        print('  #{:<3} {} {:.6g}  fit {:.1f} sec  {}'.format(
+            r['rank'], rank_by, r[rank_by], r['fit_sec'], others))
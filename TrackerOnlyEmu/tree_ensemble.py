@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# License: BSD 2-clause
+# Last Change: Mon Oct 19, 2026 at 10:20 AM +0000
+#
+# The L0Hadron TOS regressors (XGBClassifier, AdaBoostRegressor of decision
+# trees) flattened into node arrays, so that they can be evaluated in C++ by
+# triggers/tree_ensemble.h, inside the RDataFrame event loop. predict gives the
+# same result in NumPy. Neither needs XGBoost nor scikit-learn; only flattening
+# a trained model does. Both read the .trees with a memory map, so loading a
+# model doesn't depend on its size nor on the library versions it was trained
+# with.
+#
+# Layout of a .trees file, little-endian, every section 8-byte aligned:
+#   HEADER: with the cache.file_hash of the pickle it was flattened from, if any
+#   tree_offset (n_trees + 1, int64): nodes of tree t are [tree_offset[t],
+#       tree_offset[t+1]), its root first
+#   tree_weight (n_trees, float64)
+#   threshold, value (n_nodes, float64)
+#   feature, left, right, missing (n_nodes, int32, padded to 8 bytes): the
+#       feature is -1 for leaves, the children are relative to the tree
+
+import json
+import numpy as np
+
+from os import path
+from tempfile import TemporaryDirectory
+
+
+TREES_MAGIC = b'TOEMUTRS'
+TREES_VERSION = 2
+
+# Must match tree_ensemble.h
+# sigmoid(base_margin + sum of the leaves), in float32 as XGBoost does. Go left
+# if float(x) < threshold.
+XGB_LOGISTIC = 1
+# Weighted median of the trees, as AdaBoostRegressor.predict. Go left if
+# float(x) <= threshold, as sklearn trees do.
+ADABOOST_MEDIAN = 2
+
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u8'),
+    ('kind', '<u8'),
+    ('n_features', '<u8'),
+    ('n_trees', '<u8'),
+    ('n_nodes', '<u8'),
+    ('base_margin', '<f8'),
+    ('source', 'S16'),
+])
+
+# name -> dtype, in file order
+TREE_ARRAYS = [
+    ('tree_offset', '<i8'),
+    ('tree_weight', '<f8'),
+]
+NODE_ARRAYS = [
+    ('threshold', '<f8'),
+    ('value', '<f8'),
+    ('feature', '<i4'),
+    ('left', '<i4'),
+    ('right', '<i4'),
+    ('missing', '<i4'),
+]
+
+
+############
+# Ensemble #
+############
+
+class TreeEnsemble:
+    def __init__(self, kind, n_features, tree_offset, tree_weight, threshold,
+                 value, feature, left, right, missing, base_margin=0.):
+        self.kind = int(kind)
+        self.n_features = int(n_features)
+        self.base_margin = float(base_margin)
+        self.tree_offset = np.asarray(tree_offset, dtype=np.int64)
+        self.tree_weight = np.asarray(tree_weight, dtype=np.float64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.missing = np.asarray(missing, dtype=np.int32)
+
+        if self.kind not in (XGB_LOGISTIC, ADABOOST_MEDIAN):
+            raise ValueError('Unknown tree ensemble kind: {}'.format(kind))
+
+    @property
+    def n_trees(self):
+        return len(self.tree_offset) - 1
+
+    @property
+    def n_nodes(self):
+        return len(self.threshold)
+
+    def tree_values(self, X):
+        # (n_trees, n_samples) leaf values. The inputs are rounded to float32
+        # first, as both XGBoost and sklearn do.
+        X = np.asarray(X, dtype=np.float64).astype(np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError('Expected {} features'.format(self.n_features))
+
+        samples = np.arange(len(X))
+        result = np.empty((self.n_trees, len(X)))
+        for t in range(self.n_trees):
+            base = self.tree_offset[t]
+            node = np.zeros(len(X), dtype=np.int64)
+            active = samples
+            while len(active):
+                idx = base + node[active]
+                feat = self.feature[idx]
+                split = feat >= 0
+                active, idx, feat = active[split], idx[split], feat[split]
+
+                x = X[active, feat]
+                if self.kind == XGB_LOGISTIC:
+                    go_left = x < self.threshold[idx]
+                else:
+                    go_left = x <= self.threshold[idx]
+                child = np.where(go_left, self.left[idx], self.right[idx])
+                node[active] = np.where(np.isnan(x), self.missing[idx], child)
+
+            result[t] = self.value[base + node]
+
+        return result
+
+    def predict(self, X):
+        # Same as predict_proba(X).T[1] (XGBClassifier) or predict(X)
+        # (AdaBoostRegressor)
+        values = self.tree_values(X)
+
+        if self.kind == XGB_LOGISTIC:
+            margin = np.full(values.shape[1], self.base_margin,
+                             dtype=np.float32)
+            for tree in values.astype(np.float32):
+                margin += tree
+            with np.errstate(over='ignore'):
+                return np.float32(1) / (np.float32(1) + np.exp(-margin))
+
+        # Same as AdaBoostRegressor._get_median_predict
+        preds = values.T
+        sorted_idx = np.argsort(preds, axis=1)
+        weight_cdf = np.cumsum(self.tree_weight[sorted_idx], axis=1)
+        median_or_above = weight_cdf >= 0.5 * weight_cdf[:, -1][:, np.newaxis]
+        median_idx = median_or_above.argmax(axis=1)
+        samples = np.arange(len(preds))
+        return preds[samples, sorted_idx[samples, median_idx]]
+
+
+##################
+# (De)serializer #
+##################
+
+def write_trees(filename, ens, source=''):
+    # 'source' identifies the pickle 'ens' was flattened from, see
+    # trees_source
+    header = np.array((TREES_MAGIC, TREES_VERSION, ens.kind, ens.n_features,
+                       ens.n_trees, ens.n_nodes, ens.base_margin,
+                       source.encode('ascii')), dtype=HEADER)
+
+    with open(filename, 'wb') as f:
+        f.write(header.tobytes())
+        for name, dtype in TREE_ARRAYS + NODE_ARRAYS:
+            arr = getattr(ens, name).astype(dtype).tobytes()
+            f.write(arr + b'\0' * (-len(arr) % 8))
+
+
+def trees_source(filename):
+    # The 'source' given to write_trees, or None if 'filename' is not a tree
+    # ensemble file of this version
+    with open(filename, 'rb') as f:
+        buf = f.read(HEADER.itemsize)
+    if len(buf) < HEADER.itemsize:
+        return None
+
+    header = np.frombuffer(buf, dtype=HEADER)[0]
+    if header['magic'] != TREES_MAGIC or header['version'] != TREES_VERSION:
+        return None
+    return header['source'].decode('ascii')
+
+
+def read_trees(filename):
+    # The arrays are views of a read-only memory map
+    buf = np.memmap(filename, dtype=np.uint8, mode='r')
+    header = buf[:HEADER.itemsize].view(HEADER)[0]
+    if header['magic'] != TREES_MAGIC or header['version'] != TREES_VERSION:
+        raise ValueError('{} is not a version {} tree ensemble file'.format(
+            filename, TREES_VERSION))
+
+    sizes = {'tree_offset': int(header['n_trees']) + 1,
+             'tree_weight': int(header['n_trees'])}
+    offset = HEADER.itemsize
+    arrays = dict()
+    for name, dtype in TREE_ARRAYS + NODE_ARRAYS:
+        size = sizes.get(name, int(header['n_nodes']))
+        nbytes = size * np.dtype(dtype).itemsize
+        arrays[name] = buf[offset:offset + nbytes].view(dtype)
+        offset += nbytes + (-nbytes % 8)
+
+    return TreeEnsemble(header['kind'], header['n_features'],
+                        base_margin=header['base_margin'], **arrays)
+
+
+##############
+# Flattening #
+##############
+
+def flatten_trees(trees):
+    # 'trees' is a list of per-tree (threshold, value, feature, left, right,
+    # missing)
+    offsets = np.cumsum([0] + [len(t[0]) for t in trees])
+    return offsets, [np.concatenate(arrs) for arrs in zip(*trees)]
+
+
+def flatten_xgb(model):
+    # From the JSON model of the booster, which has the float32 thresholds and
+    # leaf values exactly
+    with TemporaryDirectory() as tmpdir:
+        model_path = path.join(tmpdir, 'model.json')
+        model.get_booster().save_model(model_path)
+        with open(model_path, 'r') as f:
+            learner = json.load(f)['learner']
+
+    objective = learner['objective']['name']
+    booster = learner['gradient_booster']
+    if objective != 'binary:logistic' or booster['name'] != 'gbtree':
+        raise ValueError('Unsupported XGBoost model: {} {}'.format(
+            booster['name'], objective))
+
+    # Same as ProbToMargin of the logistic objective, in float32
+    base_score = np.float32(learner['learner_model_param']['base_score'])
+    base_margin = -np.log(np.float32(1) / base_score - np.float32(1))
+
+    trees = []
+    for tree in booster['model']['trees']:
+        left = np.array(tree['left_children'])
+        right = np.array(tree['right_children'])
+        # Leaves store their value in place of the split condition
+        cond = np.array(tree['split_conditions'], dtype=np.float32)
+        is_leaf = left == -1
+        trees.append((
+            np.where(is_leaf, 0, cond),
+            np.where(is_leaf, cond, 0),
+            np.where(is_leaf, -1, tree['split_indices']),
+            left, right,
+            np.where(np.array(tree['default_left']) != 0, left, right),
+        ))
+
+    offsets, (threshold, value, feature, left, right, missing) = \
+        flatten_trees(trees)
+    return TreeEnsemble(
+        XGB_LOGISTIC, learner['learner_model_param']['num_feature'],
+        offsets, np.ones(len(trees)), threshold, value, feature, left, right,
+        missing, base_margin)
+
+
+def flatten_adaboost(model):
+    trees = []
+    for est in model.estimators_:
+        tree = est.tree_
+        is_leaf = tree.children_left == -1
+        trees.append((
+            np.where(is_leaf, 0, tree.threshold),
+            np.where(is_leaf, tree.value[:, 0, 0], 0),
+            np.where(is_leaf, -1, tree.feature),
+            tree.children_left, tree.children_right,
+            # sklearn trees don't take NaN, and NaN <= threshold is false
+            tree.children_right,
+        ))
+
+    offsets, (threshold, value, feature, left, right, missing) = \
+        flatten_trees(trees)
+    return TreeEnsemble(
+        ADABOOST_MEDIAN, model.n_features_in_, offsets,
+        model.estimator_weights_[:len(trees)], threshold, value, feature,
+        left, right, missing)
+
+
+def flatten_model(model):
+    if hasattr(model, 'get_booster'):
+        return flatten_xgb(model)
+    if hasattr(model, 'estimator_weights_'):
+        return flatten_adaboost(model)
+    raise ValueError('Unsupported model: {}'.format(type(model).__name__))
@@ -0,0 +1,69 @@
+// Description: Bridges between contiguous columns (e.g. NumPy arrays) and trees
+
+#ifndef _COLUMNAR_
+#define _COLUMNAR_
+
+#include <cstring>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+#include <TTree.h>
+
+using std::string;
+using std::vector;
+
+// Create one branch per column and fill 'tree' row by row. 'addrs' are the
+// start addresses of the C-contiguous columns, 'sizes' their element sizes.
+void writeColumns( TTree* tree, const vector<string>& names,
+                   const vector<string>& leafTypes,
+                   const vector<ULong64_t>& addrs, const vector<int>& sizes,
+                   Long64_t nEntries, Int_t basketSize = 32000 ) {
+  vector<vector<char> > rows( names.size() );
+
+  for ( size_t b = 0; b < names.size(); b++ ) {
+    rows[b].resize( sizes[b] );
+    tree->Branch( names[b].c_str(), rows[b].data(),
+                  ( names[b] + "/" + leafTypes[b] ).c_str(), basketSize );
+  }
+
+  for ( Long64_t i = 0; i < nEntries; i++ ) {
+    for ( size_t b = 0; b < names.size(); b++ ) {
+      auto src = reinterpret_cast<const char*>( addrs[b] ) + i * sizes[b];
+      std::memcpy( rows[b].data(), src, sizes[b] );
+    }
+    tree->Fill();
+  }
+
+  // The row buffers go out of scope, so don't leave dangling addresses
+  tree->ResetBranchAddresses();
+}
+
+// The fillers generated by columnar.py write the row of each entry at
+// 'rdfentry_', so that the arrays are in input order with any number of
+// threads, and flag it in 'filled'.
+inline void checkColumnarEntry( ULong64_t entry, ULong64_t nRows ) {
+  if ( entry >= nRows )
+    throw std::out_of_range( "Entry " + std::to_string( entry ) +
+                             " beyond the preallocated rows" );
+}
+
+// Move the filled rows of a C-contiguous array to its front, in order, and
+// return how many there are. Entries are skipped by filters and ranges.
+ULong64_t compactRows( ULong64_t addr, size_t rowSize, ULong64_t filledAddr,
+                       ULong64_t nRows ) {
+  auto data   = reinterpret_cast<char*>( addr );
+  auto filled = reinterpret_cast<const unsigned char*>( filledAddr );
+
+  ULong64_t nFilled = 0;
+  for ( ULong64_t i = 0; i < nRows; i++ ) {
+    if ( !filled[i] ) continue;
+    if ( nFilled != i )
+      std::memmove( data + nFilled * rowSize, data + i * rowSize, rowSize );
+    nFilled++;
+  }
+
+  return nFilled;
+}
+
+#endif
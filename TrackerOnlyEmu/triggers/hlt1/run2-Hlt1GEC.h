@@ -7,6 +7,8 @@
 
 #include <TRandomGen.h>
 
+#include "../rng.h"
+
 // Blindly copied from RD+:
 //   This is a number I get from LHCb-PUB-2015-024
 const double EFF_CORRECTION = 0.042;
@@ -14,12 +16,22 @@ const double EFF_CORRECTION = 0.042;
 // Set the RNG, but seed it for reproducibility
 TRandomMixMax17 ONLINE_TRACK_RECO_EFF( 7 );
 
+// Stream for the thread-safe version, see rng.h
+const uint64_t ONLINE_TRACK_RECO_EFF_STREAM = 7;
+
 bool onlineTrackRecoEffCorr( double nTTHits ) {
   auto randNum = ONLINE_TRACK_RECO_EFF.Uniform( 0, 1 );
   if ( randNum < EFF_CORRECTION || nTTHits < 3 ) return false;
   return true;
 }
 
+// Thread-safe version: the random number only depends on the candidate seed
+bool onlineTrackRecoEffCorr( double nTTHits, uint64_t seed ) {
+  auto randNum = uniformFromSeed( seed, ONLINE_TRACK_RECO_EFF_STREAM );
+  if ( randNum < EFF_CORRECTION || nTTHits < 3 ) return false;
+  return true;
+}
+
 bool hlt1GEC( double nVeloClusters, double nITClusters, double nOTClusters ) {
   if ( ( nVeloClusters > 50 && nVeloClusters < 6000 ) &&
        ( nITClusters > 50 && nITClusters < 3000 ) &&
@@ -36,4 +48,12 @@ bool hlt1GlobalPass( double nTTHits, double nVeloClusters, double nITClusters,
   return false;
 }
 
+bool hlt1GlobalPass( double nTTHits, double nVeloClusters, double nITClusters,
+                     double nOTClusters, uint64_t seed ) {
+  if ( onlineTrackRecoEffCorr( nTTHits, seed ) &&
+       hlt1GEC( nVeloClusters, nITClusters, nOTClusters ) )
+    return true;
+  return false;
+}
+
 #endif
@@ -0,0 +1,78 @@
+// Description: Per-TCK Hlt1TrackMVA and Hlt1TwoTrackMVA thresholds
+//
+// The values are extracted from the dumps in tck_info by TrackerOnlyEmu.tck,
+// and declared as one 'const Hlt1TckParams HLT1_TCK_<tck>' per TCK by
+// run2_rdx_hlt1_tck_declare.
+
+#ifndef _RUN2_HLT1_TCK_
+#define _RUN2_HLT1_TCK_
+
+#include <algorithm>
+#include <vector>
+
+// The field order must match TRACK_MVA_PARAMS in tck.py
+struct Hlt1TrackMVAParams {
+  // Track reconstruction (Hlt1ProtoParticleUnit)
+  double inputPT;
+  double inputP;
+  double inputTRCHI2DOF;
+  double inputTRGHOSTPROB;
+  // Hlt1TrackMVAUnit
+  double TRCHI2DOF;
+  double TRGHOSTPROB;
+  double MINPT;
+  double MAXPT;
+  double BPVIPCHI2;
+  double param1;
+  double param2;
+  double param3;
+};
+
+// Same, with TWO_TRACK_MVA_PARAMS
+struct Hlt1TwoTrackMVAParams {
+  // Per-track selection
+  double PT;
+  double P;
+  double TRCHI2DOF;
+  double TRGHOSTPROB;
+  double BPVIPCHI2;
+  // Combination
+  double APT;
+  double DOCA;
+  // Vertex
+  double VCHI2;
+  double BPVETAMIN;
+  double BPVETAMAX;
+  double BPVCORRMMIN;
+  double BPVCORRMMAX;
+  double BPVDIRA;
+  double MVA;
+};
+
+struct Hlt1TckParams {
+  unsigned              tck;
+  Hlt1TrackMVAParams    trackMva;
+  Hlt1TwoTrackMVAParams twoTrackMva;
+};
+
+// Runs [first, last] were taken with 'tck'
+struct Hlt1TckRunRange {
+  unsigned first;
+  unsigned last;
+  unsigned tck;
+};
+
+// 'ranges' must be sorted and non-overlapping. Runs not covered give 0, which
+// is not a valid TCK.
+unsigned hlt1TckFromRun( unsigned                               runNumber,
+                         const std::vector<Hlt1TckRunRange>& ranges ) {
+  auto it = std::upper_bound(
+      ranges.begin(), ranges.end(), runNumber,
+      []( unsigned run, const Hlt1TckRunRange& r ) { return run < r.first; } );
+  if ( it == ranges.begin() ) return 0;
+
+  --it;
+  return runNumber <= it->last ? it->tck : 0;
+}
+
+#endif
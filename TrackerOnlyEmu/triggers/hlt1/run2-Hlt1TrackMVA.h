@@ -10,6 +10,8 @@
 
 #include <TMath.h>
 
+#include "run2-Hlt1Tck.h"
+
 using std::cout;
 using std::endl;
 
@@ -74,4 +76,33 @@ bool hlt1TrackMVATriggerEmu( double PT, double P, double TRCHI2DOF,
   return false;
 }
 
+// Same as above, with the thresholds of a given TCK instead of the year
+bool hlt1TrackInputDec( double PT, double P, double TRCHI2DOF,
+                        double TRGHOSTPROB, const Hlt1TrackMVAParams& params ) {
+  return PT > params.inputPT && P > params.inputP &&
+         TRCHI2DOF < params.inputTRCHI2DOF &&
+         TRGHOSTPROB < params.inputTRGHOSTPROB;
+}
+
+bool hlt1TrackMVADec( double PT, double P, double TRCHI2DOF, double BPVIPCHI2,
+                      double TRGHOSTPROB, const Hlt1TrackMVAParams& params ) {
+  if ( TRCHI2DOF <= 0 || BPVIPCHI2 <= 0 ) return false;
+  if ( TRCHI2DOF >= params.TRCHI2DOF || TRGHOSTPROB >= params.TRGHOSTPROB )
+    return false;
+
+  return ( PT > params.MAXPT && BPVIPCHI2 > params.BPVIPCHI2 ) ||
+         ( ( PT > params.MINPT && PT < params.MAXPT ) &&
+           trackMVAVal( BPVIPCHI2, PT, params.param1, params.param2,
+                        params.param3, params.MAXPT ) );
+}
+
+bool hlt1TrackMVATriggerEmu( double PT, double P, double TRCHI2DOF,
+                             double BPVIPCHI2, double TRGHOSTPROB,
+                             bool passSel, const Hlt1TrackMVAParams& params ) {
+  if ( passSel && hlt1TrackInputDec( PT, P, TRCHI2DOF, TRGHOSTPROB, params ) ) {
+    return hlt1TrackMVADec( PT, P, TRCHI2DOF, BPVIPCHI2, TRGHOSTPROB, params );
+  }
+  return false;
+}
+
 #endif
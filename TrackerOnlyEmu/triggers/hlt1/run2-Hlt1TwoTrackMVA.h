@@ -6,13 +6,22 @@
 #ifndef _RUN2_HLT1_TWOTRACKMVA_
 #define _RUN2_HLT1_TWOTRACKMVA_
 
+#include <algorithm>
+#include <array>
+#include <cmath>
 #include <iostream>
 #include <map>
+#include <memory>
+#include <mutex>
 #include <string>
+#include <utility>
 #include <vector>
 
 #include <TMath.h>
 
+#include "run2-Hlt1Tck.h"
+
+using std::array;
 using std::cout;
 using std::endl;
 using std::map;
@@ -23,18 +32,93 @@ using std::vector;
 // General helpers //
 /////////////////////
 
+// Fixed-layout track and two-track combination variables. The field order must
+// match TWO_TRACK_SPEC_BRANCHES and TWO_TRACK_COMB_SPEC_BRANCHES in
+// emulation/run2_rdx.py, which fill them with aggregate initialization.
+struct TwoTrackSpec {
+  double PT;
+  double P;
+  double TRCHI2DOF;
+  double BPVIPCHI2;
+  double TRGHOSTPROB;
+  double PX;
+  double PY;
+};
+
+struct TwoTrackCombSpec {
+  double VDCHI2;
+  double SUMPT;
+  double DOCA;
+  double VCHI2;
+  double BPVETA;
+  double BPVCORRM;
+  double BPVDIRA;
+  double MVA;
+};
+
+// All combinations of 'k' out of 'n' indices, in lexicographic order, stored
+// flat: combination 'i' is [ indices[i*k], ..., indices[i*k+k-1] ]
+struct CombinationTable {
+  int         n;
+  int         k;
+  vector<int> indices;
+
+  size_t     size() const { return k > 0 ? indices.size() / k : 0; }
+  const int* operator[]( size_t i ) const { return indices.data() + i * k; }
+};
+
+CombinationTable buildCombinationTable( int n, int k ) {
+  CombinationTable table{ n, k, {} };
+  if ( k <= 0 || k > n ) return table;
+
+  vector<int> comb( k );
+  for ( int i = 0; i < k; i++ ) comb[i] = i;
+
+  while ( true ) {
+    table.indices.insert( table.indices.end(), comb.begin(), comb.end() );
+
+    // Advance the rightmost index that can still move
+    int pos = k - 1;
+    while ( pos >= 0 && comb[pos] == n - k + pos ) pos--;
+    if ( pos < 0 ) break;
+
+    comb[pos]++;
+    for ( int i = pos + 1; i < k; i++ ) comb[i] = comb[i - 1] + 1;
+  }
+
+  return table;
+}
+
+// Built once per (n, k) for the whole process. The tables are never freed or
+// modified, so the references stay valid and can be read from any thread.
+const CombinationTable& combinationTable( int n, int k ) {
+  static std::mutex mtx;
+  static map<std::pair<int, int>, std::unique_ptr<const CombinationTable> >
+      cache;
+
+  std::lock_guard<std::mutex> lock( mtx );
+  auto& entry = cache[{ n, k }];
+  if ( !entry ) entry.reset( new CombinationTable( buildCombinationTable( n, k ) ) );
+  return *entry;
+}
+
+// Same, for sizes known at compile time, without taking the lock
+template <int N, int K>
+const CombinationTable& combinationTable() {
+  static const CombinationTable table = buildCombinationTable( N, K );
+  return table;
+}
+
+// Kept for backward compatibility, prefer combinationTable
 vector<vector<int> > combination( int totSize, int combSize,
                                   int headIdx = 0 ) {
   vector<vector<int> > result;
+  const auto& table = combinationTable( totSize - headIdx, combSize );
 
-  for ( int head = headIdx; head <= totSize - combSize; head++ ) {
-    if ( combSize > 1 ) {
-      for ( auto subComb : combination( totSize, combSize - 1, head + 1 ) ) {
-        subComb.emplace( subComb.begin(), head );
-        result.emplace_back( subComb );
-      }
-    } else
-      result.emplace_back( vector<int>{ head } );
+  for ( size_t i = 0; i < table.size(); i++ ) {
+    vector<int> comb( table[i], table[i] + combSize );
+    for ( auto& idx : comb ) idx += headIdx;
+    result.emplace_back( comb );
   }
 
   return result;
@@ -91,6 +175,30 @@ bool hlt1TwoTrackMVADec( double VDCHI2, double APT, double DOCA, double VCHI2,
   return false;
 }
 
+// Same as above, with the thresholds of a given TCK instead of the year
+bool hlt1TwoTrackInputDec( double PT, double P, double TRCHI2DOF,
+                           double BPVIPCHI2, double TRGHOSTPROB,
+                           const Hlt1TwoTrackMVAParams& params ) {
+  if ( TRCHI2DOF <= 0 ) return false;
+  return PT > params.PT && P > params.P && TRCHI2DOF < params.TRCHI2DOF &&
+         TRGHOSTPROB < params.TRGHOSTPROB && BPVIPCHI2 > params.BPVIPCHI2;
+}
+
+bool hlt1TwoTrackMVADec( double VDCHI2, double APT, double DOCA, double VCHI2,
+                         double BPVETA, double BPVCORRM, double BPVDIRA,
+                         double MVA, const Hlt1TwoTrackMVAParams& params ) {
+  if ( VDCHI2 <= 0 || APT <= 0 || VCHI2 <= 0 || BPVCORRM <= 0 ) return false;
+
+  bool selPreVertexing =
+      ( DOCA > 0 && DOCA < params.DOCA ) && APT > params.APT;
+  bool selCombo =
+      VCHI2 < params.VCHI2 &&
+      ( BPVETA > params.BPVETAMIN && BPVETA < params.BPVETAMAX ) &&
+      ( BPVCORRM > params.BPVCORRMMIN && BPVCORRM < params.BPVCORRMMAX ) &&
+      BPVDIRA > params.BPVDIRA && MVA > params.MVA;
+  return selPreVertexing && selCombo;
+}
+
 bool hlt1TwoTrackMVATriggerEmu( vector<map<string, double> >& trackSpec,
                                 vector<map<string, double> >& combSpec,
                                 vector<bool>& trackPassSel, int year ) {
@@ -105,12 +213,13 @@ bool hlt1TwoTrackMVATriggerEmu( vector<map<string, double> >& trackSpec,
   const double sumPtThresh = 1;  // in MeV
 
   // First check if any 2 tracks pass the per-track selection
-  for ( auto idxSet : combination( trackSpec.size(), 2 ) ) {
+  const auto& pairs = combinationTable( trackSpec.size(), 2 );
+  for ( size_t p = 0; p < pairs.size(); p++ ) {
     bool   passPerSel = true;
-    double trackSumPt, trackSumPx, trackSumPy;
+    double trackSumPt = 0, trackSumPx = 0, trackSumPy = 0;
 
-    for ( auto idx : idxSet ) {
-      auto track = trackSpec[idx];
+    for ( auto idx : { pairs[p][0], pairs[p][1] } ) {
+      auto& track = trackSpec[idx];
       passPerSel = ( passPerSel &&
                      hlt1TwoTrackInputDec(
                          track["PT"], track["P"], track["TRCHI2DOF"],
@@ -127,7 +236,7 @@ bool hlt1TwoTrackMVATriggerEmu( vector<map<string, double> >& trackSpec,
       // Now find if these 2 tracks correspond to any two-track combo
       // By 'two-track combo', I mean variables like b0_SUMPT_COMBO_1_2
 
-      for ( auto comb : combSpec ) {
+      for ( auto& comb : combSpec ) {
         if ( TMath::Abs( comb["SUMPT"] - trackSumPt ) <= sumPtThresh ) {
           auto passCombSel = hlt1TwoTrackMVADec(
               comb["VDCHI2"], trackAPt, comb["DOCA"], comb["VCHI2"],
@@ -142,4 +251,69 @@ bool hlt1TwoTrackMVATriggerEmu( vector<map<string, double> >& trackSpec,
   return false;
 }
 
+// Same as above, but with fixed-size arrays of plain structs, so nothing is
+// allocated or looked up by name per event. Works for any number of tracks and
+// combos; the cost grows with pairs * log(combos) instead of pairs * combos.
+// 'thresholds' is either the year or the Hlt1TwoTrackMVAParams of a TCK.
+template <size_t NTrack, size_t NComb, typename Thresholds>
+bool hlt1TwoTrackMVATriggerEmu( const array<TwoTrackSpec, NTrack>&     trackSpec,
+                                const array<TwoTrackCombSpec, NComb>& combSpec,
+                                const array<bool, NTrack>& trackPassSel,
+                                const Thresholds&          thresholds ) {
+  const double sumPtThresh = 1;  // in MeV
+
+  // The per-track selection doesn't depend on the pair
+  array<bool, NTrack> passInput;
+  for ( size_t i = 0; i < NTrack; i++ ) {
+    const auto& track = trackSpec[i];
+    passInput[i] =
+        trackPassSel[i] &&
+        hlt1TwoTrackInputDec( track.PT, track.P, track.TRCHI2DOF,
+                              track.BPVIPCHI2, track.TRGHOSTPROB, thresholds );
+  }
+
+  // Sort the combos by SUMPT once, so that each pair only looks at the combos
+  // within the matching window. Combos with a NaN SUMPT never match, leave
+  // them out so that the ordering is well-defined. There are at most 15 combos,
+  // so an insertion sort is enough.
+  array<size_t, NComb> bySumPt;
+  size_t               nSorted = 0;
+  for ( size_t c = 0; c < NComb; c++ ) {
+    if ( std::isnan( combSpec[c].SUMPT ) ) continue;
+
+    auto pos = nSorted++;
+    for ( ; pos > 0 && combSpec[bySumPt[pos - 1]].SUMPT > combSpec[c].SUMPT;
+          pos-- )
+      bySumPt[pos] = bySumPt[pos - 1];
+    bySumPt[pos] = c;
+  }
+
+  const auto& pairs = combinationTable<static_cast<int>( NTrack ), 2>();
+  for ( size_t p = 0; p < pairs.size(); p++ ) {
+    auto i = pairs[p][0], j = pairs[p][1];
+    if ( !passInput[i] || !passInput[j] ) continue;
+
+    const auto& track1     = trackSpec[i];
+    const auto& track2     = trackSpec[j];
+    auto        trackSumPt = track1.PT + track2.PT;
+    auto trackAPt = computePt( track1.PX + track2.PX, track1.PY + track2.PY );
+
+    auto first = std::lower_bound(
+        bySumPt.begin(), bySumPt.begin() + nSorted, trackSumPt - sumPtThresh,
+        [&]( size_t c, double val ) { return combSpec[c].SUMPT < val; } );
+
+    for ( auto it = first; it != bySumPt.begin() + nSorted; it++ ) {
+      const auto& comb = combSpec[*it];
+      if ( comb.SUMPT > trackSumPt + sumPtThresh ) break;
+
+      if ( hlt1TwoTrackMVADec( comb.VDCHI2, trackAPt, comb.DOCA, comb.VCHI2,
+                               comb.BPVETA, comb.BPVCORRM, comb.BPVDIRA,
+                               comb.MVA, thresholds ) )
+        return true;
+    }
+  }
+
+  return false;
+}
+
 #endif
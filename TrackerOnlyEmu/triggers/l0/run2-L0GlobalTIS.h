@@ -1,17 +1,21 @@
 // Stolen from:
 //   https://gitlab.cern.ch/lhcb-slb/B02DplusTauNu/-/blob/master/tuple_processing_chain/emulate_L0Hadron_TOS_RLc.py
-// Last Change: Wed May 19, 2021 at 12:27 AM +0200
+// Last Change: Sun Oct 18, 2026 at 09:20 PM +0000
 //
-#ifndef _RUN2_L0_HADRON_
-#define _RUN2_L0_HADRON_
+#ifndef _RUN2_L0_GLOBAL_TIS_
+#define _RUN2_L0_GLOBAL_TIS_
 
+#include <cmath>
 #include <map>
+#include <vector>
 
 #include <TFile.h>
 #include <TH2F.h>
 #include <TMath.h>
 #include <TString.h>
 
+#include "../lut.h"
+
 using std::map;
 using std::vector;
 
@@ -43,33 +47,59 @@ map<int, TH2F*> readL0GlobalTisResp( TFile* ntp ) {
   return resp;
 }
 
+map<int, LutMap> readL0GlobalTisResp( const LutFile& lut ) {
+  map<int, LutMap> resp;
+
+  for ( auto const& m : YEAR_HISTO_REL ) {
+    auto histo_name = RESP_HISTO_PREFIX + m.second;
+    resp[m.first]   = lut.get( histo_name.Data() );
+  }
+
+  return resp;
+}
+
+// ad-hoc correction to mimic high log(pT) behavior seen in rdx fullsim MC, found in lhcb-ntuples-gen/scripts/l0_global_tis_highpT_adhoc_correction.py using D*+munu fullsim MC
+// Return nullptr for the bins without correction
+const vector<float>* l0GlobalTisAdhocParams( int year, int binPZ ) {
+  static const map<int, map<int, vector<float>>> ADHOC_DSTMUNU_HIGHPT_CORRECTION = {
+    { 2016, { { 1, {9.576293217377373, 0.38961711525917053, -0.04307553315370772} }, // D*munu high log(pT) bin mean, eff from JpsiK data, slope correction
+              { 2, {9.645412819275125, 0.40560808777809143, 0.1920121662958972} },
+              { 3, {9.724147903446033, 0.41952842473983765, 0.21584737936752765} },
+              { 4, {9.80807058838877, 0.46126940846443176, 0.25353211968587264} } } },
+    { 2017, { { 1, {9.573918210303054, 0.3488537669181824, 0.19981855562035766} },
+              { 2, {9.648051795507696, 0.3812873661518097, 0.1692287430651749} },
+              { 3, {9.724531930069968, 0.42026373744010925, 0.20335972471697286} },
+              { 4, {9.80744115981552, 0.4522625207901001, 0.2293965047341547} } } },
+    { 2018, { { 1, {9.575316536210408, 0.36407339572906494, -0.15023259431100983} },
+              { 2, {9.64728926210228, 0.3955422341823578, 0.15679897820527733} },
+              { 3, {9.72602227412706, 0.4256914556026459, 0.24396464174205812} },
+              { 4, {9.807297853596634, 0.45863404870033264, 0.2866896902756077} } } },
+  };
+
+  auto yearCorr = ADHOC_DSTMUNU_HIGHPT_CORRECTION.find( year );
+  if ( yearCorr == ADHOC_DSTMUNU_HIGHPT_CORRECTION.end() ) return nullptr;
+  auto binCorr = yearCorr->second.find( binPZ );
+  if ( binCorr == yearCorr->second.end() ) return nullptr;
+  return &binCorr->second;
+}
+
+// w = w_uncor(a_i(log(pT)-m_i)+e_i)/e_i, but w_uncor = e_i, see l0_global_tis_highpT_adhoc_correction.py for notation
+float l0GlobalTisAdhocCorrection( double PT, const vector<float>& adhoc ) {
+  return adhoc[2]*(TMath::Log(PT)-adhoc[0])+adhoc[1];
+}
+
 // This is emulated as a weight in float
 float l0GlobalTisTriggerEmu( double PZ, double PT, int year,
-                             map<int, TH2F*> respHistos, bool adhoc_correction ) {
-  auto hist = respHistos[year];
-
-  // ad-hoc correction to mimic high log(pT) behavior seen in rdx fullsim MC, found in lhcb-ntuples-gen/scripts/l0_global_tis_highpT_adhoc_correction.py using D*+munu fullsim MC
-  map<int, map<int, vector<float>>> ADHOC_DSTMUNU_HIGHPT_CORRECTION;
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2016][1] = {9.576293217377373, 0.38961711525917053, -0.04307553315370772}; // D*munu high log(pT) bin mean, eff from JpsiK data, slope correction
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2016][2] = {9.645412819275125, 0.40560808777809143, 0.1920121662958972};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2016][3] = {9.724147903446033, 0.41952842473983765, 0.21584737936752765};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2016][4] = {9.80807058838877, 0.46126940846443176, 0.25353211968587264};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2017][1] = {9.573918210303054, 0.3488537669181824, 0.19981855562035766};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2017][2] = {9.648051795507696, 0.3812873661518097, 0.1692287430651749};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2017][3] = {9.724531930069968, 0.42026373744010925, 0.20335972471697286};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2017][4] = {9.80744115981552, 0.4522625207901001, 0.2293965047341547};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2018][1] = {9.575316536210408, 0.36407339572906494, -0.15023259431100983};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2018][2] = {9.64728926210228, 0.3955422341823578, 0.15679897820527733};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2018][3] = {9.72602227412706, 0.4256914556026459, 0.24396464174205812};
-  ADHOC_DSTMUNU_HIGHPT_CORRECTION[2018][4] = {9.807297853596634, 0.45863404870033264, 0.2866896902756077};
+                             const map<int, TH2F*>& respHistos, bool adhoc_correction ) {
+  auto hist = respHistos.at( year );
 
   if ( PZ > 0 ) {
-    auto binPZ = hist->GetXaxis()->FindBin( TMath::Log( PZ ) );
-    auto binPT = hist->GetYaxis()->FindBin( TMath::Log( PT ) );
-    if (adhoc_correction && binPT == hist->GetNbinsY()) { // only apply correction to high log(pT) bin (w = w_uncor(a_i(log(pT)-m_i)+e_i)/e_i, but w_uncor = e_i, see l0_global_tis_highpT_adhoc_correction.py for notation)
+    auto binPZ = hist->GetXaxis()->FindFixBin( TMath::Log( PZ ) );
+    auto binPT = hist->GetYaxis()->FindFixBin( TMath::Log( PT ) );
+    auto adhoc = l0GlobalTisAdhocParams( year, binPZ );
+    if (adhoc_correction && binPT == hist->GetNbinsY() && adhoc) { // only apply correction to high log(pT) bin
       // std::cout << "...correcting L0 Global TIS measurement for high B log(pT)..." << std::endl;
-      vector<float> adhoc = ADHOC_DSTMUNU_HIGHPT_CORRECTION[year][binPZ];
-      return adhoc[2]*(TMath::Log(PT)-adhoc[0])+adhoc[1];
+      return l0GlobalTisAdhocCorrection( PT, *adhoc );
     }
     return hist->GetBinContent( binPZ, binPT );
   }
@@ -77,4 +107,73 @@ float l0GlobalTisTriggerEmu( double PZ, double PT, int year,
   return 0;
 }
 
+// Same, with the maps compiled into lookup tables
+float l0GlobalTisTriggerEmu( double PZ, double PT, int year,
+                             const map<int, LutMap>& respMaps, bool adhoc_correction ) {
+  const auto& resp = respMaps.at( year );
+
+  if ( PZ > 0 ) {
+    auto binPZ = resp.x.findBin( TMath::Log( PZ ) );
+    auto binPT = resp.y.findBin( TMath::Log( PT ) );
+    auto adhoc = l0GlobalTisAdhocParams( year, binPZ );
+    if ( adhoc_correction && binPT == resp.nbinsY() && adhoc )
+      return l0GlobalTisAdhocCorrection( PT, *adhoc );
+    return resp.binContent( binPZ, binPT );
+  }
+
+  return 0;
+}
+
+///////////////////////////////
+// L0Global TIS, flat tables //
+///////////////////////////////
+
+// The efficiency map of one year, with the ad-hoc correction of each PZ bin
+// unpacked, so that the weight needs no map lookup nor allocation per event
+struct L0GlobalTisTable {
+  LutMap        resp;
+  vector<char>  hasAdhoc;  // Per PZ bin, including under/overflow
+  vector<float> adhocMean;
+  vector<float> adhocEff;
+  vector<float> adhocSlope;
+};
+
+L0GlobalTisTable buildL0GlobalTisTable( const LutMap& resp, int year ) {
+  auto nBins = resp.nbinsX() + 2;
+  L0GlobalTisTable table{ resp, vector<char>( nBins, 0 ),
+                          vector<float>( nBins, 0 ), vector<float>( nBins, 0 ),
+                          vector<float>( nBins, 0 ) };
+
+  for ( int bin = 0; bin < nBins; bin++ ) {
+    auto adhoc = l0GlobalTisAdhocParams( year, bin );
+    if ( !adhoc ) continue;
+    table.hasAdhoc[bin]   = 1;
+    table.adhocMean[bin]  = ( *adhoc )[0];
+    table.adhocEff[bin]   = ( *adhoc )[1];
+    table.adhocSlope[bin] = ( *adhoc )[2];
+  }
+
+  return table;
+}
+
+L0GlobalTisTable readL0GlobalTisTable( const LutFile& lut, int year ) {
+  auto histo_name = RESP_HISTO_PREFIX + YEAR_HISTO_REL.at( year );
+  return buildL0GlobalTisTable( lut.get( histo_name.Data() ), year );
+}
+
+// Same as l0GlobalTisTriggerEmu
+float l0GlobalTisWeight( double PZ, double PT, const L0GlobalTisTable& table,
+                         bool adhoc_correction ) {
+  if ( !( PZ > 0 ) ) return 0;
+
+  auto logPT = std::log( PT );
+  auto binPZ = table.resp.x.findBin( std::log( PZ ) );
+  auto binPT = table.resp.y.findBin( logPT );
+  if ( adhoc_correction && binPT == table.resp.nbinsY() &&
+       table.hasAdhoc[binPZ] )
+    return table.adhocSlope[binPZ] * ( logPT - table.adhocMean[binPZ] ) +
+           table.adhocEff[binPZ];
+  return table.resp.binContent( binPZ, binPT );
+}
+
 #endif
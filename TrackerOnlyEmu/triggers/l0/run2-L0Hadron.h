@@ -1,18 +1,23 @@
 // Stolen from:
 //   https://gitlab.cern.ch/lhcb-slb/B02DplusTauNu/-/blob/master/tuple_processing_chain/emulate_L0Hadron_TOS_RLc.py
-// Last Change: Tue May 18, 2021 at 12:44 AM +0200
+// Last Change: Sun Oct 18, 2026 at 05:10 PM +0000
 //
 #ifndef _RUN2_L0_HADRON_
 #define _RUN2_L0_HADRON_
 
+#include <algorithm>
 #include <vector>
 
 #include <TFile.h>
 #include <TH1D.h>
 #include <TMath.h>
+#include <TRandom.h>
 #include <TRandom3.h>
 #include <TString.h>
 
+#include "../lut.h"
+#include "../rng.h"
+
 using std::vector;
 
 ///////////////////
@@ -30,6 +35,14 @@ const double PT_HIGH = 15000;
 
 TRandom3 SHARED_EFF = TRandom3( 41 );
 
+// Streams for the thread-safe versions, see rng.h
+const uint64_t HCAL_RESP_STREAM  = 40;
+const uint64_t SHARED_EFF_STREAM = 41;
+
+// Number of quantile buckets of the guide table of HcalRespCdf. A power of 2,
+// so that the bucket of a uniform is exact.
+const int HCAL_RESP_GUIDE_SIZE = 64;
+
 ///////////////////////////////////
 // Single particle HCAL response //
 ///////////////////////////////////
@@ -54,7 +67,11 @@ vector<vector<TH1D*> > readSinglePartResp( TFile* ntp ) {
       histName += i;
       histName += "_";
       histName += j;
-      rowResp.push_back( static_cast<TH1D*>( ntp->Get( histName ) ) );
+      auto hist = static_cast<TH1D*>( ntp->Get( histName ) );
+      // Compute the cumulative integral now, so that sampling in the event
+      // loop never modifies the histogram
+      hist->ComputeIntegral( true );
+      rowResp.push_back( hist );
     }
     hcalResp.push_back( rowResp );
   }
@@ -71,7 +88,7 @@ int computeRespBin( double x, double xLow, double xHigh, int numBins ) {
 
 // Reimplementation of 'random_smearing'
 double singlePartEt( double P, double PT, double realET,
-                     vector<vector<TH1D*> > respHistos ) {
+                     const vector<vector<TH1D*> >& respHistos ) {
   auto binP  = computeRespBin( P, P_LOW, P_HIGH, P_BIN );
   auto binPT = computeRespBin( PT, PT_LOW, PT_HIGH, PT_BIN );
   auto hist  = respHistos[binP][binPT];
@@ -84,6 +101,193 @@ double singlePartEt( double P, double PT, double realET,
   return smearedET;
 }
 
+// Same as TH1::GetRandom, but with the uniform random number supplied by us
+double sampleHisto( TH1D* hist, double rnd ) {
+  auto nBins    = hist->GetNbinsX();
+  auto integral = hist->GetIntegral();
+  if ( integral[nBins] == 0 ) return 0;
+
+  auto   bin = TMath::BinarySearch( nBins, integral, rnd );
+  double x   = hist->GetBinLowEdge( bin + 1 );
+  if ( rnd > integral[bin] )
+    x += hist->GetBinWidth( bin + 1 ) * ( rnd - integral[bin] ) /
+         ( integral[bin + 1] - integral[bin] );
+  return x;
+}
+
+// Thread-safe version: the smearing only depends on the candidate seed
+double singlePartEt( double P, double PT, double realET,
+                     const vector<vector<TH1D*> >& respHistos,
+                     uint64_t                      seed ) {
+  auto binP  = computeRespBin( P, P_LOW, P_HIGH, P_BIN );
+  auto binPT = computeRespBin( PT, PT_LOW, PT_HIGH, PT_BIN );
+  auto hist  = respHistos[binP][binPT];
+
+  double smearFactor =
+      sampleHisto( hist, uniformFromSeed( seed, HCAL_RESP_STREAM ) );
+  double smearedET = realET * ( 1 - smearFactor );
+  if ( smearedET < 0 ) smearedET = 0;
+  if ( smearedET > 6100 ) smearedET = 6100;  // Due to limitation of HCAL
+
+  return smearedET;
+}
+
+//////////////////////////////////////////////
+// Single particle HCAL response, flattened //
+//////////////////////////////////////////////
+// The P_BIN x PT_BIN response histograms, compiled once into flat cumulative
+// tables. Sampling gives the same numbers as sampleHisto, without going
+// through TH1 per particle.
+
+struct HcalRespCdf {
+  // Histogram h = binP * PT_BIN + binPT owns the entries [offset[h],
+  // offset[h+1]) of the arrays below, that is nBins + 1 of them
+  vector<int>    offset;
+  vector<double> integral;  // Normalized cumulative integral, as TH1
+  vector<double> lowEdge;   // Of each bin, the last entry is unused
+  vector<double> width;
+  // guide[h * (HCAL_RESP_GUIDE_SIZE + 1) + k] is the bin of the quantile
+  // k / HCAL_RESP_GUIDE_SIZE, so the bin of a uniform in bucket k lies between
+  // guide[k] and guide[k+1]
+  vector<int> guide;
+};
+
+// Same as TMath::BinarySearch, restricted to [first, last)
+int hcalRespBinSearch( const double* integral, int first, int last,
+                       double rnd ) {
+  auto pos = std::lower_bound( integral + first, integral + last, rnd );
+  if ( pos != integral + last && *pos == rnd ) return pos - integral;
+  return pos - integral - 1;
+}
+
+// Append one histogram, given its normalized cumulative integral
+template <typename BinLowEdge, typename BinWidth>
+void appendHcalRespCdf( HcalRespCdf& cdf, int nBins, const double* integral,
+                        BinLowEdge lowEdge, BinWidth width ) {
+  auto first = static_cast<int>( cdf.integral.size() );
+
+  for ( auto bin = 0; bin <= nBins; bin++ ) {
+    cdf.integral.push_back( integral[bin] );
+    cdf.lowEdge.push_back( lowEdge( bin + 1 ) );
+    cdf.width.push_back( bin < nBins ? width( bin + 1 ) : 0 );
+  }
+  cdf.offset.push_back( cdf.integral.size() );
+
+  for ( auto k = 0; k <= HCAL_RESP_GUIDE_SIZE; k++ ) {
+    auto bin =
+        hcalRespBinSearch( cdf.integral.data(), first, first + nBins,
+                           double( k ) / HCAL_RESP_GUIDE_SIZE );
+    cdf.guide.push_back( TMath::Max( bin - first, 0 ) );
+  }
+}
+
+HcalRespCdf buildHcalRespCdf( const vector<vector<TH1D*> >& respHistos ) {
+  HcalRespCdf cdf;
+  cdf.offset.push_back( 0 );
+
+  for ( auto i = 0; i < P_BIN; i++ ) {
+    for ( auto j = 0; j < PT_BIN; j++ ) {
+      auto hist = respHistos[i][j];
+      appendHcalRespCdf(
+          cdf, hist->GetNbinsX(), hist->GetIntegral(),
+          [hist]( int bin ) { return hist->GetBinLowEdge( bin ); },
+          [hist]( int bin ) { return hist->GetBinWidth( bin ); } );
+    }
+  }
+
+  return cdf;
+}
+
+HcalRespCdf readSinglePartRespCdf( TFile* ntp ) {
+  return buildHcalRespCdf( readSinglePartResp( ntp ) );
+}
+
+// From the compiled hcal_et_response.root, without ROOT histograms
+HcalRespCdf readSinglePartRespCdf( const LutFile& lut ) {
+  HcalRespCdf cdf;
+  cdf.offset.push_back( 0 );
+
+  for ( auto i = 0; i < P_BIN; i++ ) {
+    for ( auto j = 0; j < PT_BIN; j++ ) {
+      const auto& resp =
+          lut.get( "hdiff_" + std::to_string( i ) + "_" + std::to_string( j ) );
+      auto nBins = resp.nbinsX();
+
+      // Same as TH1::ComputeIntegral
+      vector<double> integral( nBins + 1, 0 );
+      for ( auto bin = 1; bin <= nBins; bin++ )
+        integral[bin] = integral[bin - 1] + resp.binContent( bin );
+      if ( integral[nBins] != 0 )
+        for ( auto bin = 1; bin <= nBins; bin++ )
+          integral[bin] /= integral[nBins];
+
+      appendHcalRespCdf(
+          cdf, nBins, integral.data(),
+          [&resp]( int bin ) { return resp.x.binLowEdge( bin ); },
+          [&resp]( int bin ) { return resp.x.binWidth( bin ); } );
+    }
+  }
+
+  return cdf;
+}
+
+bool isEmptyHcalResp( const HcalRespCdf& cdf, int binP, int binPT ) {
+  auto h = binP * PT_BIN + binPT;
+  return cdf.integral[cdf.offset[h + 1] - 1] == 0;
+}
+
+// Same as sampleHisto on histogram (binP, binPT)
+double sampleHcalResp( const HcalRespCdf& cdf, int binP, int binPT,
+                       double rnd ) {
+  auto h        = binP * PT_BIN + binPT;
+  auto first    = cdf.offset[h];
+  auto integral = cdf.integral.data();
+  if ( isEmptyHcalResp( cdf, binP, binPT ) ) return 0;
+
+  auto guide = cdf.guide.data() + h * ( HCAL_RESP_GUIDE_SIZE + 1 );
+  auto k     = static_cast<int>( rnd * HCAL_RESP_GUIDE_SIZE );
+  if ( k >= HCAL_RESP_GUIDE_SIZE ) k = HCAL_RESP_GUIDE_SIZE - 1;
+  auto bin = hcalRespBinSearch( integral, first + guide[k],
+                                first + guide[k + 1] + 1, rnd );
+
+  double x = cdf.lowEdge[bin];
+  if ( rnd > integral[bin] )
+    x += cdf.width[bin] * ( rnd - integral[bin] ) /
+         ( integral[bin + 1] - integral[bin] );
+  return x;
+}
+
+double smearSinglePartEt( double realET, double smearFactor ) {
+  double smearedET = realET * ( 1 - smearFactor );
+  if ( smearedET < 0 ) smearedET = 0;
+  if ( smearedET > 6100 ) smearedET = 6100;  // Due to limitation of HCAL
+  return smearedET;
+}
+
+// Draws from gRandom, as TH1::GetRandom does. Like it, don't draw for an empty
+// histogram, so that the random sequence is the same.
+double singlePartEt( double P, double PT, double realET,
+                     const HcalRespCdf& cdf ) {
+  auto binP  = computeRespBin( P, P_LOW, P_HIGH, P_BIN );
+  auto binPT = computeRespBin( PT, PT_LOW, PT_HIGH, PT_BIN );
+  if ( isEmptyHcalResp( cdf, binP, binPT ) )
+    return smearSinglePartEt( realET, 0 );
+
+  return smearSinglePartEt(
+      realET, sampleHcalResp( cdf, binP, binPT, gRandom->Rndm() ) );
+}
+
+// Thread-safe version
+double singlePartEt( double P, double PT, double realET,
+                     const HcalRespCdf& cdf, uint64_t seed ) {
+  auto binP  = computeRespBin( P, P_LOW, P_HIGH, P_BIN );
+  auto binPT = computeRespBin( PT, PT_LOW, PT_HIGH, PT_BIN );
+
+  return smearSinglePartEt(
+      realET, sampleHcalResp( cdf, binP, binPT,
+                              uniformFromSeed( seed, HCAL_RESP_STREAM ) ) );
+}
+
 //////////////////////////////
 // Two particle corrections //
 //////////////////////////////
@@ -105,6 +309,41 @@ bool isShared( double rDiff, int region1, int region2, TH1D* histoSharedInner,
   return false;
 }
 
+// Thread-safe version
+bool isShared( double rDiff, int region1, int region2, TH1D* histoSharedInner,
+               TH1D* histoSharedOuter, uint64_t seed ) {
+  if ( region1 != region2 ) return false;
+
+  TH1D* histo = histoSharedOuter;
+  if ( region1 == 1 ) histo = histoSharedInner;
+
+  double fracShared = histo->GetBinContent( histo->FindFixBin( rDiff ) );
+  if ( uniformFromSeed( seed, SHARED_EFF_STREAM ) < fracShared ) return true;
+  return false;
+}
+
+// Same, with the maps compiled into lookup tables
+bool isShared( double rDiff, int region1, int region2,
+               const LutMap& sharedInner, const LutMap& sharedOuter ) {
+  if ( region1 != region2 ) return false;
+
+  const auto& resp       = region1 == 1 ? sharedInner : sharedOuter;
+  double      fracShared = resp.value( rDiff );
+  if ( SHARED_EFF.Uniform() < fracShared ) return true;
+  return false;
+}
+
+bool isShared( double rDiff, int region1, int region2,
+               const LutMap& sharedInner, const LutMap& sharedOuter,
+               uint64_t seed ) {
+  if ( region1 != region2 ) return false;
+
+  const auto& resp       = region1 == 1 ? sharedInner : sharedOuter;
+  double      fracShared = resp.value( rDiff );
+  if ( uniformFromSeed( seed, SHARED_EFF_STREAM ) < fracShared ) return true;
+  return false;
+}
+
 double missingFraction( double rDiff, int region1, int region2,
                         TH1D* histoMissingInner, TH1D* histoMissingOuter ) {
   if ( region1 != region2 ) return 0;
@@ -118,6 +357,15 @@ double missingFraction( double rDiff, int region1, int region2,
   return missFrac;
 }
 
+double missingFraction( double rDiff, int region1, int region2,
+                        const LutMap& missingInner,
+                        const LutMap& missingOuter ) {
+  if ( region1 != region2 ) return 0;
+
+  const auto& resp = region1 == 1 ? missingInner : missingOuter;
+  return resp.value( rDiff ) / resp.binContent( TOT_FRAC_BIN );
+}
+
 // Reimplementation of 'calcET' and 'calcDplusET'
 double twoPartEt( double smearedET1, double smearedET2, bool isShared,
                   double missFrac ) {
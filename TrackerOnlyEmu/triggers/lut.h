@@ -0,0 +1,159 @@
+// Description: Memory-mapped lookup tables compiled from calibration histograms
+//
+// The .lut files are written by TrackerOnlyEmu.lut, which documents the layout.
+// The maps point into the mapped file, so they are only valid as long as their
+// LutFile is alive. Lookups are O(1) on uniform axes, and a binary search over
+// the edges otherwise.
+
+#ifndef _LUT_
+#define _LUT_
+
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
+#include <map>
+#include <stdexcept>
+#include <string>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+using std::map;
+using std::string;
+
+const char     LUT_MAGIC[8]  = { 'T', 'O', 'E', 'M', 'U', 'L', 'U', 'T' };
+const uint64_t LUT_VERSION   = 2;
+const size_t   LUT_NAME_SIZE = 48;
+// Magic, version, number of maps and hash of the ROOT file, see lut.py
+const size_t LUT_FILE_HEADER_SIZE = 40;
+
+// Must match MAP_HEADER in lut.py
+struct LutMapHeader {
+  char     name[LUT_NAME_SIZE];
+  uint64_t ndim;
+  uint64_t nbins[2];
+  double   low[2];
+  double   high[2];
+  uint64_t uniform[2];
+  uint64_t edgesOffset[2];
+  uint64_t contentOffset;
+};
+
+struct LutAxis {
+  int           nbins;
+  double        low;
+  double        high;
+  bool          uniform;
+  const double* edges;  // nbins + 1 of them
+
+  // Same as TAxis::FindFixBin: 0 for underflow, nbins + 1 for overflow and NaN
+  int findBin( double x ) const {
+    if ( x < low ) return 0;
+    if ( !( x < high ) ) return nbins + 1;
+    if ( uniform ) return 1 + int( nbins * ( x - low ) / ( high - low ) );
+    return std::upper_bound( edges, edges + nbins + 1, x ) - edges;
+  }
+
+  // Same as TAxis::GetBinLowEdge and TAxis::GetBinWidth
+  double binLowEdge( int bin ) const {
+    if ( !uniform && bin > 0 && bin <= nbins ) return edges[bin - 1];
+    double width = ( high - low ) / nbins;
+    return low + ( bin - 1 ) * width;
+  }
+
+  double binWidth( int bin ) const {
+    if ( uniform ) return ( high - low ) / nbins;
+    if ( bin < 1 ) bin = 1;
+    if ( bin > nbins ) bin = nbins;
+    return edges[bin] - edges[bin - 1];
+  }
+};
+
+struct LutMap {
+  int           ndim;
+  LutAxis       x;
+  LutAxis       y;        // 0 bins for 1D maps
+  const double* content;  // ROOT global bin order, with under/overflow
+
+  int nbinsX() const { return x.nbins; }
+  int nbinsY() const { return y.nbins; }
+
+  // Same as TH1::GetBinContent
+  double binContent( int binX, int binY = 0 ) const {
+    return content[binX + ( x.nbins + 2 ) * binY];
+  }
+
+  // Same as GetBinContent(FindFixBin(...))
+  double value( double vx ) const { return binContent( x.findBin( vx ) ); }
+  double value( double vx, double vy ) const {
+    return binContent( x.findBin( vx ), y.findBin( vy ) );
+  }
+};
+
+class LutFile {
+ public:
+  explicit LutFile( const string& filename ) {
+    int fd = open( filename.c_str(), O_RDONLY );
+    if ( fd < 0 ) throw std::runtime_error( "Can't open " + filename );
+
+    struct stat st;
+    fstat( fd, &st );
+    size_ = st.st_size;
+    data_ = static_cast<const char*>(
+        mmap( nullptr, size_, PROT_READ, MAP_SHARED, fd, 0 ) );
+    close( fd );
+    if ( data_ == MAP_FAILED )
+      throw std::runtime_error( "Can't map " + filename );
+
+    uint64_t version, nMaps;
+    std::memcpy( &version, data_ + 8, sizeof( version ) );
+    std::memcpy( &nMaps, data_ + 16, sizeof( nMaps ) );
+    if ( std::memcmp( data_, LUT_MAGIC, 8 ) || version != LUT_VERSION )
+      throw std::runtime_error( filename + " is not a lookup table file" );
+
+    for ( uint64_t i = 0; i < nMaps; i++ ) {
+      LutMapHeader header;
+      std::memcpy( &header,
+                   data_ + LUT_FILE_HEADER_SIZE + i * sizeof( header ),
+                   sizeof( header ) );
+
+      LutMap  lutMap{ static_cast<int>( header.ndim ), {}, {}, nullptr };
+      LutAxis axes[2]{};
+      for ( uint64_t a = 0; a < header.ndim; a++ )
+        axes[a] = LutAxis{ static_cast<int>( header.nbins[a] ), header.low[a],
+                           header.high[a], header.uniform[a] != 0,
+                           doubles( header.edgesOffset[a] ) };
+      lutMap.x       = axes[0];
+      lutMap.y       = axes[1];
+      lutMap.content = doubles( header.contentOffset );
+
+      maps_[string( header.name, strnlen( header.name, LUT_NAME_SIZE ) )] =
+          lutMap;
+    }
+  }
+
+  ~LutFile() { munmap( const_cast<char*>( data_ ), size_ ); }
+
+  LutFile( const LutFile& ) = delete;
+  LutFile& operator=( const LutFile& ) = delete;
+
+  const LutMap& get( const string& name ) const {
+    auto it = maps_.find( name );
+    if ( it == maps_.end() )
+      throw std::out_of_range( name + " not found in lookup table file" );
+    return it->second;
+  }
+
+ private:
+  const double* doubles( uint64_t offset ) const {
+    return reinterpret_cast<const double*>( data_ + offset );
+  }
+
+  const char*           data_;
+  size_t                size_;
+  map<string, LutMap>   maps_;
+};
+
+#endif
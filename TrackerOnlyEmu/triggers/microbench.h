@@ -0,0 +1,265 @@
+// Description: Micro-benchmarks of the per-event emulation kernels
+//
+// Each benchmark returns the average time of one call in ns.
+
+#ifndef _MICROBENCH_
+#define _MICROBENCH_
+
+#include <chrono>
+#include <cstdint>
+#include <vector>
+
+#include "hlt1/run2-Hlt1TwoTrackMVA.h"
+#include "l0/run2-L0GlobalTIS.h"
+#include "l0/run2-L0Hadron.h"
+#include "rng.h"
+
+using std::vector;
+
+///////////////////
+// Bench helpers //
+///////////////////
+
+// Written to after each benchmark, so that the compiler can't drop the loops
+volatile int64_t MICROBENCH_SINK = 0;
+
+template <typename F>
+double nsPerCall( F&& func, int64_t nCalls ) {
+  int64_t sink  = 0;
+  auto    start = std::chrono::steady_clock::now();
+  for ( int64_t i = 0; i < nCalls; i++ ) sink += func( i );
+  auto stop = std::chrono::steady_clock::now();
+
+  MICROBENCH_SINK = sink;
+  return std::chrono::duration<double, std::nano>( stop - start ).count() /
+         nCalls;
+}
+
+// The recursive implementation replaced by CombinationTable, for reference
+vector<vector<int> > legacyCombination( int totSize, int combSize,
+                                        int headIdx = 0 ) {
+  vector<vector<int> > result;
+
+  for ( int head = headIdx; head <= totSize - combSize; head++ ) {
+    if ( combSize > 1 ) {
+      for ( auto subComb :
+            legacyCombination( totSize, combSize - 1, head + 1 ) ) {
+        subComb.emplace( subComb.begin(), head );
+        result.emplace_back( subComb );
+      }
+    } else
+      result.emplace_back( vector<int>{ head } );
+  }
+
+  return result;
+}
+
+//////////////////
+// Combinations //
+//////////////////
+
+double benchLegacyCombination( int n, int k, int64_t nCalls ) {
+  return nsPerCall(
+      [=]( int64_t ) {
+        int64_t sum = 0;
+        for ( const auto& comb : legacyCombination( n, k ) )
+          for ( auto idx : comb ) sum += idx;
+        return sum;
+      },
+      nCalls );
+}
+
+double benchCombinationTable( int n, int k, int64_t nCalls ) {
+  return nsPerCall(
+      [=]( int64_t ) {
+        int64_t     sum   = 0;
+        const auto& table = combinationTable( n, k );
+        for ( size_t i = 0; i < table.size(); i++ )
+          for ( int j = 0; j < k; j++ ) sum += table[i][j];
+        return sum;
+      },
+      nCalls );
+}
+
+/////////////////////
+// Hlt1TwoTrackMVA //
+/////////////////////
+
+// Random, but mostly passing, inputs for event 'evt'
+inline double benchRnd( int64_t evt, uint64_t stream, double low,
+                        double high ) {
+  return low + ( high - low ) * uniformFromSeed( mixBits( evt ), stream );
+}
+
+TwoTrackSpec benchTrack( int64_t evt, uint64_t idx ) {
+  return TwoTrackSpec{ benchRnd( evt, 10 * idx, 500, 5000 ),
+                       benchRnd( evt, 10 * idx + 1, 4000, 80000 ),
+                       benchRnd( evt, 10 * idx + 2, 0, 3 ),
+                       benchRnd( evt, 10 * idx + 3, 0, 50 ),
+                       benchRnd( evt, 10 * idx + 4, 0, 0.3 ),
+                       benchRnd( evt, 10 * idx + 5, -3000, 3000 ),
+                       benchRnd( evt, 10 * idx + 6, -3000, 3000 ) };
+}
+
+TwoTrackCombSpec benchComb( int64_t evt, uint64_t idx, double sumPt ) {
+  return TwoTrackCombSpec{ benchRnd( evt, 100 + 10 * idx, 0, 1000 ),
+                           sumPt,
+                           benchRnd( evt, 100 + 10 * idx + 1, 0, 0.2 ),
+                           benchRnd( evt, 100 + 10 * idx + 2, 0, 10 ),
+                           benchRnd( evt, 100 + 10 * idx + 3, 2, 5 ),
+                           benchRnd( evt, 100 + 10 * idx + 4, 1000, 10000 ),
+                           1,
+                           benchRnd( evt, 100 + 10 * idx + 5, 0, 1 ) };
+}
+
+map<string, double> benchTrackMap( const TwoTrackSpec& t ) {
+  return { { "PT", t.PT },
+           { "P", t.P },
+           { "TRCHI2DOF", t.TRCHI2DOF },
+           { "BPVIPCHI2", t.BPVIPCHI2 },
+           { "TRGHOSTPROB", t.TRGHOSTPROB },
+           { "PX", t.PX },
+           { "PY", t.PY } };
+}
+
+map<string, double> benchCombMap( const TwoTrackCombSpec& c ) {
+  return { { "VDCHI2", c.VDCHI2 }, { "SUMPT", c.SUMPT },
+           { "DOCA", c.DOCA },     { "VCHI2", c.VCHI2 },
+           { "BPVETA", c.BPVETA }, { "BPVCORRM", c.BPVCORRM },
+           { "BPVDIRA", c.BPVDIRA }, { "MVA", c.MVA } };
+}
+
+// Both include building the inputs, as the Defines do per event
+double benchTwoTrackMVAMap( int64_t nCalls ) {
+  return nsPerCall(
+      [=]( int64_t evt ) {
+        auto t0 = benchTrack( evt, 0 ), t1 = benchTrack( evt, 1 );
+        vector<map<string, double> > tracks{ benchTrackMap( t0 ),
+                                             benchTrackMap( t1 ) };
+        vector<map<string, double> > combs{
+            benchCombMap( benchComb( evt, 0, t0.PT + t1.PT ) ),
+            benchCombMap( benchComb( evt, 1, 0 ) ),
+            benchCombMap( benchComb( evt, 2, 0 ) ) };
+        vector<bool> pass{ true, true };
+        return static_cast<int64_t>(
+            hlt1TwoTrackMVATriggerEmu( tracks, combs, pass, 2016 ) );
+      },
+      nCalls );
+}
+
+template <size_t NTrack = 2, size_t NComb = 3>
+double benchTwoTrackMVAStruct( int64_t nCalls ) {
+  return nsPerCall(
+      [=]( int64_t evt ) {
+        array<TwoTrackSpec, NTrack>    tracks;
+        array<TwoTrackCombSpec, NComb> combs;
+        array<bool, NTrack>            pass;
+
+        for ( size_t i = 0; i < NTrack; i++ ) {
+          tracks[i] = benchTrack( evt, i );
+          pass[i]   = true;
+        }
+        // Only the first combo matches a pair
+        for ( size_t c = 0; c < NComb; c++ )
+          combs[c] = benchComb( evt, c, c ? 0 : tracks[0].PT + tracks[1].PT );
+
+        return static_cast<int64_t>(
+            hlt1TwoTrackMVATriggerEmu( tracks, combs, pass, 2016 ) );
+      },
+      nCalls );
+}
+
+////////////////////////////
+// L0Hadron HCAL response //
+////////////////////////////
+
+// Stand-ins for the hdiff_i_j histograms, with roughly their shape
+vector<vector<TH1D*> > benchHcalRespHistos() {
+  vector<vector<TH1D*> > histos;
+
+  for ( auto i = 0; i < P_BIN; i++ ) {
+    vector<TH1D*> row;
+    for ( auto j = 0; j < PT_BIN; j++ ) {
+      TString name = "bench_hdiff_";
+      name += i;
+      name += "_";
+      name += j;
+      auto hist = new TH1D( name, name, 200, -1, 1 );
+      hist->SetDirectory( nullptr );
+      for ( auto bin = 1; bin <= 200; bin++ ) {
+        double x = ( bin - 100.5 ) / 100;
+        hist->SetBinContent( bin, 1 / ( 1 + 50 * x * x ) );
+      }
+      hist->ComputeIntegral( true );
+      row.push_back( hist );
+    }
+    histos.push_back( row );
+  }
+
+  return histos;
+}
+
+// Both return the smeared ET in MeV, truncated
+double benchHcalRespHisto( int64_t nCalls ) {
+  auto histos = benchHcalRespHistos();
+  return nsPerCall(
+      [&]( int64_t evt ) {
+        return static_cast<int64_t>( singlePartEt(
+            benchRnd( evt, 0, 0, 1e5 ), benchRnd( evt, 1, 0, 15000 ), 3000,
+            histos, mixBits( evt ) ) );
+      },
+      nCalls );
+}
+
+double benchHcalRespCdf( int64_t nCalls ) {
+  auto cdf = buildHcalRespCdf( benchHcalRespHistos() );
+  return nsPerCall(
+      [&]( int64_t evt ) {
+        return static_cast<int64_t>( singlePartEt(
+            benchRnd( evt, 0, 0, 1e5 ), benchRnd( evt, 1, 0, 15000 ), 3000,
+            cdf, mixBits( evt ) ) );
+      },
+      nCalls );
+}
+
+//////////////////
+// L0Global TIS //
+//////////////////
+
+// Stand-in for the Jpsi_data_eff maps: 6 log(PZ) x 4 log(PT) bins
+LutMap benchL0TisResp() {
+  static const double edgesX[] = { 10.5, 11, 11.5, 12, 12.5, 13, 13.5 };
+  static const double edgesY[] = { 7, 8, 8.6, 9.1, 10.5 };
+  static vector<double> content( 8 * 6 );
+  for ( size_t i = 0; i < content.size(); i++ ) content[i] = 0.01 * i;
+
+  return LutMap{ 2, LutAxis{ 6, 10.5, 13.5, true, edgesX },
+                 LutAxis{ 4, 7, 10.5, false, edgesY }, content.data() };
+}
+
+// Both return the weight in 1e-6
+double benchL0GlobalTisMap( int64_t nCalls ) {
+  map<int, LutMap> resp{ { 2016, benchL0TisResp() } };
+  return nsPerCall(
+      [&]( int64_t evt ) {
+        return static_cast<int64_t>(
+            1e6 * l0GlobalTisTriggerEmu( benchRnd( evt, 0, 3e4, 7e5 ),
+                                         benchRnd( evt, 1, 1e3, 3e4 ), 2016,
+                                         resp, true ) );
+      },
+      nCalls );
+}
+
+double benchL0GlobalTisTable( int64_t nCalls ) {
+  auto table = buildL0GlobalTisTable( benchL0TisResp(), 2016 );
+  return nsPerCall(
+      [&]( int64_t evt ) {
+        return static_cast<int64_t>(
+            1e6 * l0GlobalTisWeight( benchRnd( evt, 0, 3e4, 7e5 ),
+                                     benchRnd( evt, 1, 1e3, 3e4 ), table,
+                                     true ) );
+      },
+      nCalls );
+}
+
+#endif
@@ -0,0 +1,44 @@
+// Description: Stateless random numbers for thread-safe emulation
+//
+// Each random number is a pure function of (run, event, candidate key, stream),
+// so the result does not depend on which RDataFrame slot evaluates it, nor on
+// the order in which candidates are processed. This is what makes the output
+// identical regardless of the number of threads.
+
+#ifndef _RNG_
+#define _RNG_
+
+#include <cstdint>
+#include <cstring>
+
+// splitmix64 finalizer, a bijective mixing of all 64 bits
+inline uint64_t mixBits( uint64_t x ) {
+  x += 0x9e3779b97f4a7c15ULL;
+  x = ( x ^ ( x >> 30 ) ) * 0xbf58476d1ce4e5b9ULL;
+  x = ( x ^ ( x >> 27 ) ) * 0x94d049bb133111ebULL;
+  return x ^ ( x >> 31 );
+}
+
+inline uint64_t doubleBits( double x ) {
+  uint64_t bits;
+  std::memcpy( &bits, &x, sizeof( bits ) );
+  return bits;
+}
+
+// The candidate key should distinguish candidates within the same event, e.g.
+// the PT of a track. The same track in the same event gets the same seed.
+inline uint64_t candSeed( uint64_t runNumber, uint64_t eventNumber,
+                          double key ) {
+  auto seed = mixBits( runNumber );
+  seed      = mixBits( seed ^ eventNumber );
+  return mixBits( seed ^ doubleBits( key ) );
+}
+
+// Uniform in [0, 1). Different kernels use different streams so that they
+// don't draw correlated numbers from the same seed.
+inline double uniformFromSeed( uint64_t seed, uint64_t stream ) {
+  return ( mixBits( seed ^ mixBits( stream ) ) >> 11 ) *
+         ( 1.0 / 9007199254740992.0 );  // 2^-53
+}
+
+#endif
@@ -0,0 +1,22 @@
+// Description: Acceptance of candidates by an emulated efficiency, for skims
+
+#ifndef _SKIM_
+#define _SKIM_
+
+#include <cstdint>
+
+#include "rng.h"
+
+// Stream for the acceptance, see rng.h
+const uint64_t SKIM_ACCEPT_STREAM = 90;
+
+// Keep a candidate with probability 'prob'. As the random number is a pure
+// function of the candidate, the same candidates are kept in every job and
+// with any number of threads.
+inline bool acceptByWeight( double prob, uint64_t runNumber,
+                            uint64_t eventNumber, double key ) {
+  return uniformFromSeed( candSeed( runNumber, eventNumber, key ),
+                          SKIM_ACCEPT_STREAM ) < prob;
+}
+
+#endif
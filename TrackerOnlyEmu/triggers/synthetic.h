@@ -0,0 +1,42 @@
+// Description: Random distributions for synthetic ntuples
+//
+// Built on the stateless RNG, so a given (entry, seed, stream) always gives
+// the same value, with or without multithreading.
+
+#ifndef _SYNTHETIC_
+#define _SYNTHETIC_
+
+#include <cmath>
+#include <cstdint>
+
+#include "rng.h"
+
+inline double synthUniform( uint64_t entry, uint64_t seed, uint64_t stream,
+                            double low, double high ) {
+  auto u = uniformFromSeed( mixBits( entry ) ^ mixBits( ~seed ), stream );
+  return low + ( high - low ) * u;
+}
+
+inline double synthExp( uint64_t entry, uint64_t seed, uint64_t stream,
+                        double mean ) {
+  return -mean * std::log1p( -synthUniform( entry, seed, stream, 0, 1 ) );
+}
+
+// Box-Muller. The second uniform comes from a stream that no other
+// distribution uses.
+const uint64_t GAUS_STREAM_FLAG = 1ULL << 63;
+
+inline double synthGaus( uint64_t entry, uint64_t seed, uint64_t stream,
+                         double mu, double sigma ) {
+  auto u1 = 1 - synthUniform( entry, seed, stream, 0, 1 );  // in (0, 1]
+  auto u2 = synthUniform( entry, seed, stream | GAUS_STREAM_FLAG, 0, 1 );
+  return mu + sigma * std::sqrt( -2 * std::log( u1 ) ) *
+                  std::cos( 2 * M_PI * u2 );
+}
+
+inline bool synthBool( uint64_t entry, uint64_t seed, uint64_t stream,
+                       double prob ) {
+  return synthUniform( entry, seed, stream, 0, 1 ) < prob;
+}
+
+#endif
@@ -0,0 +1,199 @@
+// Description: Evaluate flattened tree ensembles inside the event loop
+//
+// The .trees files are written by TrackerOnlyEmu.tree_ensemble, which documents
+// the layout. They are read with a memory map, shared by the copies of the
+// TreeEnsemble. predictTreeEnsemble agrees with XGBClassifier.predict_proba
+// and AdaBoostRegressor.predict to float precision, and is thread-safe.
+
+#ifndef _TREE_ENSEMBLE_
+#define _TREE_ENSEMBLE_
+
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+#include <memory>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+using std::pair;
+using std::string;
+using std::vector;
+
+const char     TREES_MAGIC[8] = { 'T', 'O', 'E', 'M', 'U', 'T', 'R', 'S' };
+const uint64_t TREES_VERSION  = 2;
+
+// Must match tree_ensemble.py
+const uint64_t TREES_XGB_LOGISTIC    = 1;
+const uint64_t TREES_ADABOOST_MEDIAN = 2;
+
+struct TreeEnsembleHeader {
+  char     magic[8];
+  uint64_t version;
+  uint64_t kind;
+  uint64_t nFeatures;
+  uint64_t nTrees;
+  uint64_t nNodes;
+  double   baseMargin;
+  char     source[16];  // Hash of the pickle it was flattened from
+};
+
+struct TreeEnsemble {
+  uint64_t kind;
+  uint64_t nFeatures;
+  uint64_t nTrees;
+  double   baseMargin;
+
+  const int64_t* treeOffset;
+  const double*  treeWeight;
+  const double*  threshold;
+  const double*  value;
+  const int32_t* feature;
+  const int32_t* left;
+  const int32_t* right;
+  const int32_t* missing;
+
+  // The mapped file the arrays above point into, shared between copies
+  std::shared_ptr<const char> storage;
+};
+
+inline size_t treesAlign8( size_t nBytes ) { return ( nBytes + 7 ) / 8 * 8; }
+
+// Point 'ens' to the arrays in 'data', which must outlive it
+void parseTreeEnsemble( TreeEnsemble& ens, const char* data, size_t size,
+                        const string& name ) {
+  TreeEnsembleHeader header;
+  if ( size < sizeof( header ) )
+    throw std::runtime_error( name + " is not a tree ensemble file" );
+  std::memcpy( &header, data, sizeof( header ) );
+  if ( std::memcmp( header.magic, TREES_MAGIC, 8 ) ||
+       header.version != TREES_VERSION )
+    throw std::runtime_error( name + " is not a tree ensemble file" );
+
+  ens.kind       = header.kind;
+  ens.nFeatures  = header.nFeatures;
+  ens.nTrees     = header.nTrees;
+  ens.baseMargin = header.baseMargin;
+
+  auto ptr  = data + sizeof( header );
+  auto take = [&ptr]( size_t nBytes ) {
+    auto start = ptr;
+    ptr += treesAlign8( nBytes );
+    return start;
+  };
+  ens.treeOffset = reinterpret_cast<const int64_t*>(
+      take( ( header.nTrees + 1 ) * sizeof( int64_t ) ) );
+  ens.treeWeight = reinterpret_cast<const double*>(
+      take( header.nTrees * sizeof( double ) ) );
+  ens.threshold = reinterpret_cast<const double*>(
+      take( header.nNodes * sizeof( double ) ) );
+  ens.value = reinterpret_cast<const double*>(
+      take( header.nNodes * sizeof( double ) ) );
+  ens.feature = reinterpret_cast<const int32_t*>(
+      take( header.nNodes * sizeof( int32_t ) ) );
+  ens.left = reinterpret_cast<const int32_t*>(
+      take( header.nNodes * sizeof( int32_t ) ) );
+  ens.right = reinterpret_cast<const int32_t*>(
+      take( header.nNodes * sizeof( int32_t ) ) );
+  ens.missing = reinterpret_cast<const int32_t*>(
+      take( header.nNodes * sizeof( int32_t ) ) );
+
+  if ( ptr > data + size )
+    throw std::runtime_error( name + " is truncated" );
+}
+
+TreeEnsemble readTreeEnsemble( const string& filename ) {
+  int fd = open( filename.c_str(), O_RDONLY );
+  if ( fd < 0 ) throw std::runtime_error( "Can't open " + filename );
+
+  struct stat st;
+  fstat( fd, &st );
+  size_t size = st.st_size;
+  auto   data = mmap( nullptr, size, PROT_READ, MAP_SHARED, fd, 0 );
+  close( fd );
+  if ( data == MAP_FAILED ) throw std::runtime_error( "Can't map " + filename );
+
+  TreeEnsemble ens;
+  ens.storage = std::shared_ptr<const char>(
+      static_cast<const char*>( data ),
+      [size]( const char* ptr ) { munmap( const_cast<char*>( ptr ), size ); } );
+  parseTreeEnsemble( ens, ens.storage.get(), size, filename );
+  return ens;
+}
+
+////////////////
+// Evaluation //
+////////////////
+
+// Leaf value of tree 't' for the features 'x', already rounded to float
+template <bool Strict>
+double treeLeafValue( const TreeEnsemble& ens, uint64_t t, const float* x ) {
+  auto    base = ens.treeOffset[t];
+  int64_t node = 0;
+
+  while ( ens.feature[base + node] >= 0 ) {
+    auto idx = base + node;
+    auto val = x[ens.feature[idx]];
+    if ( std::isnan( val ) )
+      node = ens.missing[idx];
+    else if ( Strict ? val < ens.threshold[idx] : val <= ens.threshold[idx] )
+      node = ens.left[idx];
+    else
+      node = ens.right[idx];
+  }
+
+  return ens.value[base + node];
+}
+
+double evalTreeEnsemble( const TreeEnsemble& ens, const double* features ) {
+  // Both XGBoost and sklearn round the inputs to float
+  thread_local vector<float> x;
+  x.assign( features, features + ens.nFeatures );
+
+  if ( ens.kind == TREES_XGB_LOGISTIC ) {
+    float margin = ens.baseMargin;
+    for ( uint64_t t = 0; t < ens.nTrees; t++ )
+      margin += static_cast<float>( treeLeafValue<true>( ens, t, x.data() ) );
+    return 1.0f / ( 1.0f + std::exp( -margin ) );
+  }
+
+  // Weighted median, as AdaBoostRegressor._get_median_predict
+  thread_local vector<pair<double, double> > preds;
+  preds.clear();
+  for ( uint64_t t = 0; t < ens.nTrees; t++ )
+    preds.emplace_back( treeLeafValue<false>( ens, t, x.data() ),
+                        ens.treeWeight[t] );
+  std::sort( preds.begin(), preds.end(),
+             []( const pair<double, double>& a, const pair<double, double>& b ) {
+               return a.first < b.first;
+             } );
+
+  double total = 0;
+  for ( const auto& p : preds ) total += p.second;
+
+  double cdf = 0;
+  for ( const auto& p : preds ) {
+    cdf += p.second;
+    if ( cdf >= 0.5 * total ) return p.first;
+  }
+  return preds.back().first;
+}
+
+// The features in training order, e.g. in a Define:
+//   predictTreeEnsemble(model, nTracks, d0_P, d0_PT, ...)
+template <typename... Features>
+double predictTreeEnsemble( const TreeEnsemble& ens, Features... features ) {
+  const double x[] = { static_cast<double>( features )... };
+  if ( sizeof...( features ) != ens.nFeatures )
+    throw std::invalid_argument( "Wrong number of tree ensemble features" );
+  return evalTreeEnsemble( ens, x );
+}
+
+#endif
@@ -2,12 +2,14 @@
 #
 # Author: Yipeng Sun
 # License: BSD 2-clause
-# Last Change: Fri Oct 29, 2021 at 01:37 AM +0200
+# Last Change: Sun Oct 18, 2026 at 08:20 PM +0000
 
 import builtins
 import numpy as np
 
 from contextlib import contextmanager
+from glob import glob
+from os import makedirs, path
 from time import perf_counter
 
 
@@ -26,6 +28,58 @@ def print_wrapper(msg, silent=False):
         builtins.print(msg)
 
 
+def single_io_pairs(ntp, output):
+    # The same checks as batch_io_pairs, for a single input
+    if path.realpath(output) == path.realpath(ntp):
+        raise ValueError('The output of {} would overwrite the input {}'.format(
+            ntp, output))
+    return [(ntp, output)]
+
+
+def batch_io_pairs(spec, output_dir):
+    # 'spec' is either a manifest with one 'input [output]' per line, or a glob
+    # pattern. Outputs not given explicitly go to 'output_dir'.
+    def default_output(ntp):
+        return path.join(output_dir, path.basename(ntp))
+
+    if path.isfile(spec) and not spec.endswith('.root'):
+        pairs = []
+        with open(spec, 'r') as f:
+            for line in f:
+                fields = line.split('#')[0].split()
+                if not fields:
+                    continue
+                pairs.append((fields[0], fields[1] if len(fields) > 1
+                              else default_output(fields[0])))
+    else:
+        pairs = [(ntp, default_output(ntp)) for ntp in sorted(glob(spec))]
+
+    if not pairs:
+        raise ValueError('No input ntuple found in {}'.format(spec))
+
+    # Outputs are RECREATEd, so they must not overwrite each other, nor any
+    # input
+    inputs = {path.realpath(ntp) for ntp, _ in pairs}
+    outputs = dict()
+    for ntp, output in pairs:
+        real = path.realpath(output)
+        if real in inputs:
+            raise ValueError(
+                'The output of {} would overwrite the input {}'.format(
+                    ntp, output))
+        if real in outputs:
+            raise ValueError('{} and {} have the same output {}'.format(
+                outputs[real], ntp, output))
+        outputs[real] = ntp
+
+    for _, output in pairs:
+        output_parent = path.dirname(output)
+        if output_parent:
+            makedirs(output_parent, exist_ok=True)
+
+    return pairs
+
+
 #############
 # Run 2 RDX #
 #############
@@ -42,7 +96,8 @@ def get_df_vars(frame, branches, transpose=True):
 
 
 def gen_output_dict(arr, names):
-    return dict(zip(names, arr.T))
+    # Contiguous columns, as MakeNumpyDataFrame and write_columns need
+    return {n: np.ascontiguousarray(col) for n, col in zip(names, arr.T)}
 
 
 def slice_array(arr, right_idx):
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# Last Change: Sun Oct 18, 2026 at 12:50 PM +0000
+#
+# NOTE: This script doesn't import ROOT: every stage runs in its own process, so
+#       that its wall time and peak memory are measured in isolation.
+
+import json
+import os
+import subprocess
+import sys
+
+from argparse import ArgumentParser
+from os import path
+from time import perf_counter
+
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+
+# stage -> (script, extra arguments)
+STAGES = {
+    'hlt1': ('run2-rdx-hlt1.py', []),
+    'l0_global_tis': ('run2-rdx-l0_global_tis.py', []),
+    'l0_hadron_bdt': ('run2-rdx-l0_hadron_tos.py',
+                      ['-m', 'bdt', '--load', '<triggers/l0/bdt4-2016.pickle>']),
+    'l0_hadron_xgb': ('run2-rdx-l0_hadron_tos.py',
+                      ['-m', 'xgb', '--load', '<triggers/l0/xgb4-2016.pickle>']),
+    'trg_emu': ('run2-rdx-trg_emu.py', []),
+}
+
+
+#################################
+# Command line arguments parser #
+#################################
+
+def parse_input():
+    parser = ArgumentParser(description='''
+benchmark the RDX run 2 emulation stages on synthetic ntuples of increasing
+sizes, recording throughput and peak memory.''')
+
+    parser.add_argument('-o', '--output-dir', default='./gen/benchmark', help='''
+specify the directory for the synthetic inputs and the emulation outputs.
+''')
+
+    parser.add_argument('-r', '--report', default=None, help='''
+specify the JSON report (default: <output-dir>/benchmark.json).
+''')
+
+    parser.add_argument('-n', '--sizes', nargs='+', type=float,
+                        default=[1e4, 1e5, 1e6, 1e7], help='''
+specify the number of entries to benchmark on.
+''')
+
+    parser.add_argument('-s', '--stages', nargs='+', choices=list(STAGES),
+                        default=list(STAGES), help='''
+specify the stages to benchmark.
+''')
+
+    parser.add_argument('--repeat', default=1, type=int, help='''
+specify how many times each stage is run; the fastest run is reported.
+''')
+
+    parser.add_argument('-j', '--threads', default=None, type=int, help='''
+pass --threads to the stages.
+''')
+
+    return parser.parse_args()
+
+
+###########
+# Helpers #
+###########
+
+def run_script(script, script_args):
+    # Wall time and peak RSS of a child process
+    cmd = [sys.executable, path.join(SCRIPT_DIR, script)] + script_args
+
+    start = perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = perf_counter() - start
+
+    if os.WIFEXITED(status):
+        code = os.WEXITSTATUS(status)
+    else:
+        code = -os.WTERMSIG(status)
+
+    # ru_maxrss is in KiB on Linux
+    return code, wall, usage.ru_maxrss / 1024
+
+
+def synthetic_input(output_dir, entries):
+    ntp = path.join(output_dir, 'synthetic_{:.0e}.root'.format(entries))
+    if not path.isfile(ntp):
+        print('Generating {}...'.format(ntp))
+        code, _, _ = run_script(
+            'run2-rdx-gen_synthetic.py', [ntp, '-n', str(int(entries))])
+        if code:
+            raise RuntimeError('Failed to generate {}'.format(ntp))
+    return ntp
+
+
+#############
+# Benchmark #
+#############
+
+if __name__ == '__main__':
+    args = parse_input()
+    os.makedirs(args.output_dir, exist_ok=True)
+    report = args.report or path.join(args.output_dir, 'benchmark.json')
+
+    results = []
+    for entries in args.sizes:
+        ntp = synthetic_input(args.output_dir, entries)
+
+        for stage in args.stages:
+            script, extra = STAGES[stage]
+            output = path.join(args.output_dir, '{}_{:.0e}.root'.format(
+                stage, entries))
+            script_args = [ntp, output] + extra
+            if args.threads is not None:
+                script_args += ['--threads', str(args.threads)]
+
+            runs = [run_script(script, script_args)
+                    for _ in range(args.repeat)]
+            code, wall, rss = min(runs, key=lambda r: r[1])
+
+            results.append({
+                'stage': stage,
+                'entries': int(entries),
+                'threads': args.threads,
+                'returncode': code,
+                'wall_sec': wall,
+                'events_per_sec': entries / wall,
+                'max_rss_mb': rss,
+            })
+            print('{:<15} {:>10,} entries: {:8.2f} sec, {:>12,.0f} events/sec, {:8.1f} MB{}'.format(
+                stage, int(entries), wall, entries / wall, rss,
+                '' if code == 0 else '  (FAILED: {})'.format(code)))
+
+    with open(report, 'w') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# Last Change: Sun Oct 18, 2026 at 05:10 PM +0000
+
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True  # Don't hijack argparse!
+ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
+
+from argparse import ArgumentParser
+from os import path
+from ROOT import TFile
+
+from TrackerOnlyEmu.cache import file_hash
+from TrackerOnlyEmu.loader import load_file
+from TrackerOnlyEmu.lut import compile_lut
+
+
+CALIBRATION_FILES = [
+    '<triggers/l0/l0_tis_efficiency.root>',
+    '<triggers/l0/hcal_et_response.root>',
+    '<triggers/l0/hcal_two_part_clusters.root>',
+]
+
+
+#################################
+# Command line arguments parser #
+#################################
+
+def parse_input():
+    parser = ArgumentParser(description='''
+compile the histograms of calibration ROOT files into lookup tables (.lut),
+which the emulation then reads instead of the ROOT files.''')
+
+    parser.add_argument('input', nargs='*', default=CALIBRATION_FILES,
+                        help='''
+specify the ROOT files to compile. By default, all calibration files of the L0
+emulation.
+''')
+
+    parser.add_argument('-o', '--output-dir', default=None, help='''
+specify the output directory. By default, each .lut is written next to its
+ROOT file, where the emulation picks it up.
+''')
+
+    return parser.parse_args()
+
+
+###########
+# Compile #
+###########
+
+if __name__ == '__main__':
+    args = parse_input()
+
+    for filepath in args.input:
+        filepath = load_file(filepath)
+        output_dir = args.output_dir or path.dirname(path.abspath(filepath))
+        output = path.join(
+            output_dir, path.splitext(path.basename(filepath))[0] + '.lut')
+
+        ntp = TFile(filepath)
+        maps = compile_lut(ntp, output, source=file_hash(filepath))
+        ntp.Close()
+        print('{} -> {}: {} maps'.format(filepath, output, len(maps)))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# Last Change: Sun Oct 18, 2026 at 07:10 PM +0000
+
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True  # Don't hijack argparse!
+ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
+
+from argparse import ArgumentParser
+
+from TrackerOnlyEmu.daemon import serve
+from TrackerOnlyEmu.loader import load_cpp
+from TrackerOnlyEmu.utils import Timer
+from TrackerOnlyEmu.emulation.run2_rdx import (
+    run2_rdx_l0_global_tis_directive_gen,
+    run2_rdx_hlt1_directive_gen,
+    run2_rdx_l0_hadron_tos_directive_gen,
+)
+
+
+#################################
+# Command line arguments parser #
+#################################
+
+def parse_input():
+    parser = ArgumentParser(description='''
+keep ROOT, the trigger emulation code and the L0Hadron TOS regressors warm, and
+run the emulation scripts given '--daemon SOCKET' in forked children.''')
+
+    parser.add_argument('socket', help='''
+specify the path of the Unix socket to listen on.''')
+
+    parser.add_argument('-y', '--years', nargs='+', default=['2016', '2017', '2018'],
+                        help='''
+specify the years of the regressors to preload.''')
+
+    parser.add_argument('-l', '--load', nargs='+',
+                        default=['<triggers/l0/xgb4-{year}.pickle>'], help='''
+specify the regressors to preload. '{year}' is replaced by each of the years.''')
+
+    return parser.parse_args()
+
+
+###########
+# Preload #
+###########
+
+def preload(args):
+    with Timer() as t:
+        # Training and unpickling the regressors import these, if installed.
+        # Flattened regressors (.trees) don't need them.
+        try:
+            import sklearn.ensemble  # noqa: F401
+            import xgboost  # noqa: F401
+        except ImportError:
+            pass
+
+        # The directive generators load the headers and the response histograms
+        run2_rdx_l0_global_tis_directive_gen('b0', '2016')
+        run2_rdx_hlt1_directive_gen('b0', '2016', thread_safe=True)
+        load_cpp('<triggers/l0/run2-L0Hadron.h>')
+
+        # This also flattens the regressors and reads them into the
+        # interpreter, once for all jobs
+        for model in args.load:
+            for year in args.years:
+                run2_rdx_l0_hadron_tos_directive_gen(model.format(year=year))
+
+    print(f'Preloaded in {t():,.2f} sec')
+
+
+if __name__ == '__main__':
+    args = parse_input()
+    serve(args.socket, lambda: preload(args))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# Last Change: Sun Oct 18, 2026 at 07:10 PM +0000
+
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True  # Don't hijack argparse!
+ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
+
+from argparse import ArgumentParser
+from os import path
+
+from TrackerOnlyEmu.cache import file_hash
+from TrackerOnlyEmu.loader import load_file, load_pickle
+from TrackerOnlyEmu.tree_ensemble import flatten_model, write_trees
+
+
+MODEL_FILES = [
+    '<triggers/l0/xgb4-2016.pickle>',
+    '<triggers/l0/xgb4-2017.pickle>',
+    '<triggers/l0/xgb4-2018.pickle>',
+    '<triggers/l0/bdt4-2016.pickle>',
+]
+
+
+#################################
+# Command line arguments parser #
+#################################
+
+def parse_input():
+    parser = ArgumentParser(description='''
+flatten pickled L0Hadron TOS regressors into tree ensembles (.trees), which the
+emulation then reads instead of the pickles, without scikit-learn/xgboost.''')
+
+    parser.add_argument('input', nargs='*', default=MODEL_FILES, help='''
+specify the pickled regressors to flatten. By default, all shipped ones.
+''')
+
+    parser.add_argument('-o', '--output-dir', default=None, help='''
+specify the output directory. By default, each .trees is written next to its
+pickle, where the emulation picks it up.
+''')
+
+    return parser.parse_args()
+
+
+###########
+# Flatten #
+###########
+
+if __name__ == '__main__':
+    args = parse_input()
+
+    for filepath in args.input:
+        filepath = load_file(filepath)
+        output_dir = args.output_dir or path.dirname(path.abspath(filepath))
+        output = path.join(
+            output_dir, path.splitext(path.basename(filepath))[0] + '.trees')
+
+        ens = flatten_model(load_pickle(filepath))
+        write_trees(output, ens, file_hash(filepath))
+        print('{} -> {}: {} trees, {} nodes'.format(
+            filepath, output, ens.n_trees, ens.n_nodes))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# Last Change: Sun Oct 18, 2026 at 12:50 PM +0000
+
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True  # Don't hijack argparse!
+ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
+
+from argparse import ArgumentParser
+from ROOT import RDataFrame
+
+from TrackerOnlyEmu.executor import process_directives
+from TrackerOnlyEmu.emulation.run2_rdx_synthetic import \
+    run2_rdx_synthetic_directive_gen
+
+
+#################################
+# Command line arguments parser #
+#################################
+
+def parse_input():
+    parser = ArgumentParser(description='''
+generate a synthetic ntuple with all branches needed by the RDX run 2 trigger
+emulation scripts.''')
+
+    parser.add_argument('output', help='''
+specify output ntuple file.
+''')
+
+    parser.add_argument('-n', '--entries', default=10000, type=float, help='''
+specify the number of entries (e.g. 1e6).
+''')
+
+    parser.add_argument('-t', '--tree', default='TupleB0/DecayTree', help='''
+specify tree name.
+''')
+
+    parser.add_argument('-B', '--Bmeson', default='b0', help='''
+specify the name of the B meson in the tree.''')
+
+    parser.add_argument('-s', '--seed', default=0, type=int, help='''
+specify the random seed.
+''')
+
+    parser.add_argument('-j', '--threads', default=None, type=int, help='''
+enable implicit multithreading with the given number of threads (0 for all
+cores). The values do not depend on the number of threads, but the entry
+order does.
+''')
+
+    return parser.parse_args()
+
+
+############
+# Generate #
+############
+
+if __name__ == '__main__':
+    args = parse_input()
+    if args.threads is not None:
+        ROOT.EnableImplicitMT(args.threads)
+
+    directives = run2_rdx_synthetic_directive_gen(args.Bmeson, args.seed)
+
+    init_frame = RDataFrame(int(args.entries))
+    dfs, output_br_names = process_directives(directives, init_frame)
+    dfs[-1].Snapshot(args.tree, args.output, output_br_names)
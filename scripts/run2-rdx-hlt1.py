@@ -3,6 +3,11 @@
 # Author: Yipeng Sun
 # Last Change: Sun Oct 31, 2021 at 03:40 AM +0100
 
+from TrackerOnlyEmu.daemon import forward_to_daemon
+forward_to_daemon(__file__)  # Before any of the slow imports below
+
+import sys
+
 import ROOT
 ROOT.PyConfig.IgnoreCommandLineOptions = True  # Don't hijack argparse!
 ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
@@ -12,8 +17,17 @@ from itertools import combinations
 from ROOT import RDataFrame
 
 from TrackerOnlyEmu.executor import ExecDirective as EXEC
-from TrackerOnlyEmu.executor import process_directives
+from TrackerOnlyEmu.executor import process_directives, run_graphs
+from TrackerOnlyEmu.executor import skim_directives
+from TrackerOnlyEmu.utils import batch_io_pairs, single_io_pairs
+from TrackerOnlyEmu.profiler import profile_directives, dump_profile, print_profile
+from TrackerOnlyEmu.distributed import dask_client, dist_rdataframe
+from TrackerOnlyEmu.distributed import dist_snapshot
+from TrackerOnlyEmu.output import compression_settings, snapshot_options
+from TrackerOnlyEmu.output import check_friend, book_friend, book_tree
+from TrackerOnlyEmu.tck import load_run_tck_map, tck_weights
 from TrackerOnlyEmu.emulation.run2_rdx import run2_rdx_hlt1_directive_gen
+from TrackerOnlyEmu.emulation.run2_rdx import tck_run_map_declare
 
 
 #################################
@@ -42,11 +56,129 @@ specify year.''')
     parser.add_argument('-B', '--Bmeson', default='b0', help='''
 specify the name of the B meson in the tree.''')
 
+    parser.add_argument('-d', '--daughters', nargs='+', default=['k', 'pi'],
+                        help='''
+specify the tracks to emulate the triggers for (at most 6).
+''')
+
+    parser.add_argument('--comb-tracks', default=3, type=int, help='''
+specify the number of tracks in the <Bmeson>_*_COMB_i_j branches (at most 6).
+''')
+
+    parser.add_argument('--parent', default='d0', help='''
+specify the prefix of the combined (OR of the daughters) TOS branches.
+''')
+
+    tck = parser.add_mutually_exclusive_group()
+
+    tck.add_argument('--tck', default=None, type=lambda x: int(x, 0), help='''
+use the HLT1 thresholds of this TCK (e.g. 0x11361609, see tck_info) instead of
+the ones hard-coded for the year.
+''')
+
+    tck.add_argument('--tck-branch', default=None, help='''
+use the HLT1 thresholds of the TCK in this branch (e.g. HLT1TCK) for each
+event. TCKs without dump use the most used TCK of the year.
+''')
+
+    tck.add_argument('--tck-run-map', default=None, help='''
+same as above, with the TCK looked up from runNumber in a text file with one
+'run tck' or 'first_run last_run tck' per line.
+''')
+
+    parser.add_argument('--tck-weighted', action='store_true', help='''
+also emulate the parent TOS with each dumped TCK of the year, and average them
+weighted by the TCK occupancies in our data (<parent>_*_tos_emu_wgt).
+''')
+
     parser.add_argument('--debug', action='store_true', help='''
 enable debug mode.
 ''')
 
-    return parser.parse_args()
+    parser.add_argument('-j', '--threads', default=None, type=int, help='''
+enable implicit multithreading with the given number of threads (0 for all
+cores). Random numbers are then drawn from per-candidate seeds, and the output
+is written in input order, so it is identical for any number of threads. It
+differs from the output without --threads, which uses the original random
+sequence.
+''')
+
+    parser.add_argument('--batch', action='store_true', help='''
+treat input as a manifest file (one 'input [output]' per line) or a glob
+pattern, and output as the output directory. All ntuples share the same
+emulation code and are processed in one go. Random numbers are then drawn from
+per-candidate seeds, as with --threads, so that each output doesn't depend on
+the other inputs.
+''')
+
+    parser.add_argument('--dask-workers', default=None, type=int, help='''
+run on a local Dask cluster with the given number of workers, with ROOT's
+distributed RDataFrame. The per-partition outputs are merged into output in
+input entry order.
+''')
+
+    parser.add_argument('--npartitions', default=None, type=int, help='''
+specify the number of partitions in distributed mode (default: 2 per worker).
+''')
+
+    parser.add_argument('--skim', default=None, metavar='EXPR', help='''
+only write the candidates passing EXPR, a C++ requirement over the emulated and
+input branches, e.g. 'd0_hlt1_trackmva_tos_emu || d0_hlt1_twotrackmva_tos_emu'.
+It is applied as a Filter right after the branches it reads, so the other
+branches are only evaluated for the candidates that pass. Note that without
+--threads, the random numbers drawn then differ from those of a full output.
+''')
+
+    parser.add_argument('--friend', action='store_true', help='''
+write only the emulated branches, without the run and event numbers, as a
+friend tree of the input: one entry per input entry, in input order, also with
+--threads. The run and event numbers of the entries are checked against the
+input. With --dask-workers, they are written as well, to check the merged
+partitions.
+''')
+
+    parser.add_argument('--compression', default=None,
+                        choices=['zlib', 'lzma', 'lz4', 'zstd'], help='''
+specify the compression algorithm of the output (default: ROOT's). lz4 is the
+fastest to read, zstd and lzma give smaller files.
+''')
+
+    parser.add_argument('--compression-level', default=None, type=int,
+                        choices=range(10), metavar='{0-9}', help='''
+specify the compression level (default: ROOT's for the algorithm, 0 for none).
+''')
+
+    parser.add_argument('--basket-size', default=None, type=int,
+                        metavar='BYTES', help='''
+specify the initial basket size of the output branches (default: ROOT's).
+''')
+
+    parser.add_argument('--auto-flush', default=None, type=int, help='''
+flush the output baskets every N entries, or every -N bytes if negative
+(default: ROOT's). This is the cluster size of the output.
+''')
+
+    parser.add_argument('--profile', default=None, metavar='JSON', help='''
+instead of running the emulation, profile each directive on the (first) input
+and write the timings to JSON.
+''')
+
+    parser.add_argument('--profile-entries', default=10000, type=int, help='''
+specify the number of entries to profile on (ignored with --threads).
+''')
+
+    parser.add_argument('--daemon', default=None, metavar='SOCKET', help='''
+run this job in the warm daemon listening on SOCKET (see run2-rdx-daemon.py),
+instead of starting ROOT here.
+''')
+
+    args = parser.parse_args()
+    if args.compression_level is not None and args.compression is None:
+        parser.error('--compression-level needs --compression')
+    if args.friend and args.skim:
+        parser.error('--friend needs all candidates, so it cannot --skim')
+
+    return args
 
 
 ##################
@@ -55,8 +187,23 @@ enable debug mode.
 
 if __name__ == '__main__':
     args = parse_input()
+    if args.threads is not None:
+        ROOT.EnableImplicitMT(args.threads)
+
+    # Distributed workers would all restart the same global RNG sequence, and
+    # the inputs of a batch run interleaved, so they need the thread-safe
+    # kernels as well
+    thread_safe = (args.threads is not None or args.dask_workers is not None
+                   or args.batch)
+    tck = args.tck
+    if args.tck_branch:
+        tck = args.tck_branch
+    elif args.tck_run_map:
+        tck = tck_run_map_declare(load_run_tck_map(args.tck_run_map))
 
-    directives = run2_rdx_hlt1_directive_gen(args.Bmeson, args.year)
+    directives = run2_rdx_hlt1_directive_gen(
+        args.Bmeson, args.year, thread_safe, args.daughters, args.comb_tracks,
+        args.parent, tck, tck_weights(args.year) if args.tck_weighted else None)
 
     directives_debug = [
         # Reference variables
@@ -153,12 +300,89 @@ if __name__ == '__main__':
         directives.append(
             EXEC('Define', 'nspd_hits', 'NumSPDHits', True))
 
-    init_frame = RDataFrame(args.tree, args.input)
-    dfs, output_br_names = process_directives(directives, init_frame)
+    if args.skim:
+        directives = skim_directives(directives, args.skim)
+
+    if args.batch:
+        io_pairs = batch_io_pairs(args.input, args.output)
+    else:
+        io_pairs = single_io_pairs(args.input, args.output)
+
+    if args.profile:
+        profile = profile_directives(
+            directives, RDataFrame(args.tree, io_pairs[0][0]),
+            optimize=True, max_entries=args.profile_entries)
+        print_profile(profile)
+        dump_profile(profile, args.profile, {'input': io_pairs[0][0]})
+        sys.exit(0)
+
+    compression = compression_settings(
+        args.compression, args.compression_level)
+
+    if args.dask_workers is not None:
+        client = dask_client(args.dask_workers)
+        npartitions = args.npartitions or 2*args.dask_workers
+
+        for input_ntp, output_ntp in io_pairs:
+            init_frame = dist_rdataframe(
+                args.tree, input_ntp, client, npartitions)
+            dfs, output_br_names = process_directives(
+                directives, init_frame, optimize=True, alias=False)
+
+            # Always keep run and event numbers, also to check the merged
+            # partitions of a friend tree
+            output_br_names.push_back('runNumber')
+            output_br_names.push_back('eventNumber')
+
+            # Output: the partitions are merged in input order
+            dist_snapshot(dfs[-1], args.tree, output_ntp, output_br_names,
+                          snapshot_options(compression, args.basket_size,
+                                           args.auto_flush),
+                          compression)
+            if args.friend:
+                check_friend(input_ntp, output_ntp, args.tree)
+
+        sys.exit(0)
+
+    write_opts = dict(compression=compression, basket_size=args.basket_size,
+                      auto_flush=args.auto_flush)
+    output_opts = snapshot_options(
+        compression, args.basket_size, args.auto_flush, lazy=True)
+
+    # All inputs run together in one RunGraphs. Snapshot doesn't keep the
+    # input order with multithreading, so then the outputs are filled by entry
+    # number instead, and written afterwards.
+    frames = []
+    handles = []
+    writers = []
+    for input_ntp, output_ntp in io_pairs:
+        init_frame = RDataFrame(args.tree, input_ntp)
+        dfs, output_br_names = process_directives(
+            directives, init_frame, optimize=True)
+        frames.append(dfs)  # Keep the graphs alive until they run
+
+        # Keep run and event numbers, unless aligned with the input
+        if not args.friend:
+            output_br_names.push_back('runNumber')
+            output_br_names.push_back('eventNumber')
+
+        if args.friend:
+            handle, write = book_friend(
+                dfs[-1], input_ntp, output_ntp, args.tree,
+                [str(b) for b in output_br_names], **write_opts)
+        elif args.threads is not None:
+            handle, write = book_tree(
+                dfs[-1], input_ntp, output_ntp, args.tree,
+                [str(b) for b in output_br_names], **write_opts)
+        else:
+            handle, write = dfs[-1].Snapshot(
+                args.tree, output_ntp, output_br_names, output_opts), None
 
-    # Always keep run and event numbers
-    output_br_names.push_back('runNumber')
-    output_br_names.push_back('eventNumber')
+        handles.append(handle)
+        if write:
+            writers.append(write)
 
     # Output
-    dfs[-1].Snapshot(args.tree, args.output, output_br_names)
+    run_graphs(handles)
+    for write in writers:
+        write()
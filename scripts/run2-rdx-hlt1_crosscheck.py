@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# Last Change: Sun Oct 18, 2026 at 02:30 PM +0000
+
+from TrackerOnlyEmu.daemon import forward_to_daemon
+forward_to_daemon(__file__)  # Before any of the slow imports below
+
+import sys
+import numpy as np
+
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True  # Don't hijack argparse!
+ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
+
+from argparse import ArgumentParser
+from ROOT import RDataFrame
+
+from TrackerOnlyEmu.executor import process_directives
+from TrackerOnlyEmu.utils import Timer
+from TrackerOnlyEmu.emulation.run2_rdx import run2_rdx_hlt1_directive_gen
+from TrackerOnlyEmu.emulation.run2_rdx_numpy import (
+    run2_rdx_hlt1_input_branches,
+    run2_rdx_hlt1_numpy,
+)
+
+
+#################################
+# Command line arguments parser #
+#################################
+
+def parse_input():
+    parser = ArgumentParser(description='''
+compare the NumPy HLT1 emulation to the C++ one event-by-event. Exit with 1 if
+any emulated branch differs.''')
+
+    parser.add_argument('input', help='''
+specify input ntuple file.
+''')
+
+    parser.add_argument('-t', '--tree', default='TupleB0/DecayTree', help='''
+specify tree name.
+''')
+
+    parser.add_argument('-y', '--year', default='2016', help='''
+specify year.''')
+
+    parser.add_argument('-B', '--Bmeson', default='b0', help='''
+specify the name of the B meson in the tree.''')
+
+    parser.add_argument('-d', '--daughters', nargs='+', default=['k', 'pi'],
+                        help='''
+specify the tracks to emulate the triggers for (at most 6).
+''')
+
+    parser.add_argument('--comb-tracks', default=3, type=int, help='''
+specify the number of tracks in the <Bmeson>_*_COMB_i_j branches (at most 6).
+''')
+
+    parser.add_argument('--parent', default='d0', help='''
+specify the prefix of the combined (OR of the daughters) TOS branches.
+''')
+
+    parser.add_argument('-n', '--max-entries', default=None, type=int, help='''
+only compare the first N entries.
+''')
+
+    parser.add_argument('--daemon', default=None, metavar='SOCKET', help='''
+run this job in the warm daemon listening on SOCKET (see run2-rdx-daemon.py),
+instead of starting ROOT here.
+''')
+
+    return parser.parse_args()
+
+
+###############
+# Cross-check #
+###############
+
+if __name__ == '__main__':
+    args = parse_input()
+
+    # The NumPy version draws the random numbers of the thread-safe kernels
+    directives = run2_rdx_hlt1_directive_gen(
+        args.Bmeson, args.year, True, args.daughters, args.comb_tracks,
+        args.parent)
+
+    init_frame = RDataFrame(args.tree, args.input)
+    if args.max_entries is not None:
+        init_frame = init_frame.Range(args.max_entries)
+
+    dfs, output_br_names = process_directives(directives, init_frame)
+    output_brs = [str(b) for b in output_br_names]
+    input_brs = run2_rdx_hlt1_input_branches(
+        args.Bmeson, args.daughters, args.comb_tracks)
+
+    with Timer() as t:
+        columns = dfs[-1].AsNumpy(columns=input_brs + output_brs)
+    print('C++ emulation and reading: {:,.2f} sec'.format(t()))
+
+    with Timer() as t:
+        emulated = run2_rdx_hlt1_numpy(
+            columns, args.Bmeson, args.year, args.daughters, args.comb_tracks,
+            args.parent)
+    print('NumPy emulation: {:,.2f} sec'.format(t()))
+
+    num_entries = len(columns['runNumber'])
+    num_mismatches = 0
+    for br in output_brs:
+        mismatches = np.count_nonzero(
+            np.asarray(columns[br], dtype=bool) != emulated[br])
+        num_mismatches += mismatches
+        print('{:<40} {:>10,} / {:,} differ'.format(
+            br, mismatches, num_entries))
+
+    sys.exit(1 if num_mismatches else 0)
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 #
 # Author: Yipeng Sun
-# Last Change: Tue Nov 09, 2021 at 03:15 PM +0100
+# Last Change: Sun Oct 18, 2026 at 08:50 PM +0000
 # Based on the script 'regmva.py' shared by Patrick Owen
 
+from TrackerOnlyEmu.daemon import forward_to_daemon
+forward_to_daemon(__file__)  # Before any of the slow imports below
+
+import os
 import pickle
 import sys
 import numpy as np
@@ -14,17 +18,22 @@ ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
 
 from argparse import ArgumentParser
 from copy import deepcopy
-from ROOT import gInterpreter, RDataFrame
-from sklearn.ensemble import AdaBoostRegressor
-from sklearn.tree import DecisionTreeRegressor
-from xgboost import XGBClassifier
+from os import path
+from ROOT import RDataFrame
 
-from TrackerOnlyEmu.loader import load_cpp, load_file
+from TrackerOnlyEmu.cache import content_hash
+from TrackerOnlyEmu.loader import load_cpp, load_lut, declare, DECLARED
 from TrackerOnlyEmu.executor import ExecDirective as EXEC
 from TrackerOnlyEmu.executor import process_directives
+from TrackerOnlyEmu.columnar import cached_columns, fill_arrays, tree_entries
 from TrackerOnlyEmu.utils import Timer
-from TrackerOnlyEmu.utils import gen_output_dict, get_df_vars
+from TrackerOnlyEmu.utils import gen_output_dict
+from TrackerOnlyEmu.training import make_regressor, param_grid, split_samples
+from TrackerOnlyEmu.training import run_sweep, dump_sweep, print_sweep
+from TrackerOnlyEmu.tree_ensemble import flatten_model, write_trees
 from TrackerOnlyEmu.emulation.run2_rdx import XGB_TRAIN_BRANCHES
+from TrackerOnlyEmu.emulation.run2_rdx import rng_seed_directives
+from TrackerOnlyEmu.emulation.run2_rdx import run2_rdx_l0_hadron_tos_directive_gen
 
 
 #################
@@ -34,22 +43,60 @@ from TrackerOnlyEmu.emulation.run2_rdx import XGB_TRAIN_BRANCHES
 def bdt_prepare():
     load_cpp('<triggers/l0/run2-L0Hadron.h>')
 
-    gInterpreter.Declare('auto histoResp = new TFile("{}");'.format(
-        load_file('<triggers/l0/hcal_et_response.root>')))
-    gInterpreter.Declare('auto histoCluster = new TFile("{}");'.format(
-        load_file('<triggers/l0/hcal_two_part_clusters.root>')))
+    # The histograms are read from lookup tables, not from the ROOT files. The
+    # HCAL response ones are further flattened into cumulative tables, instead
+    # of going through TH1::GetRandom twice per event.
+    declare('auto lutHcalResp = new LutFile("{}");'.format(
+        load_lut('<triggers/l0/hcal_et_response.root>')))
+    declare('auto lutCluster = new LutFile("{}");'.format(
+        load_lut('<triggers/l0/hcal_two_part_clusters.root>')))
 
     epilogue = '''
-    auto hResp = readSinglePartResp(histoResp);
+    auto hHcalRespCdf = readSinglePartRespCdf(*lutHcalResp);
 
-    auto hSharedIn  = static_cast<TH1D*>(histoCluster->Get("shared_with_radial_inner"));
-    auto hSharedOut = static_cast<TH1D*>(histoCluster->Get("shared_with_radial_outer"));
+    auto hSharedIn  = lutCluster->get("shared_with_radial_inner");
+    auto hSharedOut = lutCluster->get("shared_with_radial_outer");
 
-    auto hMissIn  = static_cast<TH1D*>(histoCluster->Get("missing_with_radial_inner"));
-    auto hMissOut = static_cast<TH1D*>(histoCluster->Get("missing_with_radial_outer"));
+    auto hMissIn  = lutCluster->get("missing_with_radial_inner");
+    auto hMissOut = lutCluster->get("missing_with_radial_outer");
     '''
-    gInterpreter.Declare(epilogue)
+    declare(epilogue)
+
 
+def bdt_directives(args):
+    # In thread-safe mode, the stochastic kernels take a per-candidate seed
+    thread_safe = args.threads is not None
+    seeds = rng_seed_directives(['k', 'pi']) + [
+        EXEC('Define', 'k_pi_rng_seed',
+             'candSeed(runNumber, eventNumber, rdiff_k_pi)'),
+    ] if thread_safe else []
+
+    def seed_arg(seed):
+        return ', '+seed if thread_safe else ''
+
+    return [
+        # Used as a BDT input
+        EXEC('Define', 'rdiff_k_pi', 'rDiff({})'.format(
+            ', '.join([p+'_L0Calo_HCAL_'+d+'Projection'
+                       for p in ['k', 'pi'] for d in ['x', 'y']])), True),
+    ] + seeds + [
+        EXEC('Define', 'k_et_smeared',
+             'singlePartEt(k_P, k_PT, k_L0Calo_HCAL_realET, hHcalRespCdf{})'.format(
+                 seed_arg('k_rng_seed')), True),
+        EXEC('Define', 'pi_et_smeared',
+             'singlePartEt(pi_P, pi_PT, pi_L0Calo_HCAL_realET, hHcalRespCdf{})'.format(
+                 seed_arg('pi_rng_seed')), True),
+
+        # Trigger emulation based on physical considerations
+        EXEC('Define', 'shared_k_pi',
+             'isShared(rdiff_k_pi, k_L0Calo_HCAL_region, pi_L0Calo_HCAL_region, hSharedIn, hSharedOut{})'.format(
+                 seed_arg('k_pi_rng_seed')),
+             True),
+    ]
+
+
+# Key of the feature matrix among the fetched columns
+FEATURE_MATRIX = '__features__'
 
 REGRESSOR_CONFIG = dict()
 
@@ -71,6 +118,7 @@ REGRESSOR_CONFIG['xgb'] = {
         'nspdhits',
     ],
     'reg_br': 'd0_L0HadronDecision_TOS',
+    'pred_br': 'd0_l0_hadron_tos_emu_xgb',
     'prep': lambda: 0,
     'predict': lambda xgb, input_vars: {
         'd0_l0_hadron_tos_emu_xgb': xgb.predict_proba(input_vars).T[1],
@@ -130,24 +178,12 @@ REGRESSOR_CONFIG['bdt'] = {
         'pi_L0Calo_HCAL_TriggerET',
     ],
     'reg_br': 'd0_et_diff',
+    'pred_br': 'd0_et_diff_pred',
     'prep': bdt_prepare,
     'predict': lambda bdt, input_vars: {
         'd0_et_diff_pred': bdt.predict(input_vars)
     },
-    'dir': lambda args: [
-        EXEC('Define', 'k_et_smeared',
-             'singlePartEt(k_P, k_PT, k_L0Calo_HCAL_realET, hResp)', True),
-        EXEC('Define', 'pi_et_smeared',
-             'singlePartEt(pi_P, pi_PT, pi_L0Calo_HCAL_realET, hResp)', True),
-        # Used as a BDT input
-        EXEC('Define', 'rdiff_k_pi', 'rDiff({})'.format(
-            ', '.join([p+'_L0Calo_HCAL_'+d+'Projection'
-                       for p in ['k', 'pi'] for d in ['x', 'y']])), True),
-
-        # Trigger emulation based on physical considerations
-        EXEC('Define', 'shared_k_pi',
-             'isShared(rdiff_k_pi, k_L0Calo_HCAL_region, pi_L0Calo_HCAL_region, hSharedIn, hSharedOut)',
-             True),
+    'dir': lambda args: bdt_directives(args) + [
         EXEC('Define', 'miss_k_pi',
              'missingFraction(rdiff_k_pi, k_L0Calo_HCAL_region, pi_L0Calo_HCAL_region, hMissIn, hMissOut)',
              True),
@@ -225,6 +261,13 @@ specify year.''')
 
     parser.add_argument('--debug', action='store_true', help='''
 enable debug mode.
+''')
+
+    parser.add_argument('-j', '--threads', default=None, type=int, help='''
+enable implicit multithreading with the given number of threads (0 for all
+cores). Random numbers are then drawn from per-candidate seeds, so the emulated
+values are identical for any number of threads, but differ from those without
+--threads, which uses the original random sequence.
 ''')
 
     parser.add_argument('-m', '--mode', choices=['bdt', 'xgb', 'bdt_old'],
@@ -232,18 +275,67 @@ enable debug mode.
 specify which regressor to use.''')
 
     parser.add_argument('--load', default=None, help='''
-optionally specify serialized BDT to load.''')
+optionally specify serialized BDT to load, pickled or flattened (.trees). It is
+then evaluated in the event loop, and scikit-learn/xgboost are only needed to
+flatten a pickle once.''')
 
     parser.add_argument('--dump', default=None, help='''
-optionally specify output to pickled BDT object.''')
+optionally specify output to pickled BDT object. With a '.trees' extension, the
+flattened tree ensemble is written instead, which loads faster and without
+scikit-learn/xgboost.''')
 
-    parser.add_argument('--max-depth', default=4, type=int, help='''
+    parser.add_argument('--max-depth', nargs='+', default=[4], type=int, help='''
 optionally specify the max_depth parameter for the BDT.''')
 
-    parser.add_argument('--ntrees', default=300, type=int, help='''
+    parser.add_argument('--ntrees', nargs='+', default=[300], type=int, help='''
 optionally specify the n_estimators parameter for the BDT.''')
 
-    return parser.parse_args()
+    parser.add_argument('--reg-lambda', nargs='+', default=[0.5], type=float,
+                        help='''
+optionally specify the reg_lambda parameter for the XGB.''')
+
+    parser.add_argument('--learning-rate', nargs='+', default=[None],
+                        type=float, help='''
+optionally specify the learning_rate parameter for the BDT/XGB. By default, the
+one of the library.''')
+
+    parser.add_argument('--sweep', action='store_true', help='''
+fit every combination of the values given to --max-depth, --ntrees,
+--reg-lambda and --learning-rate, in parallel, and write a summary ranked by
+the validation metric to output (JSON), instead of an ntuple.''')
+
+    parser.add_argument('--validation-fraction', default=0.2, type=float,
+                        help='''
+specify the fraction of the sample to validate the sweep candidates on.''')
+
+    parser.add_argument('--cores', default=os.cpu_count(), type=int, help='''
+specify the number of cores shared by the sweep candidates.''')
+
+    parser.add_argument('--sweep-jobs', default=None, type=int, help='''
+specify the number of candidates fitted at the same time. By default, one per
+core; each XGB candidate then uses cores / sweep-jobs threads.''')
+
+    parser.add_argument('--no-cache', action='store_true', help='''
+always rerun the directives on the input. By default, the fetched features and
+targets are cached, and reused as long as the input file, the options that
+affect them and the emulation code are unchanged (e.g. when only --max-depth
+or --ntrees change).
+''')
+
+    parser.add_argument('--daemon', default=None, metavar='SOCKET', help='''
+run this job in the warm daemon listening on SOCKET (see run2-rdx-daemon.py),
+instead of starting ROOT here.
+''')
+
+    args = parser.parse_args()
+
+    grid = [args.max_depth, args.ntrees, args.reg_lambda, args.learning_rate]
+    if not args.sweep and any(len(values) > 1 for values in grid):
+        parser.error('multiple hyperparameter values need --sweep')
+    if args.sweep and args.load:
+        parser.error('--sweep trains, it cannot be used with --load')
+
+    return args
 
 
 #############
@@ -253,34 +345,89 @@ optionally specify the n_estimators parameter for the BDT.''')
 if __name__ == '__main__':
     args = parse_input()
     config = REGRESSOR_CONFIG[args.mode]
+    if args.threads is not None:
+        ROOT.EnableImplicitMT(args.threads)
+
+    if args.load and args.mode == 'bdt_old':
+        print('bdt_old mode cannot be used for BDT application')
+        sys.exit(255)
 
     config['prep']()
     train_brs = config['train_brs']
     reg_br = config['reg_br']
+    pred_br = config['pred_br']
     output_brs = config['output_brs']
 
     directives = config['dir'](args)
     if args.debug:
         directives += config['dir_debug'](args)
         output_brs += config['debug_brs']
+    if args.load:
+        print(f'Load already serialized {args.mode}...')
+        directives += run2_rdx_l0_hadron_tos_directive_gen(
+            args.load, pred_br, train_brs)
+        output_brs = output_brs + [pred_br]
+
+    columns = list(dict.fromkeys([reg_br] + output_brs))
+
+    def fetch():
+        init_frame = RDataFrame(args.tree, args.input)
+        dfs, _ = process_directives(directives, init_frame, optimize=True)
+
+        # Fetch everything in one event loop, the features straight into a
+        # C-contiguous float32 matrix, which is what XGBoost and sklearn trees
+        # use anyway. The other columns keep their types.
+        matrix, arrays = fill_arrays(
+            dfs[-1], tree_entries(args.input, args.tree), train_brs, columns,
+            np.float32)
+        arrays[FEATURE_MATRIX] = matrix
+        return arrays
+
+    if args.no_cache:
+        fetched = fetch()
+    else:
+        # The input is identified by its size and modification time, not its
+        # contents, which would take as long to hash as to read. Everything
+        # declared to the interpreter covers the emulation code and the
+        # calibration tables.
+        stat = os.stat(args.input)
+        key = content_hash(
+            [], path.abspath(args.input), stat.st_size, stat.st_mtime_ns,
+            args.tree, args.year, args.mode, args.threads is not None,
+            directives, columns, DECLARED)
+        fetched = cached_columns(key, fetch)
+
+    input_vars = fetched.pop(FEATURE_MATRIX)
+    regression_var = fetched[reg_br]
+
+    if args.sweep:
+        # reg_lambda is only a parameter of the XGB
+        candidates = param_grid(
+            max_depth=args.max_depth, ntrees=args.ntrees,
+            learning_rate=args.learning_rate,
+            **({'reg_lambda': args.reg_lambda} if args.mode == 'xgb' else {}))
+        print(f'Start a sweep over {len(candidates)} {args.mode} candidates on {args.cores} cores.')
+
+        samples = split_samples(input_vars, regression_var,
+                                args.validation_fraction)
+        del input_vars, regression_var, fetched
 
-    init_frame = RDataFrame(args.tree, args.input)
-    dfs, _ = process_directives(directives, init_frame)
+        with Timer() as t:
+            results = run_sweep(args.mode, candidates, *samples, args.cores,
+                                args.sweep_jobs)
+        print(f'Sweep done. It takes a total of {t():,.2f} sec')
 
-    input_vars = get_df_vars(dfs[-1], train_brs)
-    regression_var = get_df_vars(dfs[-1], reg_br)
+        print_sweep(results, args.mode)
+        dump_sweep(results, args.output, {
+            'input': args.input, 'mode': args.mode,
+            'validation_fraction': args.validation_fraction})
+        sys.exit(0)
 
     if not args.load:
-        print(f'Start training a {args.mode} with {args.ntrees} trees and max-depth {args.max_depth}.')
-        if args.mode in ['bdt', 'bdt_old']:
-            regressor = AdaBoostRegressor(
-                DecisionTreeRegressor(max_depth=args.max_depth),
-                n_estimators=args.ntrees, random_state=np.random.RandomState(1))
-
-        if args.mode == 'xgb':
-            regressor = XGBClassifier(
-                n_estimators=args.ntrees, max_depth=args.max_depth,
-                use_label_encoder=False, eval_metric='mlogloss', reg_lambda=0.5)
+        print(f'Start training a {args.mode} with {args.ntrees[0]} trees and max-depth {args.max_depth[0]}.')
+        regressor = make_regressor(
+            args.mode, args.max_depth[0], args.ntrees[0], args.reg_lambda[0],
+            args.learning_rate[0])
 
         with Timer() as t:
             regressor.fit(input_vars, regression_var)
@@ -288,22 +435,18 @@ if __name__ == '__main__':
 
         if args.dump:
             print(f'Export trained {args.mode} to {args.dump}...')
-            with open(args.dump, 'wb') as f:
-                pickle.dump(regressor, f)
-
-    else:
-        if args.mode == 'bdt_old':
-            print('bdt_old mode cannot be used for BDT application')
-            sys.exit(255)
-
-        print(f'Load already serialized {args.mode}...')
-        regressor = pickle.load(open(load_file(args.load), 'rb'))
+            if args.dump.endswith('.trees'):
+                write_trees(args.dump, flatten_model(regressor))
+            else:
+                with open(args.dump, 'wb') as f:
+                    pickle.dump(regressor, f)
 
     # Output the ntuple
     print('Generate output ntuple...')
     output = gen_output_dict(input_vars, train_brs)
-    output.update(dfs[-1].AsNumpy(columns=output_brs))
-    output.update(config['predict'](regressor, input_vars))
+    output.update({br: fetched[br] for br in output_brs})
+    if not args.load:
+        output.update(config['predict'](regressor, input_vars))
     output_df = ROOT.RDF.MakeNumpyDataFrame(output)
 
     out_dfs, _ = process_directives(config['dir_post'](args), output_df)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+#
+# Author: Yipeng Sun
+# Last Change: Sun Oct 18, 2026 at 09:20 PM +0000
+
+import json
+
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True  # Don't hijack argparse!
+ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
+
+from argparse import ArgumentParser
+
+from TrackerOnlyEmu.loader import load_cpp
+
+
+#################################
+# Command line arguments parser #
+#################################
+
+def parse_input():
+    parser = ArgumentParser(description='''
+time single calls of the emulation kernels, without any I/O.''')
+
+    parser.add_argument('-n', '--calls', default=1e6, type=float, help='''
+specify the number of calls per benchmark.
+''')
+
+    parser.add_argument('-o', '--output', default=None, help='''
+optionally write the results to a JSON file.
+''')
+
+    return parser.parse_args()
+
+
+##############
+# Benchmarks #
+##############
+
+def benchmarks(ncalls):
+    # name -> thunk returning ns/call
+    result = dict()
+
+    for n in [2, 3, 4, 6]:
+        for k in [2, 3]:
+            if k > n:
+                continue
+            result[f'combination_legacy_{n}_{k}'] = \
+                lambda n=n, k=k: ROOT.benchLegacyCombination(n, k, ncalls)
+            result[f'combination_table_{n}_{k}'] = \
+                lambda n=n, k=k: ROOT.benchCombinationTable(n, k, ncalls)
+
+    result['hlt1_twotrackmva_map'] = \
+        lambda: ROOT.benchTwoTrackMVAMap(ncalls)
+    for ntracks, ncombs in [(2, 3), (4, 6), (6, 15)]:
+        result[f'hlt1_twotrackmva_struct_{ntracks}_{ncombs}'] = \
+            lambda ntracks=ntracks, ncombs=ncombs: \
+            ROOT.benchTwoTrackMVAStruct[ntracks, ncombs](ncalls)
+
+    result['l0_hadron_hcal_resp_histo'] = \
+        lambda: ROOT.benchHcalRespHisto(ncalls)
+    result['l0_hadron_hcal_resp_cdf'] = lambda: ROOT.benchHcalRespCdf(ncalls)
+
+    result['l0_global_tis_map'] = lambda: ROOT.benchL0GlobalTisMap(ncalls)
+    result['l0_global_tis_table'] = lambda: ROOT.benchL0GlobalTisTable(ncalls)
+
+    return result
+
+
+if __name__ == '__main__':
+    args = parse_input()
+    load_cpp('<triggers/microbench.h>')
+
+    results = dict()
+    for name, bench in benchmarks(int(args.calls)).items():
+        results[name] = bench()
+        print(f'{name:<40} {results[name]:>10.1f} ns/call')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -1,26 +1,32 @@
 #!/usr/bin/env python3
 #
 # Author: Yipeng Sun
-# Last Change: Sun Oct 31, 2021 at 04:55 AM +0100
+# Last Change: Sun Oct 18, 2026 at 10:10 PM +0000
+
+from TrackerOnlyEmu.daemon import forward_to_daemon
+forward_to_daemon(__file__)  # Before any of the slow imports below
 
 import ROOT
 ROOT.PyConfig.IgnoreCommandLineOptions = True  # Don't hijack argparse!
 ROOT.PyConfig.DisableRootLogon = True  # Don't read .rootlogon.py
 
-import pickle
+import sys
 
 from argparse import ArgumentParser
 from ROOT import RDataFrame
-from ROOT.RDF import RSnapshotOptions
 
-from TrackerOnlyEmu.loader import load_file
-from TrackerOnlyEmu.executor import ExecDirective as EXEC
-from TrackerOnlyEmu.executor import process_directives
-from TrackerOnlyEmu.utils import get_df_vars
+from TrackerOnlyEmu.executor import process_directives, skim_directives
+from TrackerOnlyEmu.executor import run_graphs
+from TrackerOnlyEmu.columnar import book_arrays, tree_entries, write_columns
+from TrackerOnlyEmu.output import compression_settings, write_friend_columns
+from TrackerOnlyEmu.stage_cache import Stage, emulation_stage, cached_stages
+from TrackerOnlyEmu.utils import batch_io_pairs, single_io_pairs
+from TrackerOnlyEmu.profiler import profile_directives, dump_profile, print_profile
 from TrackerOnlyEmu.emulation.run2_rdx import (
     run2_rdx_l0_global_tis_directive_gen,
     run2_rdx_hlt1_directive_gen,
-    XGB_TRAIN_BRANCHES,
+    run2_rdx_l0_hadron_tos_directive_gen,
+    run2_rdx_l0_hadron_tos_skim,
 )
 
 
@@ -28,6 +34,12 @@ from TrackerOnlyEmu.emulation.run2_rdx import (
 # Command line arguments parser #
 #################################
 
+def skim_acceptance(value):
+    if value == 'weight':
+        return value
+    return float(value)
+
+
 def parse_input():
     parser = ArgumentParser(
         description='Emulate all triggers for run 2 RDX.')
@@ -52,13 +64,103 @@ specify tree name.
 specify the name of the B meson in the tree.''')
 
     parser.add_argument('-l', '--load', default='<triggers/l0/xgb4-2016.pickle>', help='''
-specify the trained regressor to load.''')
+specify the trained regressor to load, pickled or flattened (.trees).''')
 
     parser.add_argument('--debug', action='store_true', help='''
 enable debug mode.
 ''')
 
-    return parser.parse_args()
+    parser.add_argument('-j', '--threads', default=None, type=int, help='''
+enable implicit multithreading with the given number of threads (0 for all
+cores). The output is written in input order, so it is identical for any
+number of threads. Random numbers are drawn from per-candidate seeds, also
+without --threads unless the stage cache is bypassed (--no-cache or --skim)
+for a single input; only then the original random sequence is used.
+''')
+
+    parser.add_argument('--batch', action='store_true', help='''
+treat input as a manifest file (one 'input [output]' per line) or a glob
+pattern, and output as the output directory. The emulation code and the
+regressor are loaded only once for all ntuples, which are processed in one go.
+''')
+
+    parser.add_argument('--skim', default=None, metavar='EXPR', help='''
+only write the candidates passing EXPR, a C++ requirement over the emulated and
+input branches, e.g. 'd0_hlt1_trackmva_tos_emu || d0_hlt1_twotrackmva_tos_emu'.
+It is applied as a Filter right after the branches it reads, so the other
+branches are only evaluated for the candidates that pass. Note that without
+--threads, the random numbers drawn then differ from those of a full output.
+''')
+
+    parser.add_argument('--skim-l0-hadron-tos', default=None,
+                        type=skim_acceptance, metavar='{THRESHOLD,weight}',
+                        help='''
+also require the L0Hadron TOS for --skim: either its probability above
+THRESHOLD, or 'weight' to keep each candidate with its probability, drawn from
+run, event number and d0_PT, so that the skim is unweighted.
+''')
+
+    parser.add_argument('--friend', action='store_true', help='''
+write only the emulated branches, without the run and event numbers, as a
+friend tree of the input: one entry per input entry, in input order, also with
+--threads. The run and event numbers of the entries are checked against the
+input.
+''')
+
+    parser.add_argument('--compression', default=None,
+                        choices=['zlib', 'lzma', 'lz4', 'zstd'], help='''
+specify the compression algorithm of the output (default: ROOT's). lz4 is the
+fastest to read, zstd and lzma give smaller files.
+''')
+
+    parser.add_argument('--compression-level', default=None, type=int,
+                        choices=range(10), metavar='{0-9}', help='''
+specify the compression level (default: ROOT's for the algorithm, 0 for none).
+''')
+
+    parser.add_argument('--basket-size', default=None, type=int,
+                        metavar='BYTES', help='''
+specify the initial basket size of the output branches (default: ROOT's).
+''')
+
+    parser.add_argument('--auto-flush', default=None, type=int, help='''
+flush the output baskets every N entries, or every -N bytes if negative
+(default: ROOT's). This is the cluster size of the output.
+''')
+
+    parser.add_argument('--no-cache', action='store_true', help='''
+don't reuse nor cache the outputs of each emulation stage (L0Global TIS, HLT1,
+L0Hadron TOS). By default, only the stages whose input, options, code or
+regressor changed are recomputed.
+''')
+
+    parser.add_argument('--cache-size', default=10, type=float, metavar='GB',
+                        help='''
+specify the maximum size of the cached stage outputs, in GiB. The least
+recently used ones are removed first.
+''')
+
+    parser.add_argument('--profile', default=None, metavar='JSON', help='''
+instead of running the emulation, profile each directive on the (first) input
+and write the timings to JSON.
+''')
+
+    parser.add_argument('--profile-entries', default=10000, type=int, help='''
+specify the number of entries to profile on (ignored with --threads).
+''')
+
+    parser.add_argument('--daemon', default=None, metavar='SOCKET', help='''
+run this job in the warm daemon listening on SOCKET (see run2-rdx-daemon.py),
+instead of starting ROOT here.
+''')
+
+    args = parser.parse_args()
+    if args.compression_level is not None and args.compression is None:
+        parser.error('--compression-level needs --compression')
+    if args.friend and (args.skim or args.skim_l0_hadron_tos is not None):
+        parser.error('--friend needs all candidates, so it cannot --skim')
+
+    return args
 
 
 ##################
@@ -67,52 +169,109 @@ enable debug mode.
 
 if __name__ == '__main__':
     args = parse_input()
+    if args.threads is not None:
+        ROOT.EnableImplicitMT(args.threads)
 
     if args.adhoc_tis_correction: print(f'Note: using ad-hoc correction for L0 Global TIS measurement at high B log(pT)')
 
-    # L0Global TIS
-    directives = run2_rdx_l0_global_tis_directive_gen(args.Bmeson, args.year, args.adhoc_tis_correction)
-    # HLT 1
-    directives += run2_rdx_hlt1_directive_gen(args.Bmeson, args.year)
-
-    init_frame = RDataFrame(args.tree, args.input)
-    dfs, _ = process_directives(directives, init_frame)
-
-    # L0Hadron TOS
-    input_vars = get_df_vars(init_frame, XGB_TRAIN_BRANCHES)
-    regressor = pickle.load(open(load_file(args.load), 'rb'))
-
     # Collect the previous output branches
     hlt1_brs = [
         'k_hlt1_trackmva_tos_emu', 'pi_hlt1_trackmva_tos_emu',
         'd0_hlt1_trackmva_tos_emu', 'd0_hlt1_twotrackmva_tos_emu',
     ]
-    out_np = dfs[-1].AsNumpy(columns=['runNumber', 'eventNumber']+hlt1_brs)
-    for br in hlt1_brs:  # Convert to int otherwise RDataFrame doesn't like it
-        out_np[br] = out_np[br].astype(int)
-
-    out_tmp = {k+'_tmp': v for k, v in out_np.items()}
-    # Add the L0Global TIS branch
     l0global_tis_br = f'{args.Bmeson}_l0_global_tis_emu'
-    out_tmp[l0global_tis_br] = get_df_vars(dfs[-1], l0global_tis_br)
-    # Add the L0Hadron TOS branch
-    out_tmp['d0_l0_hadron_tos_emu'] = regressor.predict_proba(input_vars).T[1]
-    out_df = ROOT.RDF.MakeNumpyDataFrame(out_tmp)
-
-    directives_post = [
-        EXEC('Define', br, f'static_cast<Bool_t>({br}_tmp)', True)
-        for br in hlt1_brs
-    ] + [
-        EXEC('Define', 'runNumber', 'static_cast<UInt_t>(runNumber_tmp)', True),
-        EXEC('Define', 'eventNumber',
-             'static_cast<ULong64_t>(eventNumber_tmp)', True),
+
+    skims = [args.skim] if args.skim else []
+    if args.skim_l0_hadron_tos is not None:
+        skims.append(run2_rdx_l0_hadron_tos_skim(args.skim_l0_hadron_tos))
+    skim = ' && '.join('({})'.format(s) for s in skims)
+
+    # The cached stages hold all candidates, so skims are computed anew
+    use_cache = not (args.no_cache or skim)
+    # The global random sequence depends on what was drawn before in this
+    # process, which the cache keys don't capture, and the inputs of a batch
+    # run interleaved, so cached stages and batches always draw from
+    # per-candidate seeds
+    thread_safe = args.threads is not None or use_cache or args.batch
+
+    # Each stage is cached separately, so that e.g. a new regressor only
+    # recomputes the L0Hadron TOS
+    stages = [
+        # L0Global TIS
+        emulation_stage(
+            'l0_global_tis', [l0global_tis_br],
+            run2_rdx_l0_global_tis_directive_gen,
+            args.Bmeson, args.year, args.adhoc_tis_correction),
+        # HLT 1
+        emulation_stage(
+            'hlt1', hlt1_brs, run2_rdx_hlt1_directive_gen,
+            args.Bmeson, args.year, thread_safe),
+        # L0Hadron TOS, evaluated in the same event loop
+        emulation_stage(
+            'l0_hadron_tos', ['d0_l0_hadron_tos_emu'],
+            run2_rdx_l0_hadron_tos_directive_gen, args.load),
     ]
+    # Always keep run and event numbers, also to check the alignment of a
+    # friend tree (where they are not written)
+    stages.insert(0, Stage('identifiers', ['runNumber', 'eventNumber']))
+
+    directives = [d for s in stages for d in s.directives]
+
+    if skim:
+        directives = skim_directives(directives, skim)
+
+    if args.batch:
+        io_pairs = batch_io_pairs(args.input, args.output)
+    else:
+        io_pairs = single_io_pairs(args.input, args.output)
+
+    if args.profile:
+        profile = profile_directives(
+            directives, RDataFrame(args.tree, io_pairs[0][0]),
+            optimize=True, max_entries=args.profile_entries)
+        print_profile(profile)
+        dump_profile(profile, args.profile, {'input': io_pairs[0][0]})
+        sys.exit(0)
+
+    compression = compression_settings(
+        args.compression, args.compression_level)
+    output_opts = dict(compression=compression, basket_size=args.basket_size,
+                       auto_flush=args.auto_flush)
+
+    frames = []
+
+    def book(input_ntp, missing, skim=None):
+        # Fetch all missing stages in a single event loop over the input, in
+        # input order also with multithreading, so that they are aligned with
+        # the cached ones
+        init_frame = RDataFrame(args.tree, input_ntp)
+        directives = [d for s in missing for d in s.directives]
+        if skim:
+            directives = skim_directives(directives, skim)
+        dfs, _ = process_directives(directives, init_frame, optimize=True)
+        frames.append(dfs)  # Keep the graphs alive until they run
+
+        handle, result = book_arrays(
+            dfs[-1], tree_entries(input_ntp, args.tree),
+            columns=[b for s in missing for b in s.outputs])
+        return handle, lambda: result()[1]
 
-    # Output
-    out_dfs, output_br_names = process_directives(directives_post, out_df)
-    output_br_names.push_back('d0_l0_hadron_tos_emu')
-    output_br_names.push_back(l0global_tis_br)
+    # The event loops of all inputs run together
+    inputs = [input_ntp for input_ntp, _ in io_pairs]
+    if not use_cache:
+        booked = [book(input_ntp, stages, skim) for input_ntp in inputs]
+        run_graphs([handle for handle, _ in booked])
+        out_nps = [result() for _, result in booked]
+    else:
+        out_nps = cached_stages(stages, inputs, args.tree, book,
+                                max_bytes=int(args.cache_size * 2**30))
 
-    output_opts = RSnapshotOptions()
-    output_opts.fMode = 'UPDATE'
-    out_dfs[-1].Snapshot(args.tree, args.output, output_br_names, output_opts)
+    for (input_ntp, output_ntp), out_np in zip(io_pairs, out_nps):
+        # Output: the columns already have the right types, so write them
+        # directly
+        if args.friend:
+            write_friend_columns(out_np, input_ntp, output_ntp, args.tree,
+                                 mode='UPDATE', **output_opts)
+        else:
+            write_columns(output_ntp, args.tree, out_np, mode='UPDATE',
+                          **output_opts)
@@ -1,5 +1,5 @@
 # Author: Yipeng Sun
-# Last Change: Sun Oct 31, 2021 at 04:58 AM +0100
+# Last Change: Sun Oct 18, 2026 at 07:10 PM +0000
 
 import setuptools
 import subprocess
@@ -58,13 +58,24 @@ setup(
         'scripts/run2-rdx-hlt1.py',
         'scripts/run2-rdx-l0_global_tis.py',
         'scripts/run2-rdx-l0_hadron_tos.py',
+        'scripts/run2-rdx-daemon.py',
+        'scripts/run2-rdx-gen_synthetic.py',
+        'scripts/run2-rdx-benchmark.py',
+        'scripts/run2-rdx-microbench.py',
+        'scripts/run2-rdx-hlt1_crosscheck.py',
+        'scripts/run2-rdx-compile_luts.py',
+        'scripts/run2-rdx-flatten_models.py',
     ],
     include_package_data=True,
     install_requires=[
         'numpy',
+        # To flatten the shipped pickled regressors, until their .trees ship
         'scikit-learn~=1.0.0',
         'xgboost~=1.5.0'
     ],
+    extras_require={
+        'distributed': ['dask[distributed]'],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         # 'License :: OSI Approved :: BSD License',